@@ -0,0 +1,178 @@
+"""
+Data-driven ACL change plans
+
+A change plan lists the management ACLs to enforce as plain data: the ACL name
+and its entries in prefix form. Each plan is rendered once per platform and the
+rendering is cached:
+    - ios => standard ACL with wildcard masks ("permit 172.20.10.0 0.0.0.15")
+    - nxos_ssh => ACL with CIDR prefixes ("permit ip 172.20.10.0/28 any")
+
+acl_update20.py merges every ACL of the plan into one candidate, so a device takes
+a single load_merge_candidate/commit_config however many ACLs the plan holds.
+"""
+import hashlib
+import ipaddress
+import json
+import threading
+
+
+##########################
+# Global Variables
+##########################
+IOS = 'ios'
+NXOS = 'nxos_ssh'
+
+ACLS = [
+    {
+        "name": "20",
+        "entries": [
+            {"action": "permit", "prefix": "172.20.10.0/28"},
+            {"action": "permit", "prefix": "139.65.136.0/22"},
+            {"action": "permit", "prefix": "139.65.140.0/22"},
+            {"action": "deny", "prefix": "any", "log": True},
+        ],
+    },
+]
+
+
+##########################
+# Platform renderers
+##########################
+def wildcard(prefix):
+    '''
+    172.20.10.0/28 => "172.20.10.0 0.0.0.15", /32 => "host x.x.x.x", any => "any"
+    '''
+    if prefix == 'any':
+        return 'any'
+    network = ipaddress.ip_network(prefix)
+    if network.prefixlen == network.max_prefixlen:
+        return f'host {network.network_address}'
+    return f'{network.network_address} {network.hostmask}'
+
+
+def cidr(prefix):
+    '''
+    Normalize a prefix for NX-OS ("any" is kept as is)
+    '''
+    if prefix == 'any':
+        return 'any'
+    return str(ipaddress.ip_network(prefix))
+
+
+def render_ios(acl):
+    commands = [f'no ip access-list standard {acl["name"]}', f'ip access-list standard {acl["name"]}']
+    for entry in acl["entries"]:
+        line = f'{entry["action"]} {wildcard(entry["prefix"])}'
+        commands.append(f'{line} log' if entry.get("log") else line)
+    return commands
+
+
+def render_nxos(acl):
+    commands = [f'no ip access-list {acl["name"]}', f'ip access-list {acl["name"]}']
+    for entry in acl["entries"]:
+        line = f'{entry["action"]} ip {cidr(entry["prefix"])} any'
+        commands.append(f'{line} log' if entry.get("log") else line)
+    return commands
+
+
+RENDERERS = {
+    IOS: render_ios,
+    NXOS: render_nxos,
+}
+
+ACL_HEADERS = {
+    IOS: 'ip access-list standard {name}',
+    NXOS: 'ip access-list {name}',
+}
+
+
+def acl_section(output, name):
+    '''
+    Raw running-config lines of one ACL, header first, None when the ACL does not exist
+        - output => "show running-config | section ip access-list <name>" output, which also
+          holds the ACLs whose header merely contains the name (200, 20-mgmt)
+    '''
+    section, inside = None, False
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            words = line.split()
+            inside = words[:2] == ['ip', 'access-list'] and words[-1] == name
+            if inside:
+                section = [line.rstrip()]
+        elif inside:
+            section.append(line.rstrip())
+    return section
+
+
+def restore_commands(name, section, platform):
+    '''
+    Commands putting an ACL back the way a snapshot found it, remarks and "host" included
+        - section => raw running-config lines from acl_section(), None when the ACL did not exist
+    '''
+    if section is None:
+        if platform not in ACL_HEADERS:
+            raise ValueError(f'No ACL renderer for platform {platform}')
+        return [f'no {ACL_HEADERS[platform].format(name=name)}']
+    return [f'no {section[0].strip()}'] + list(section)
+
+
+##########################
+# Change plan
+##########################
+class ChangePlan:
+    '''
+    Set of ACLs pushed together to every device
+        - acls => list of ACL dicts (name, entries of action/prefix/log)
+    '''
+    def __init__(self, acls):
+        self.acls = list(acls)
+        self.names = [acl["name"] for acl in self.acls]
+        self.digest = hashlib.sha256(json.dumps(self.acls, sort_keys=True).encode()).hexdigest()[:16]
+        self._rendered = {}
+        self._lock = threading.Lock()
+
+    def render(self, platform):
+        '''
+        Return [(acl name, commands), ...] for a platform, rendered only once
+            - platform => ios / nxos_ssh
+        '''
+        with self._lock:
+            if platform not in self._rendered:
+                if platform not in RENDERERS:
+                    raise ValueError(f'No ACL renderer for platform {platform}')
+                renderer = RENDERERS[platform]
+                self._rendered[platform] = [(acl["name"], renderer(acl)) for acl in self.acls]
+            return self._rendered[platform]
+
+    def commands(self, acl_name, platform):
+        '''
+        Commands of a single ACL of the plan
+        '''
+        for name, commands in self.render(platform):
+            if name == acl_name:
+                return commands
+        raise KeyError(acl_name)
+
+    def select(self, names):
+        '''
+        New plan holding only the ACLs in names
+        '''
+        unknown = set(names) - set(self.names)
+        if unknown:
+            raise KeyError(f'ACLs not in the change plan: {", ".join(sorted(unknown))}')
+        return ChangePlan(acl for acl in self.acls if acl["name"] in names)
+
+
+def load_plan(path=None):
+    '''
+    Load a change plan from a JSON file (same layout as ACLS), or the built-in ACLS
+    '''
+    if not path:
+        return DEFAULT_PLAN
+    with open(path) as plan_file:
+        return ChangePlan(json.load(plan_file))
+
+
+DEFAULT_PLAN = ChangePlan(ACLS)
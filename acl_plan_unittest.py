@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from acl_plan import ChangePlan, IOS, NXOS, acl_section, cidr, load_plan, restore_commands, wildcard
+
+
+ACLS = [
+    {
+        "name": "20",
+        "entries": [
+            {"action": "permit", "prefix": "172.20.10.0/28"},
+            {"action": "permit", "prefix": "10.1.1.1/32"},
+            {"action": "deny", "prefix": "any", "log": True},
+        ],
+    },
+    {
+        "name": "MGMT",
+        "entries": [
+            {"action": "permit", "prefix": "139.65.136.0/22"},
+        ],
+    },
+]
+
+
+class TestRenderers(unittest.TestCase):
+
+    def test_wildcard(self):
+        self.assertEqual(wildcard("172.20.10.0/28"), "172.20.10.0 0.0.0.15")
+        self.assertEqual(wildcard("139.65.136.0/22"), "139.65.136.0 0.0.3.255")
+        self.assertEqual(wildcard("10.1.1.1/32"), "host 10.1.1.1")
+        self.assertEqual(wildcard("any"), "any")
+
+    def test_cidr(self):
+        self.assertEqual(cidr("172.20.10.0/28"), "172.20.10.0/28")
+        self.assertEqual(cidr("any"), "any")
+        with self.assertRaises(ValueError):
+            cidr("172.20.10.1/28")
+
+    def test_ios_plan_uses_wildcard_masks(self):
+        self.assertEqual(ChangePlan(ACLS).commands("20", IOS), [
+            "no ip access-list standard 20",
+            "ip access-list standard 20",
+            "permit 172.20.10.0 0.0.0.15",
+            "permit host 10.1.1.1",
+            "deny any log",
+        ])
+
+    def test_nxos_plan_uses_cidr_prefixes(self):
+        self.assertEqual(ChangePlan(ACLS).commands("20", NXOS), [
+            "no ip access-list 20",
+            "ip access-list 20",
+            "permit ip 172.20.10.0/28 any",
+            "permit ip 10.1.1.1/32 any",
+            "deny ip any any log",
+        ])
+
+    def test_acl_section_keeps_remarks_and_hosts(self):
+        output = "\n".join([
+            "ip access-list standard 20",
+            " remark management hosts",
+            " 10 permit 172.20.10.1",
+            " 20 permit host 10.1.1.1",
+            "ip access-list standard 200",
+            " 10 deny   any",
+        ])
+        self.assertEqual(acl_section(output, "20"), [
+            "ip access-list standard 20",
+            " remark management hosts",
+            " 10 permit 172.20.10.1",
+            " 20 permit host 10.1.1.1",
+        ])
+        self.assertEqual(acl_section(output, "200"), ["ip access-list standard 200", " 10 deny   any"])
+
+    def test_acl_section_of_a_missing_acl(self):
+        self.assertIsNone(acl_section("", "20"))
+        self.assertIsNone(acl_section("ip access-list standard 200\n 10 deny   any\n", "20"))
+
+    def test_restore_commands_replay_the_section(self):
+        section = ["ip access-list standard 20", " remark management hosts", " 20 permit host 10.1.1.1"]
+        self.assertEqual(restore_commands("20", section, IOS),
+                         ["no ip access-list standard 20"] + section)
+
+    def test_restore_commands_of_an_empty_acl_keeps_it(self):
+        self.assertEqual(restore_commands("20", ["ip access-list 20"], NXOS),
+                         ["no ip access-list 20", "ip access-list 20"])
+
+    def test_restore_commands_of_a_missing_acl_removes_it(self):
+        self.assertEqual(restore_commands("20", None, IOS), ["no ip access-list standard 20"])
+        self.assertEqual(restore_commands("20", None, NXOS), ["no ip access-list 20"])
+
+    def test_unknown_platform(self):
+        with self.assertRaises(ValueError):
+            restore_commands("20", None, "asa")
+        with self.assertRaises(ValueError):
+            ChangePlan(ACLS).render("asa")
+
+
+class TestChangePlan(unittest.TestCase):
+
+    def test_render_is_cached_per_platform(self):
+        plan = ChangePlan(ACLS)
+        self.assertIs(plan.render(IOS), plan.render(IOS))
+        self.assertEqual([name for name, _ in plan.render(NXOS)], ["20", "MGMT"])
+
+    def test_digest_follows_the_content(self):
+        self.assertEqual(ChangePlan(ACLS).digest, ChangePlan(json.loads(json.dumps(ACLS))).digest)
+        self.assertNotEqual(ChangePlan(ACLS).digest, ChangePlan(ACLS[:1]).digest)
+
+    def test_select(self):
+        plan = ChangePlan(ACLS).select(["MGMT"])
+        self.assertEqual(plan.names, ["MGMT"])
+        with self.assertRaises(KeyError):
+            plan.commands("20", IOS)
+        with self.assertRaises(KeyError):
+            ChangePlan(ACLS).select(["30"])
+
+    def test_load_plan(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "plan.json")
+        with open(path, "w") as plan_file:
+            json.dump(ACLS, plan_file)
+        self.assertEqual(load_plan(path).digest, ChangePlan(ACLS).digest)
+        self.assertEqual(load_plan().names, ["20"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,12 @@
 import unittest
-from netmiko import ConnectHandler
+from session_pool import pool
 
 
 class TestCiscoPasswords(unittest.TestCase):
 
-    def send_command_to_device(self, ip, username, password, command):
-        device = {
-            "device_type": "cisco_ios",
-            "ip": ip,
-            "username": username,
-            "password": password,
-        }
-
+    def send_command_to_device(self, ip, username, password, command, device_type="cisco_ios"):
         try:
-            with ConnectHandler(**device) as ssh:
+            with pool.netmiko(ip, device_type, username, password) as ssh:
                 output = ssh.send_command(command)
             return output
 
@@ -1,22 +1,22 @@
+import argparse
 import csv
 import unittest
 from concurrent.futures import ThreadPoolExecutor
-from netmiko import ConnectHandler
+from config_cache import run_command
+from compliance import RuleSet, RULES, PASSWORD_COMMAND
+from inventory import IOS, NXOS
+
+# Answer running-config checks from snapshots younger than this many seconds,
+# None always asks the device
+CONFIG_MAX_AGE = None
+RULE_SET = RuleSet(RULES)
 
 
 class TestCiscoPasswords(unittest.TestCase):
 
     def send_command_to_device(self, device_type, ip, username, password, command):
-        device = {
-            "device_type": device_type,
-            "ip": ip,
-            "username": username,
-            "password": password,
-        }
-
         try:
-            with ConnectHandler(**device) as ssh:
-                output = ssh.send_command(command)
+            output = run_command(ip, device_type, username, password, command, max_age=CONFIG_MAX_AGE)
             return output
 
         except Exception as e:
@@ -32,10 +32,9 @@ class TestCiscoPasswords(unittest.TestCase):
             "secret": "enable123",
         }
 
-        output = self.send_command_to_device(**ios_device, command="show running-config | include secret|username|password")
-        self.assertIn("enable secret 9 $9$Tr.fJkiWqTDLNE$uZnlmaQm7TjDezx3X59P.rZBh3diBR6z41Op8/igj5g", output)
-        self.assertIn("username admin secret 9 $9$.E8i4elg0kVv5U$mhwRPfT6.rIGwYtLKaL2PLkajzxH2s7rBcSPDPiureM", output)
-        self.assertIn("password 7 032E0B12035A31020F0700044932", output)
+        output = self.send_command_to_device(**ios_device, command=PASSWORD_COMMAND)
+        # Type 7 passwords are reversible, compliance.RULES forbids them
+        self.assertEqual(RULE_SET.failures(output, IOS), [])
 
     def test_cisco_nxos_passwords(self, ip, username, password):
         nxos_device = {
@@ -45,11 +44,16 @@ class TestCiscoPasswords(unittest.TestCase):
             "password": password,
         }
 
-        output = self.send_command_to_device(**nxos_device, command="show running-config | include secret|username|password")
-        self.assertIn("admin password 5 $1$032E0B12035A31020F0700044932", output)
+        output = self.send_command_to_device(**nxos_device, command=PASSWORD_COMMAND)
+        self.assertEqual(RULE_SET.failures(output, NXOS), [])
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check device password compliance")
+    parser.add_argument('--max-age', type=int, default=None, metavar='',\
+        help='Use cached running-configs younger than this many seconds (0 forces a refresh)')
+    CONFIG_MAX_AGE = parser.parse_args().max_age
+
     with open('devices.csv', 'r') as f:
         reader = csv.reader(f)
         next(reader)  # skip header row
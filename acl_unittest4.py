@@ -1,6 +1,14 @@
+import argparse
 import csv
 import concurrent.futures
-from netmiko import ConnectHandler
+from config_cache import run_command
+from compliance import RuleSet, RULES, PASSWORD_COMMAND
+from inventory import IOS
+
+# Answer running-config checks from snapshots younger than this many seconds,
+# None always asks the device
+CONFIG_MAX_AGE = None
+RULE_SET = RuleSet(RULES)
 
 def get_device_credentials(device_csv):
     """
@@ -15,29 +23,16 @@ def check_cisco_passwords(ip, username, password):
     """
     Test if a given device is using compliant Cisco passwords.
     """
-    device = {
-        "device_type": "cisco_ios",
-        "ip": ip,
-        "username": 'cisco',
-        "password": 'cisco',
-    }
-
     output = ""
     try:
-        with ConnectHandler(**device) as ssh:
-            output = ssh.send_command("show running-config | include secret|username|password")
+        output = run_command(ip, "cisco_ios", username, password, PASSWORD_COMMAND,
+                             max_age=CONFIG_MAX_AGE)
     except Exception as e:
         print(f"Error connecting to device {ip}: {str(e)}")
         return f"{ip}: {str(e)}"
 
-    errors = []
-    if "enable secret" in output:
-        errors.append(f"{ip}: Enable secret is not compliant.")
-    if "username" in output and "secret" in output:
-        errors.append(f"{ip}: Username secret is not compliant.")
-    if "password" in output and "7 " in output:
-        errors.append(f"{ip}: Password encryption is not compliant.")
-    
+    errors = [f"{ip}: {name} is not compliant." for name in RULE_SET.failures(output, IOS)]
+
     if not errors:
         print(f"{ip}: Compliant")
     else:
@@ -45,6 +40,10 @@ def check_cisco_passwords(ip, username, password):
             print(error)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check device password compliance")
+    parser.add_argument('--max-age', type=int, default=None, metavar='',\
+        help='Use cached running-configs younger than this many seconds (0 forces a refresh)')
+    CONFIG_MAX_AGE = parser.parse_args().max_age
     device_csv = "devices.csv"
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=100) as executor:
@@ -1,31 +1,31 @@
+import argparse
 import csv
 import unittest
 from concurrent.futures import ThreadPoolExecutor
-from netmiko import ConnectHandler
+from config_cache import run_command
+from compliance import RuleSet, RULES, PASSWORD_COMMAND
+from inventory import IOS, NXOS
+
+# Answer running-config checks from snapshots younger than this many seconds,
+# None always asks the device
+CONFIG_MAX_AGE = None
+RULE_SET = RuleSet(RULES)
 
 
 class TestCiscoPasswords(unittest.TestCase):
 
     def send_command_to_device(self, device_type, ip, username, password, command):
-        device = {
-            "device_type": device_type,
-            "ip": ip,
-            "username": username,
-            "password": password,
-        }
-
         try:
-            with ConnectHandler(**device) as ssh:
-                output = ssh.send_command(command)
+            output = run_command(ip, device_type, username, password, command, max_age=CONFIG_MAX_AGE)
             return output
 
         except Exception as e:
             print(f"Error connecting to device {ip}: {str(e)}")
             return None
 
-    def test_device_passwords(self, device_type, ip, username, password, expected_output):
-        output = self.send_command_to_device(device_type, ip, username, password, command="show running-config | include secret")
-        self.assertIn(expected_output, output)
+    def test_device_passwords(self, device_type, ip, username, password, platform):
+        output = self.send_command_to_device(device_type, ip, username, password, command=PASSWORD_COMMAND)
+        self.assertEqual(RULE_SET.failures(output, platform), [])
 
     def test_cisco_ios_passwords(self):
         ios_device = {
@@ -34,8 +34,7 @@ class TestCiscoPasswords(unittest.TestCase):
             "username": "cisco",
             "password": "cisco",
         }
-        expected_output = "enable secret 9 $9$Tr.fJkiWqTDLNE$uZnlmaQm7TjDezx3X59P.rZBh3diBR6z41Op8/igj5g\nusername cisco privilege 15 password 0 cisco\nusername admin secret 9 $9$.E8i4elg0kVv5U$mhwRPfT6.rIGwYtLKaL2PLkajzxH2s7rBcSPDPiureM"
-        self.test_device_passwords(**ios_device, expected_output=expected_output)
+        self.test_device_passwords(**ios_device, platform=IOS)
 
     def test_cisco_nxos_passwords(self):
         nxos_device = {
@@ -44,11 +43,15 @@ class TestCiscoPasswords(unittest.TestCase):
             "username": "admin",
             "password": "password123",
         }
-        expected_output = "admin password 5 $1$032E0B12035A31020F0700044932"
-        self.test_device_passwords(**nxos_device, expected_output=expected_output)
+        self.test_device_passwords(**nxos_device, platform=NXOS)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check device password compliance")
+    parser.add_argument('--max-age', type=int, default=None, metavar='',\
+        help='Use cached running-configs younger than this many seconds (0 forces a refresh)')
+    CONFIG_MAX_AGE = parser.parse_args().max_age
+
     with open('devices.csv', 'r') as f:
         reader = csv.DictReader(f)
         with ThreadPoolExecutor(max_workers=100) as executor:
@@ -1,77 +1,349 @@
 import csv
 import argparse
-from napalm import get_network_driver
 from rich import print as rprint
-from concurrent.futures import ThreadPoolExecutor
+from acl_plan import load_plan, acl_section, restore_commands
+import change_journal
+import output_archive
+from change_journal import ChangeJournal
+import phase_timer
+from phase_timer import timer
+from pipeline import Pipeline, Stage
+from reachability import probe_ssh_banner, OPEN, CLOSED, UNREACHABLE, SSH_PORT
+import reachability
+from report_writer import ReportWriter
+from session_pool import pool
 import smtplib
 from email.mime.text import MIMEText
+import re
+import time
+from functools import partial
 from datetime import datetime
-from netmiko import ConnectHandler, NetmikoTimeoutException, NetmikoAuthenticationException
+
+
+VERIFY_METHODS = ['banner', 'banner+login', 'login']
+# napalm => load_merge_candidate/commit_config/rollback (candidate file, full backup)
+# session => one config mode session, only the pushed ACLs are snapshot and restored
+COMMIT_ENGINES = ['napalm', 'session']
+CONFIG_ERRORS = re.compile(r'^% (?:Invalid|Incomplete|Ambiguous).*$', re.MULTILINE)
+
+
+ACL_SEQUENCE = re.compile(r'^\d+\s+')
+ACL_MATCHES = re.compile(r'\s*\(\d+ matches?\)')
+ACL_HOST = re.compile(r'\bhost\s+')
+
+
+def normalize_acl_entries(lines):
+    '''
+    Turn ACL entries from config commands or "show ip access-lists" output into
+    comparable strings (no sequence numbers, hit counters or extra spaces)
+    '''
+    entries = []
+    for line in lines:
+        line = ACL_MATCHES.sub('', line.strip())
+        line = ACL_SEQUENCE.sub('', line)
+        # IOS shows "permit 10.0.0.0, wildcard bits 0.0.0.255"
+        line = line.replace(', wildcard bits ', ' ')
+        # and "permit 10.0.0.1" for a "permit host 10.0.0.1" entry
+        line = ACL_HOST.sub('', line)
+        entries.append(' '.join(line.split()))
+    return entries
+
+
+REPORT_FIELDS = ['Timestamp', 'Device Name', 'IP address', 'ACL Name', 'Status', 'Error',
+                 'Commit Engine', 'Connect Time (s)', 'Push Time (s)', 'Verify Method', 'Verify Time (s)']
+REPORT_TIMINGS = ['Connect Time (s)', 'Push Time (s)', 'Verify Time (s)']
+
+
+def get_report_name():
+    return f"ACL Report {datetime.now().strftime('%d-%b-%Y')}.csv"
 
 
 class AccessListUpdater:
-    def __init__(self, hostname, device_name, username, password, device_type='ios'):
+    def __init__(self, hostname, device_name, username, password, device_type='ios',
+                 verify_method='login', verify_timeout=3.0, diff_first=False, journal=None,
+                 region='', commit_engine='napalm'):
         self.hostname = hostname
         self.device_name = device_name
+        self.region = region
         self.username = username
         self.password = password
         self.device_type = device_type
-        self.driver = get_network_driver(device_type)
         self.device = None
+        self.acl_name = None
+        self.status = None
+        self.verify_method = verify_method
+        self.verify_timeout = verify_timeout
+        self.verified_by = ''
+        self.verify_time = None
+        self.diff_first = diff_first
+        self.error = ''
+        self.timings = {}
+        self.journal = journal
+        self.commit_engine = commit_engine
+        self.rollback_failed = False
+        # session engine: {acl name: entries before the change}, None until taken
+        self.snapshot = None
+
+    def phase(self, name):
+        # Per-device phase timing for the run summary and --trace
+        return timer.phase(name, self.device_name, self.region)
+
+    def record(self, state):
+        # Write-ahead journal entry used by --resume
+        if self.journal is not None:
+            self.journal.record(self.hostname, state, self.device_name, self.error)
 
     def connect(self):
+        start = time.perf_counter()
         try:
-            self.device = self.driver(hostname=self.hostname, username=self.username, password=self.password)
             print(f"Connecting to {self.hostname}...")
-            self.device.open()
+            with self.phase('connect'):
+                self.device = pool.acquire(self.hostname, self.device_type, self.username, self.password)
+            self.record(change_journal.CONNECTED)
         except Exception as e:
             print(f"Error connecting to {self.hostname}: {str(e)}")
             self.device = None
-            
-    def disconnect(self):
-        self.device.close()
+            self.status = 'Failed'
+            self.error = str(e)
+            self.record(change_journal.FAILED)
+        self.timings['connect'] = time.perf_counter() - start
+
+    def disconnect(self, discard=False):
+        # Hand the session back to the shared pool, which closes it: a push run
+        # never comes back to the same device
+        pool.release(self.hostname, self.device_type, self.username, self.password,
+                     self.device, discard=discard)
         self.device = None
 
     def update_access_list(self, acl_name, acl_commands):
+        if self.push_access_list(acl_name, acl_commands):
+            self.verify_access_list()
+        self.write_report()
+
+    def push_access_list(self, acl_name, acl_commands):
+        return self.push_access_lists([(acl_name, acl_commands)])
+
+    def push_access_lists(self, acls):
+        # acls => [(acl name, commands), ...] committed together
+        start = time.perf_counter()
+        try:
+            return self._push_access_lists(acls)
+        finally:
+            self.timings['push'] = time.perf_counter() - start
+
+    def _push_access_lists(self, acls):
         # Backup the current configuration
         # self.device.backup('pre-update-config')
         # Try to apply the access list configuration commands
-        #global report_row
+        self.acl_name = ', '.join(acl_name for acl_name, _ in acls)
+        if self.device is None:
+            self.status = 'Failed'
+            self.error = self.error or 'Not connected'
+            return False
+        if self.diff_first:
+            with self.phase('diff'):
+                acls = [(acl_name, acl_commands) for acl_name, acl_commands in acls
+                        if not self.acl_in_sync(acl_name, acl_commands)]
+            if not acls:
+                rprint(f'✅ Access list {self.acl_name} already compliant on {self.hostname}, skipping commit')
+                self.status = 'Unchanged'
+                self.record(change_journal.UNCHANGED)
+                return False
+            self.acl_name = ', '.join(acl_name for acl_name, _ in acls)
         try:
-            self.device.load_merge_candidate(config='\n'.join(acl_commands))
-            self.device.commit_config()
+            if self.commit_engine == 'session':
+                self._commit_session(acls)
+            else:
+                self._commit_napalm(acls)
+            self.record(change_journal.COMMITTED)
             rprint(f'✅ Access list updated successfully on {self.hostname}!')
+            return True
+        # Roll back to the previous configuration in case of failure
+        except Exception as e:
+            rprint(f'[red]: {e}')
+            self.error = str(e)
+            if self.rollback():
+                rprint(f'[red]❌ ACL update rolled back for device {self.hostname}')
+            self.status = 'Failed'
+            return False
+
+    def _commit_napalm(self, acls):
+        # Every ACL of the plan goes into one candidate and one commit
+        with self.phase('load_merge_candidate'):
+            self.device.load_merge_candidate(
+                config='\n'.join(command for _, acl_commands in acls for command in acl_commands))
+        with self.phase('commit_config'):
+            self.device.commit_config()
+
+    def _commit_session(self, acls):
+        # Snapshot only the ACLs being changed, then send every ACL in one
+        # config mode session on the Netmiko connection under the NAPALM driver.
+        # Nothing is pushed when the snapshot can't be read.
+        with self.phase('snapshot'):
+            self.snapshot = {acl_name: self.read_acl_config(acl_name) for acl_name, _ in acls}
+        with self.phase('send_config_set'):
+            output = self.device.device.send_config_set(
+                [command for _, acl_commands in acls for command in acl_commands])
+        error = CONFIG_ERRORS.search(output)
+        if error:
+            raise Exception(f'Device rejected the ACL: {error.group(0)}')
+
+    def _restore_session(self):
+        # Put back only the snapshot ACLs, the running-config was never saved.
+        # The raw config lines are replayed as read, so remarks and "host"
+        # entries come back unchanged. A rejected restore line leaves the ACL
+        # half restored, so it fails the rollback like an exception does.
+        commands = [command for acl_name, section in self.snapshot.items()
+                    for command in restore_commands(acl_name, section, self.device_type)]
+        with self.phase('restore'):
+            output = self.device.device.send_config_set(commands)
+        error = CONFIG_ERRORS.search(output)
+        if error:
+            raise Exception(f'Device rejected the restore: {error.group(0)}')
+
+    def save_config(self):
+        # The session engine only persists the change once it has been verified
+        if self.commit_engine != 'session' or self.device is None:
+            return
+        try:
+            with self.phase('save_config'):
+                self.device.device.save_config()
+        except Exception as e:
+            rprint(f'[yellow]ACL verified on {self.hostname} but the config was not saved: {e}')
+            self.error = f'Not saved: {e}'
+
+    def get_acl_entries(self, acl_name):
+        return self.read_acl(acl_name) or []
+
+    def read_acl(self, acl_name):
+        # Returns the normalized entries, or None when the ACL does not exist
+        command = f'show ip access-lists {acl_name}'
+        output = self.device.cli([command])[command]
+        output_archive.record(self.device_name, command, output, self.hostname, self.device_type)
+        if not output.strip():
+            return None
+        # Skip the "Standard IP access list 20" / "IP access list 20" title line
+        return normalize_acl_entries(line for line in output.splitlines()
+                                     if line.strip() and 'access list' not in line.lower())
+
+    def read_acl_config(self, acl_name):
+        # Returns the ACL's running-config lines, or None when the ACL does not exist
+        command = f'show running-config | section ip access-list {acl_name}'
+        output = self.device.cli([command])[command]
+        output_archive.record(self.device_name, command, output, self.hostname, self.device_type)
+        return acl_section(output, acl_name)
+
+    def acl_in_sync(self, acl_name, acl_commands):
+        # Compare the entries on the device with the intended ones, in order.
+        # Any error reading the ACL counts as drift so the push still happens.
+        intended = normalize_acl_entries(command for command in acl_commands
+                                         if not command.startswith(('no ', 'ip access-list')))
+        try:
+            return self.get_acl_entries(acl_name) == intended
+        except Exception as e:
+            rprint(f'[yellow]Could not read access list {acl_name} on {self.hostname}: {e}')
+            return False
 
-            # Check if SSH port is accessible after the change
+    def verify_access_list(self):
+        # Check if SSH port is accessible after the change
+        start = time.perf_counter()
+        try:
             if self.check_ssh_port():
-                rprint(f'✅ SSH connection success for device {self.hostname} after change')   
-                status = 'Success'             
+                rprint(f'✅ SSH connection success for device {self.hostname} after change')
+                self.save_config()
+                self.status = 'Success'
+                self.record(change_journal.VERIFIED)
             else:
                 rprint(f'[red]❌ SSH connection failed for device {self.hostname} after change, rolling back config.')
-                self.device.rollback()
-                rprint(f'[red]❌ Update Failed. ACL rolled back for {self.hostname}')
-                status = 'Failed'
-                #return
-            
-        # Roll back to the previous configuration in case of failure
+                self.error = 'SSH check failed after change'
+                if self.rollback():
+                    rprint(f'[red]❌ Update Failed. ACL rolled back for {self.hostname}')
+                self.status = 'Failed'
         except Exception as e:
-            rprint(f'[red]: ' + str(e))
-            self.device.rollback()
-            rprint(f'[red]❌ ACL update rolled back for device {self.hostname}')
-            status = 'Failed'
-        report_row = {'Timestamp': datetime.now().strftime('%Y-%m-%d'),
-                    'Device Name': self.device_name,
-                    'IP address': self.hostname,
-                    'Status': status}
-        # Write the report to the CSV file
-        report_name = f"ACL Report {datetime.now().strftime('%d-%b-%Y')}.csv"
-        with open(report_name, 'a', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=report_row.keys())
-            if file.tell() == 0:
-                writer.writeheader()
-            writer.writerow(report_row)
-        
+            rprint(f'[red]: {e}')
+            self.error = str(e)
+            if self.rollback():
+                rprint(f'[red]❌ ACL update rolled back for device {self.hostname}')
+            self.status = 'Failed'
+        self.timings['verify'] = time.perf_counter() - start
+        return self.status == 'Success'
+
+    def rollback(self):
+        # Returns True once the previous ACLs are back. A failed rollback is
+        # reported and journaled instead of raised, so the device still reaches
+        # the disconnect and report stages.
+        if self.device is None:
+            return False
+        try:
+            if self.commit_engine == 'session':
+                # Without a snapshot nothing was sent to the device
+                if self.snapshot is None:
+                    return False
+                self._restore_session()
+            else:
+                with self.phase('rollback'):
+                    self.device.rollback()
+        except Exception as e:
+            rprint(f'[red]❌ Rollback failed on {self.hostname}: {e}')
+            # Keep the error that triggered the rollback after the rollback error
+            self.error = '; '.join(filter(None, [f'Rollback failed: {e}', self.error]))
+            self.status = 'Failed'
+            self.rollback_failed = True
+            self.record(change_journal.ROLLBACK_FAILED)
+            return False
+        self.record(change_journal.ROLLED_BACK)
+        return True
+
+    def report_row(self):
+        def seconds(value):
+            return '' if value is None else f'{value:.3f}'
+
+        return {'Timestamp': datetime.now().strftime('%Y-%m-%d'),
+                'Device Name': self.device_name,
+                'IP address': self.hostname,
+                'ACL Name': self.acl_name or '',
+                'Status': self.status or 'Failed',
+                'Error': self.error,
+                'Commit Engine': self.commit_engine,
+                'Connect Time (s)': seconds(self.timings.get('connect')),
+                'Push Time (s)': seconds(self.timings.get('push')),
+                'Verify Method': self.verified_by,
+                'Verify Time (s)': seconds(self.verify_time)}
+
+    def write_report(self, report_writer=None):
+        # Hand the row to the run's report writer, or write it on its own
+        if report_writer is not None:
+            report_writer.write(self.report_row())
+            return
+        with ReportWriter(get_report_name(), REPORT_FIELDS) as writer:
+            writer.write(self.report_row())
+
     def check_ssh_port(self):
+        # 'banner' and 'banner+login' only need a fresh TCP connection that gets an
+        # SSH banner back; 'banner+login' falls back to a full login when the probe
+        # is ambiguous and 'login' always does the full Netmiko login.
+        start = time.perf_counter()
+        if self.verify_method == 'login':
+            self.verified_by = 'login'
+            result = self.check_ssh_login()
+        else:
+            with self.phase('banner probe'):
+                probe, _, _ = probe_ssh_banner(self.hostname, timeout=self.verify_timeout)
+            self.verified_by = 'banner'
+            if probe == OPEN:
+                result = True
+            elif probe == CLOSED:
+                result = False
+            elif self.verify_method == 'banner+login':
+                self.verified_by = 'banner+login'
+                result = self.check_ssh_login()
+            else:
+                result = False
+        self.verify_time = time.perf_counter() - start
+        return result
+
+    def check_ssh_login(self):
+        from netmiko import ConnectHandler, NetmikoTimeoutException, NetmikoAuthenticationException
         if self.device_type == 'ios':
             device_type = 'cisco_ios'
         elif self.device_type  == 'nxos_ssh':
@@ -81,68 +353,158 @@ class AccessListUpdater:
         device = {
             'device_type': device_type,
             'ip': self.hostname,
+            'port': SSH_PORT,
             'username': self.username,
             'password': self.password,
         }
         try:
-            with ConnectHandler(**device) as conn:
+            with self.phase('ssh login'), ConnectHandler(**device) as conn:
                 conn.find_prompt()
                 return True
         except (NetmikoTimeoutException, NetmikoAuthenticationException):
             return False
 
-if __name__ == '__main__':
-    ##########################
-    # Script Arguments
-    ##########################
+
+def get_acl_commands(acl_name, device_type, plan=None):
+    # Rendered once per platform by the change plan (acl_plan.py)
+    return (plan or load_plan()).commands(acl_name, device_type)
+
+
+def get_updaters(device_csv, username, password, verify_method='login', verify_timeout=3.0,
+                 diff_first=False, journal=None, commit_engine='napalm'):
+    with open(device_csv, 'r') as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            if 'nexus' in row['machine type'].lower():
+                device_type = 'nxos_ssh'
+            else:
+                device_type = 'ios'
+
+            yield AccessListUpdater(hostname=row['IP Address'], device_name=row['Device Name'], username=username, password=password,
+                                    device_type=device_type, verify_method=verify_method,
+                                    verify_timeout=verify_timeout, diff_first=diff_first,
+                                    journal=journal, region=row.get('Region', ''),
+                                    commit_engine=commit_engine)
+
+
+##########################
+# Pipeline Stages
+##########################
+def connect_stage(acl_updater):
+    acl_updater.connect()
+    return acl_updater
+
+
+def push_stage(acl_updater, plan=None):
+    plan = plan or load_plan()
+    acl_updater.push_access_lists(plan.render(acl_updater.device_type))
+    return acl_updater
+
+
+def verify_stage(acl_updater):
+    # Only freshly committed devices have no status yet
+    try:
+        if acl_updater.device is not None and acl_updater.status is None:
+            acl_updater.verify_access_list()
+    finally:
+        # A session left in an unknown state by a failed rollback is not reused
+        acl_updater.disconnect(discard=acl_updater.rollback_failed)
+    return acl_updater
+
+
+def report_stage(acl_updater, report_writer=None):
+    acl_updater.write_report(report_writer)
+    return acl_updater
+
+
+def main(argv=None):
+    '''
+    Main Script
+        - argv => command line arguments (default: sys.argv)
+    '''
     parser = argparse.ArgumentParser(description="Credential to update ACL")
-    parser.add_argument('-u', '--username', type=str, metavar='',\
+    parser.add_argument('-u', '--username', type=str, metavar='USERNAME',\
         help='Username to access network device', required=True)
-    parser.add_argument('-p', '--password', type=str, metavar='',\
+    parser.add_argument('-p', '--password', type=str, metavar='PASSWORD',\
         help='Password to access network device', required=True)
-    args = parser.parse_args()
+    parser.add_argument('--connect-workers', type=int, default=50, metavar='',\
+        help='Concurrent NAPALM sessions being opened (default: 50)')
+    parser.add_argument('--push-workers', type=int, default=100, metavar='',\
+        help='Concurrent ACL commits (default: 100)')
+    parser.add_argument('--verify-workers', type=int, default=100, metavar='',\
+        help='Concurrent post-change SSH checks (default: 100)')
+    parser.add_argument('--verify', type=str, default='banner+login', choices=VERIFY_METHODS,\
+        help='Post-change SSH check: banner probe only, banner probe with login fallback, or full login (default: banner+login)')
+    parser.add_argument('--verify-timeout', type=float, default=3.0, metavar='',\
+        help='Seconds to wait for the SSH banner probe (default: 3)')
+    parser.add_argument('--commit-engine', type=str, default='napalm', choices=COMMIT_ENGINES,\
+        help='napalm: candidate file, commit and full rollback; session: one config session, '
+             'only the pushed ACLs are snapshot/restored and the config is saved after verification '
+             '(default: napalm)')
+    parser.add_argument('--diff', action='store_true',\
+        help='Read the current ACL first and only commit devices where it differs')
+    parser.add_argument('--parquet', action='store_true',\
+        help='Also write the report as a Parquet file (needs pyarrow)')
+    parser.add_argument('--plan', type=str, default=None, metavar='',\
+        help='JSON change plan of the ACLs to push, defaults to the built-in plan (ACL 20)')
+    parser.add_argument('--acl', nargs='+', default=None, metavar='NAME',\
+        help='Only push these ACLs of the change plan (default: all)')
+    parser.add_argument('--journal', type=str, default=change_journal.JOURNAL_FILE, metavar='',\
+        help=f'Per-device state journal (default: {change_journal.JOURNAL_FILE})')
+    parser.add_argument('--resume', action='store_true',\
+        help='Skip devices the journal shows as verified or unchanged for this change plan')
+    reachability.add_arguments(parser)
+    phase_timer.add_arguments(parser)
+    output_archive.add_arguments(parser)
+    args = parser.parse_args(argv)
+    output_archive.from_args(args)
+    plan = load_plan(args.plan)
+    if args.acl:
+        plan = plan.select(args.acl)
     username = args.username
     password = args.password
 
-    with open('devices.csv', 'r') as file:
-        reader = csv.DictReader(file)
-        with ThreadPoolExecutor(max_workers=100) as executor:
-            futures = []
-            results = []
-            for row in reader:
-                if 'nexus' in row['machine type'].lower():
-                    device_type = 'nxos_ssh'
-                else:
-                    device_type = 'ios'
-
-                acl_updater = AccessListUpdater(hostname=row['IP Address'], device_name=row['Device Name'], username=username, password=password,
-                                                device_type=device_type)
-                acl_updater.connect()
-
-                acl_name = '20'
-                if device_type == 'ios':
-                    acl_commands = [
-                        'no ip access-list standard ' + acl_name,
-                        'ip access-list standard ' + acl_name,
-                        'permit 172.20.10.0 0.0.0.15',
-                        'permit 139.65.136.0 0.0.3.255',
-                        'permit 139.65.140.0 0.0.3.255',
-                        'deny any log'
-                    ]
-                else:
-                    acl_commands = [
-                        'no ip access-list ' + acl_name,
-                        'ip access-list ' + acl_name,
-                        'permit ip 172.20.10.0/28 any',
-                        'permit ip 139.65.136.0/22 any',
-                        'permit ip 139.65.140.0/22 any',
-                        'deny ip any any log'
-                    ]
-
-                # Schedule the update as a concurrent task
-                future = executor.submit(acl_updater.update_access_list, acl_name, acl_commands)
-                futures.append(future)
-
-            # Wait for all the updates to complete
-            for future in futures:
-                future.result()
+    # connect -> push -> verify -> report, each stage with its own concurrency.
+    # Finished rows go to one report writer thread that batches the file writes.
+    # Parquet files can't be appended to, so every run gets its own file
+    parquet_path = None
+    if args.parquet:
+        parquet_path = f"ACL Report {datetime.now().strftime('%d-%b-%Y %H%M%S')}.parquet"
+    with ChangeJournal(args.journal, plan.digest) as journal, \
+         ReportWriter(get_report_name(), REPORT_FIELDS, parquet_path=parquet_path,
+                      numeric_fields=REPORT_TIMINGS) as report_writer:
+        pipeline = Pipeline([
+            Stage('connect', connect_stage, workers=args.connect_workers),
+            Stage('push', partial(push_stage, plan=plan), workers=args.push_workers),
+            Stage('verify', verify_stage, workers=args.verify_workers),
+            Stage('report', partial(report_stage, report_writer=report_writer), workers=1),
+        ])
+        updaters = get_updaters('devices.csv', username, password,
+                                verify_method=args.verify, verify_timeout=args.verify_timeout,
+                                diff_first=args.diff, journal=journal,
+                                commit_engine=args.commit_engine)
+        # A resumed run only retries devices that are not verified/unchanged yet
+        completed = journal.completed() if args.resume else set()
+        updaters = list(updaters)
+        skipped = len(updaters)
+        updaters = [acl_updater for acl_updater in updaters if acl_updater.hostname not in completed]
+        skipped -= len(updaters)
+        if args.resume:
+            rprint(f'[cyan]Resuming: {skipped} devices already done, {len(updaters)} to go[/cyan]')
+        for acl_updater in updaters:
+            acl_updater.record(change_journal.PENDING)
+        # Dead devices are reported without ever opening a session
+        updaters, unreachable = reachability.prescan(updaters, args.prescan, args.prescan_timeout,
+                                                     host_of=lambda acl_updater: acl_updater.hostname)
+        for acl_updater, reason in unreachable:
+            acl_updater.status = UNREACHABLE
+            acl_updater.error = reason
+            acl_updater.record(change_journal.UNREACHABLE)
+            acl_updater.write_report(report_writer)
+        pipeline.run(updaters)
+    phase_timer.report(args)
+    output_archive.close()
+
+
+if __name__ == '__main__':
+    main()
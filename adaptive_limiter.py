@@ -0,0 +1,288 @@
+"""
+Adaptive (AIMD) concurrency limiter for the SSH fan-out
+
+Replaces the fixed ThreadPoolExecutor(max_workers=100) of the collectors. Each
+limiter watches the connect/auth latency and the error rate of the sessions it
+lets through:
+    - healthy window and the limit was reached => raise the limit (additive increase)
+    - p90 latency above target or too many errors => halve the limit (multiplicative decrease)
+
+Devices are limited per region or per AAA server (LimiterGroup), so a slow
+TACACS cluster or a degraded WAN link only throttles the devices behind it.
+The region => AAA server table comes from the AAA_SERVERS environment variable,
+e.g. AAA_SERVERS="US=tacacs-us,EMEA=tacacs-eu,APAC=tacacs-eu".
+Every decision is printed and kept so it can be written to a csv for tuning.
+"""
+import csv
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from rich import print as rprint
+
+
+##########################
+# Global Variables
+##########################
+DEFAULT_INITIAL = 20
+DEFAULT_MAXIMUM = 200
+TARGET_LATENCY = 10.0  # seconds, p90 connect/auth time before backing off
+MAX_ERROR_RATE = 0.1
+WINDOW = 20  # completed sessions per decision
+DEFAULT_BUDGET = 200  # concurrent sessions across every limiter, i.e. worker threads
+
+
+def load_aaa_servers(value):
+    '''
+    Parse "REGION=server,REGION=server" into {region: AAA server}
+    '''
+    servers = {}
+    for pair in filter(None, (pair.strip() for pair in value.split(","))):
+        region, _, server = pair.partition("=")
+        if not server.strip():
+            raise ValueError(f"AAA_SERVERS: expected REGION=server, got {pair!r}")
+        servers[region.strip()] = server.strip()
+    return servers
+
+
+# Region => AAA server group authenticating its devices, devices of regions that
+# share a TACACS cluster share one limiter with --limit-by aaa
+AAA_SERVERS = load_aaa_servers(os.environ.get("AAA_SERVERS", ""))
+LOG_FIELDS = ["Timestamp", "Limiter", "Old limit", "New limit", "Samples", "Error rate",
+              "p90 latency (s)", "Reason"]
+
+
+class _Slot:
+    def __init__(self, generation):
+        self.generation = generation
+        self.start = time.perf_counter()
+        self.latency = None
+
+    def connected(self):
+        '''
+        Mark the session as established, the latency sample stops here
+        '''
+        self.latency = time.perf_counter() - self.start
+
+
+##########################
+# Adaptive Limiter
+##########################
+class AdaptiveLimiter:
+    '''
+    AIMD concurrency limit shared by worker threads
+        - name => limiter name used in the decision log
+        - initial/minimum/maximum => concurrent sessions
+        - target_latency => p90 connect/auth seconds considered healthy
+        - max_error_rate => failed sessions ratio considered healthy
+        - window => completed sessions per decision
+        - increase => sessions added after a healthy window
+        - decrease => factor applied to the limit after an unhealthy window
+    '''
+    def __init__(self, name, initial=DEFAULT_INITIAL, minimum=1, maximum=DEFAULT_MAXIMUM,
+                 target_latency=TARGET_LATENCY, max_error_rate=MAX_ERROR_RATE, window=WINDOW,
+                 increase=5, decrease=0.5):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = max(minimum, min(initial, maximum))
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.decisions = []
+        self._samples = []
+        self._saturated = False
+        self._generation = 0
+        self._cond = threading.Condition()
+
+    @property
+    def adaptive(self):
+        return self.minimum != self.maximum
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            if self.in_flight >= self.limit:
+                self._saturated = True
+            return _Slot(self._generation)
+
+    def release(self, slot, ok=True):
+        with self._cond:
+            self.in_flight -= 1
+            # Sessions started before the last back-off describe the old limit
+            if self.adaptive and slot.generation == self._generation:
+                latency = slot.latency
+                if latency is None:
+                    latency = time.perf_counter() - slot.start
+                self._samples.append((latency, ok))
+                if len(self._samples) >= self.window:
+                    self._decide()
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        '''
+        Hold one session slot, an exception counts as a failed session
+        Call slot.connected() once logged in to sample only the connect/auth time.
+        '''
+        slot = self.acquire()
+        ok = False
+        try:
+            yield slot
+            ok = True
+        finally:
+            self.release(slot, ok)
+
+    def _decide(self):
+        # Caller must hold self._cond
+        latencies = sorted(latency for latency, _ in self._samples)
+        p90 = latencies[int(0.9 * (len(latencies) - 1))]
+        error_rate = sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+        old_limit = self.limit
+        if error_rate > self.max_error_rate:
+            reason = "error rate"
+        elif p90 > self.target_latency:
+            reason = "latency"
+        elif self._saturated:
+            reason = "healthy"
+        else:
+            reason = "below limit"
+        if reason in ("error rate", "latency"):
+            self.limit = max(self.minimum, int(self.limit * self.decrease))
+            self._generation += 1
+        elif reason == "healthy":
+            self.limit = min(self.maximum, self.limit + self.increase)
+        decision = {
+            "Timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "Limiter": self.name,
+            "Old limit": old_limit,
+            "New limit": self.limit,
+            "Samples": len(self._samples),
+            "Error rate": round(error_rate, 3),
+            "p90 latency (s)": round(p90, 3),
+            "Reason": reason,
+        }
+        self.decisions.append(decision)
+        if self.limit != old_limit:
+            rprint(f"[dim]⚙ {self.name}: concurrency {old_limit} → {self.limit} ({reason}, "
+                   f"p90 {p90:.1f}s, errors {error_rate:.0%})[/dim]")
+        self._samples = []
+        self._saturated = False
+
+
+##########################
+# Limiter Group
+##########################
+class LimiterGroup:
+    '''
+    One AdaptiveLimiter per region or AAA server
+        - by => "region", "aaa" (needs AAA_SERVERS) or None (one limiter for every device)
+        - budget => concurrent sessions across every limiter, the worker threads of map()
+        - options => AdaptiveLimiter arguments
+    '''
+    def __init__(self, by="region", budget=DEFAULT_BUDGET, **options):
+        if by not in ("region", "aaa", None):
+            raise ValueError(f"Unknown limiter key: {by}")
+        if by == "aaa" and not AAA_SERVERS:
+            raise ValueError("Limiting by AAA server needs the AAA_SERVERS region=server mapping")
+        self.by = by
+        self.budget = budget
+        self.options = options
+        self.limiters = {}
+        self._lock = threading.Lock()
+
+    def key(self, device):
+        region = device.get("Region") or "default"
+        if self.by == "region":
+            return region
+        if self.by == "aaa":
+            return AAA_SERVERS.get(region, region)
+        return "all"
+
+    def get(self, device):
+        key = self.key(device)
+        with self._lock:
+            if key not in self.limiters:
+                self.limiters[key] = AdaptiveLimiter(key, **self.options)
+            return self.limiters[key]
+
+    def slot(self, device):
+        '''
+        Hold a session slot of the device's limiter (see AdaptiveLimiter.slot)
+        '''
+        return self.get(device).slot()
+
+    def map(self, func, devices):
+        '''
+        Run func(device) on worker threads, as many at once as the limiters allow
+        Devices are interleaved across limiters so one throttled region does not
+        hold every worker thread.
+        '''
+        queues = {}
+        for device in devices:
+            queues.setdefault(self.key(device), []).append(device)
+        if not queues:
+            return []
+        ordered = [device for batch in itertools.zip_longest(*queues.values())
+                   for device in batch if device is not None]
+        # Threads beyond the budget would only wait for a slot
+        maximum = self.options.get("maximum", DEFAULT_MAXIMUM)
+        with ThreadPoolExecutor(max_workers=min(self.budget, maximum * len(queues))) as executor:
+            return list(executor.map(func, ordered))
+
+    @property
+    def decisions(self):
+        return sorted((decision for limiter in self.limiters.values()
+                       for decision in limiter.decisions), key=lambda decision: decision["Timestamp"])
+
+    def write_log(self, path):
+        '''
+        Write every concurrency decision to a csv file
+        '''
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=LOG_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.decisions)
+        return path
+
+
+def fixed(workers=100):
+    '''
+    LimiterGroup with a constant limit, the former ThreadPoolExecutor(max_workers=100)
+    '''
+    return LimiterGroup(by=None, budget=workers, initial=workers, minimum=workers, maximum=workers)
+
+
+def from_args(args):
+    '''
+    Build the LimiterGroup selected by the --engine/--limit-by/--max-concurrency flags
+    '''
+    if args.engine != "adaptive":
+        return fixed()
+    try:
+        return LimiterGroup(by=None if args.limit_by == "none" else args.limit_by,
+                            budget=args.concurrency_budget, maximum=args.max_concurrency)
+    except ValueError as err:
+        raise SystemExit(f"--limit-by {args.limit_by}: {err}") from err
+
+
+def add_arguments(parser):
+    '''
+    Add the adaptive limiter flags to a script's argument parser
+    '''
+    parser.add_argument('--limit-by', type=str, default="region", choices=["region", "aaa", "none"],\
+        help='Adaptive engine: separate concurrency limit per region or per AAA server '
+             'of the AAA_SERVERS="REGION=server,..." mapping (default: region)')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAXIMUM, metavar='',\
+        help=f'Adaptive engine: upper concurrency limit per limiter (default: {DEFAULT_MAXIMUM})')
+    parser.add_argument('--concurrency-budget', type=int, default=DEFAULT_BUDGET, metavar='',\
+        help=f'Adaptive engine: concurrent sessions across every limiter (default: {DEFAULT_BUDGET})')
+    parser.add_argument('--concurrency-log', type=str, default=None, metavar='',\
+        help='Write the adaptive concurrency decisions to this csv file')
@@ -0,0 +1,126 @@
+"""
+Asyncio collection engine
+
+Alternative to the ThreadPoolExecutor(max_workers=100) fan-out used by the
+fleet scripts. Every device is a coroutine on a single event loop running an
+asyncssh session, so thousands of devices can be in flight at once; the number
+of concurrent sessions is bounded by a semaphore.
+
+Results are handed to the same on_output/on_error callbacks the thread-based
+path uses, so both engines produce identical reports.
+"""
+import asyncio
+from reachability import SSH_PORT
+
+
+DEFAULT_CONCURRENCY = 1000
+COMMAND_TIMEOUT = 60  # seconds a command (or a config session) may run
+
+
+def _asyncssh():
+    try:
+        import asyncssh
+    except ImportError as err:
+        raise SystemExit("The async engine needs asyncssh: pip install asyncssh") from err
+    return asyncssh
+
+
+##########################
+# Per-device coroutines
+##########################
+async def _connect(asyncssh, host, username, password, connect_timeout):
+    return await asyncssh.connect(host, port=SSH_PORT, username=username, password=password,
+                                  known_hosts=None, connect_timeout=connect_timeout)
+
+
+async def _wait(awaitable, timeout, what):
+    # A hung command must fail its device, not hold a semaphore slot forever
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"{what} timed out after {timeout}s") from None
+
+
+async def _run_commands(asyncssh, semaphore, device, host, commands, username, password,
+                        on_output, on_error, connect_timeout, command_timeout):
+    # A failing callback is reported like a failed device, so it can't abort
+    # the other coroutines of the gather
+    try:
+        async with semaphore:
+            async with await _connect(asyncssh, host, username, password, connect_timeout) as conn:
+                cli_output = {}
+                for command in commands:
+                    result = await _wait(conn.run(command, check=False), command_timeout, command)
+                    cli_output[command] = result.stdout
+        on_output(device, cli_output)
+    except Exception as err:
+        on_error(device, err)
+
+
+async def _send_config(asyncssh, semaphore, device, host, config_lines, username, password,
+                       on_output, on_error, connect_timeout, command_timeout):
+    try:
+        async with semaphore:
+            async with await _connect(asyncssh, host, username, password, connect_timeout) as conn:
+                # IOS has no exec channel for config mode, drive an interactive shell
+                script = ['terminal length 0', 'configure terminal'] + list(config_lines) + ['end', 'exit']
+                async with conn.create_process(term_type='vt100') as process:
+                    process.stdin.write('\n'.join(script) + '\n')
+                    output = await _wait(process.stdout.read(), command_timeout, 'Config session')
+        on_output(device, output)
+    except Exception as err:
+        on_error(device, err)
+
+
+async def _gather(coroutines):
+    await asyncio.gather(*coroutines)
+
+
+##########################
+# Engine entry points
+##########################
+def run_commands(devices, commands, username, password, on_output, on_error,
+                 concurrency=DEFAULT_CONCURRENCY, host_key="IP Address", connect_timeout=30,
+                 command_timeout=COMMAND_TIMEOUT):
+    '''
+    Run show commands on every device and report through callbacks
+        - devices => iterable of device records (mapping with host_key)
+        - commands => list of commands, results are keyed like NAPALM device.cli()
+        - on_output => callable(device, {command: output})
+        - on_error => callable(device, exception)
+        - concurrency => maximum number of concurrent SSH sessions
+        - command_timeout => seconds each command may run before the device fails
+    '''
+    asyncssh = _asyncssh()
+
+    async def _main():
+        semaphore = asyncio.Semaphore(concurrency)
+        await _gather(
+            _run_commands(asyncssh, semaphore, device, device[host_key], commands, username,
+                          password, on_output, on_error, connect_timeout, command_timeout)
+            for device in devices
+        )
+
+    asyncio.run(_main())
+
+
+def send_config(devices, config_lines, username, password, on_output, on_error,
+                concurrency=DEFAULT_CONCURRENCY, host_key="IP Address", connect_timeout=30,
+                command_timeout=COMMAND_TIMEOUT):
+    '''
+    Apply configuration lines on every device and report through callbacks
+        - config_lines => lines entered in configuration mode
+        - on_output => callable(device, session output)
+        - command_timeout => seconds the config session may run before the device fails
+    '''
+    asyncssh = _asyncssh()
+
+    async def _main():
+        semaphore = asyncio.Semaphore(concurrency)
+        await _gather(
+            _send_config(asyncssh, semaphore, device, device[host_key], config_lines, username,
+                         password, on_output, on_error, connect_timeout, command_timeout)
+            for device in devices
+        )
+
+    asyncio.run(_main())
@@ -0,0 +1,204 @@
+"""
+Fleet benchmark against the simulated device fleet (device_simulator.py)
+
+For every fleet size the benchmark starts the simulator (sharded over a few
+processes), writes a matching device_list.csv/devices.csv into a scratch
+directory and runs each entry point there with SSH_PORT pointing at the
+simulator. Every run reports wall time, devices/sec and the peak memory of the
+script's process.
+
+With --baseline the results are compared with an earlier benchmark report and
+the exit code is 1 when throughput dropped or memory grew beyond --tolerance,
+so a regression shows up before the change reaches production.
+"""
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from rich import print as rprint
+import device_simulator
+
+
+##########################
+# Global Variables
+##########################
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SIZES = [100, 1000, 10000]
+DEVICES_PER_SHARD = 2500
+REPORT_NAME = "Benchmark report {date}.csv"
+FIELDNAMES = ['Entry point', 'Devices', 'Wall time (s)', 'Devices/s', 'Peak memory (MB)', 'Exit code']
+USERNAME = device_simulator.DEFAULT_USERNAME
+PASSWORD = device_simulator.DEFAULT_PASSWORD
+ENTRY_POINTS = {
+    'check_reload': ['check_reload.py'],
+    'check_scp': ['check_scp.py'],
+    'collector': ['collector.py', '-u', USERNAME, '-p', PASSWORD],
+    'scp_update': ['scp_update.py', '-u', USERNAME, '-p', PASSWORD],
+    'acl_update20': ['acl_update20.py', '-u', USERNAME, '-p', PASSWORD],
+}
+
+
+##########################
+# Simulator
+##########################
+def start_simulator(devices, port, options):
+    '''
+    Start the simulated fleet in DEVICES_PER_SHARD sized processes and wait until they serve
+        - options => extra device_simulator.py arguments (latency, failure rate...)
+    '''
+    shards = []
+    for start in range(0, devices, DEVICES_PER_SHARD):
+        command = [sys.executable, os.path.join(SCRIPT_DIR, 'device_simulator.py'),
+                   '--devices', str(min(DEVICES_PER_SHARD, devices - start)), '--start', str(start),
+                   '--port', str(port)] + options
+        shards.append(subprocess.Popen(command, stdout=subprocess.PIPE, text=True))
+    for shard in shards:
+        line = shard.stdout.readline()
+        if not line.startswith('READY'):
+            stop_simulator(shards)
+            raise SystemExit(f"Device simulator failed to start: {line.strip() or 'no output'}")
+    return shards
+
+
+def stop_simulator(shards):
+    for shard in shards:
+        shard.terminate()
+    for shard in shards:
+        shard.wait()
+
+
+##########################
+# Benchmark
+##########################
+def run_entry_point(name, devices, workdir, port):
+    '''
+    Run one script on the simulated fleet, returns a report row
+    '''
+    command = [sys.executable, os.path.join(SCRIPT_DIR, ENTRY_POINTS[name][0])] + ENTRY_POINTS[name][1:]
+    env = dict(os.environ, SSH_PORT=str(port))
+    with open(os.path.join(workdir, f'{name}.log'), 'w') as log_file:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log_file,
+                                   stderr=subprocess.STDOUT)
+        # wait4 gives the resource usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - start
+    return {
+        'Entry point': name,
+        'Devices': devices,
+        'Wall time (s)': round(wall_time, 2),
+        'Devices/s': round(devices / wall_time, 1),
+        # ru_maxrss is in kilobytes on Linux
+        'Peak memory (MB)': round(usage.ru_maxrss / 1024, 1),
+        'Exit code': os.waitstatus_to_exitcode(status),
+    }
+
+
+def benchmark(sizes, entry_points, port, options, keep=False):
+    '''
+    Run every entry point against every fleet size, returns the report rows
+    '''
+    rows = []
+    for devices in sizes:
+        workdir = tempfile.mkdtemp(prefix=f'benchmark-{devices}-')
+        device_simulator.write_inventory(workdir, devices)
+        rprint(f"[yellow]Starting {devices} simulated devices...[/yellow]")
+        shards = start_simulator(devices, port, options)
+        try:
+            for name in entry_points:
+                row = run_entry_point(name, devices, workdir, port)
+                rprint(f"{'✅' if row['Exit code'] == 0 else '❌'} {name:<13} {devices:>6} devices "
+                       f"{row['Wall time (s)']:>8.1f}s {row['Devices/s']:>8.1f} dev/s "
+                       f"{row['Peak memory (MB)']:>8.1f} MB")
+                rows.append(row)
+        finally:
+            stop_simulator(shards)
+            if keep:
+                rprint(f"[yellow]Logs and reports kept in {workdir}[/yellow]")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def compare(rows, baseline_path, tolerance):
+    '''
+    Compare with an earlier benchmark report, returns the regression messages
+    '''
+    with open(baseline_path, newline='') as baseline_file:
+        baseline = {(row['Entry point'], int(row['Devices'])): row for row in csv.DictReader(baseline_file)}
+    regressions = []
+    for row in rows:
+        previous = baseline.get((row['Entry point'], row['Devices']))
+        if previous is None:
+            continue
+        throughput = float(previous['Devices/s'])
+        memory = float(previous['Peak memory (MB)'])
+        if row['Devices/s'] < throughput * (1 - tolerance):
+            regressions.append(f"{row['Entry point']} @ {row['Devices']}: {row['Devices/s']} dev/s "
+                               f"(baseline {throughput})")
+        if row['Peak memory (MB)'] > memory * (1 + tolerance):
+            regressions.append(f"{row['Entry point']} @ {row['Devices']}: {row['Peak memory (MB)']} MB "
+                               f"(baseline {memory})")
+    return regressions
+
+
+##########################
+# Main Script
+##########################
+def main(argv=None):
+    '''
+    Main Script
+    '''
+    parser = argparse.ArgumentParser(description="Benchmark the fleet scripts on a simulated fleet")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, metavar='N',\
+        help=f'Fleet sizes to run (default: {" ".join(map(str, SIZES))})')
+    parser.add_argument('--entry-points', nargs='+', default=list(ENTRY_POINTS), choices=list(ENTRY_POINTS),\
+        help='Scripts to benchmark (default: all)')
+    parser.add_argument('--port', type=int, default=device_simulator.DEFAULT_PORT, metavar='',\
+        help=f'SSH port of the simulated devices (default: {device_simulator.DEFAULT_PORT})')
+    parser.add_argument('--latency', type=float, default=0.05, metavar='',\
+        help='Simulated seconds per command (default: 0.05)')
+    parser.add_argument('--auth-delay', type=float, default=0.2, metavar='',\
+        help='Simulated seconds per login (default: 0.2)')
+    parser.add_argument('--failure-rate', type=float, default=0, metavar='',\
+        help='Share of simulated logins rejected (default: 0)')
+    parser.add_argument('--hang-rate', type=float, default=0, metavar='',\
+        help='Share of simulated sessions that never show a prompt (default: 0)')
+    parser.add_argument('--baseline', type=str, default=None, metavar='',\
+        help='Earlier benchmark report to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, metavar='',\
+        help='Allowed throughput drop / memory growth against the baseline (default: 0.2)')
+    parser.add_argument('--keep', action='store_true',\
+        help='Keep the scratch directories with the script logs and reports')
+    args = parser.parse_args(argv)
+
+    options = ['--latency', str(args.latency), '--auth-delay', str(args.auth_delay),
+               '--failure-rate', str(args.failure_rate), '--hang-rate', str(args.hang_rate)]
+    rows = benchmark(args.sizes, args.entry_points, args.port, options, args.keep)
+
+    report_name = REPORT_NAME.format(date=datetime.now().strftime('%d-%b-%Y %H%M%S'))
+    with open(report_name, 'w', newline='') as report_file:
+        writer = csv.DictWriter(report_file, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(rows)
+    rprint(f"✅ {report_name} - Successfully generated!")
+
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.tolerance)
+        for regression in regressions:
+            rprint(f"[red]❌ Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        rprint("✅ No regression against the baseline")
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    main()
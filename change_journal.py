@@ -0,0 +1,111 @@
+"""
+Write-ahead journal for fleet-wide configuration pushes
+
+Every state change of a device (pending, connected, committed, verified,
+rolled back...) is appended as one JSON line as soon as it happens. The last
+line of a device is its current state, so after a crash or a kill the journal
+tells exactly which devices were already done and a resumed run only retries
+the unfinished or failed ones.
+
+Lines carry the digest of the change plan they belong to: a device that was
+verified under a different plan is not considered done.
+"""
+import json
+import os
+import threading
+import time
+
+
+##########################
+# Device states
+##########################
+PENDING = 'pending'
+CONNECTED = 'connected'
+COMMITTED = 'committed'
+VERIFIED = 'verified'
+ROLLED_BACK = 'rolled back'
+ROLLBACK_FAILED = 'rollback failed'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+UNREACHABLE = 'unreachable'
+
+# Devices in these states are skipped by a resumed run
+COMPLETED = (VERIFIED, UNCHANGED)
+# Worth an fsync: losing them would mean re-committing or forgetting a rollback
+DURABLE = (COMMITTED, ROLLED_BACK, ROLLBACK_FAILED)
+
+JOURNAL_FILE = "acl_journal.jsonl"
+
+
+##########################
+# Change Journal
+##########################
+class ChangeJournal:
+    '''
+    Append-only per-device state journal
+        - path => JSON lines journal, kept across runs
+        - plan => digest of the change plan being pushed
+    '''
+    def __init__(self, path=JOURNAL_FILE, plan=''):
+        self.path = path
+        self.plan = plan
+        self._lock = threading.Lock()
+        self._file = open(path, 'a')
+        # Start on a fresh line after a torn last line of a killed run
+        if self._file.tell() and not self._ends_with_newline():
+            self._file.write('\n')
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as journal_file:
+            journal_file.seek(-1, os.SEEK_END)
+            return journal_file.read(1) == b'\n'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, host, state, device_name='', error=''):
+        '''
+        Append one state change, safe to call from any thread
+        '''
+        entry = {'ts': time.strftime('%Y-%m-%d %H:%M:%S'), 'host': host, 'device': device_name,
+                 'plan': self.plan, 'state': state}
+        if error:
+            entry['error'] = error
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if state in DURABLE:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def states(self):
+        '''
+        Return {host: last journal entry} for the current plan
+        '''
+        states = {}
+        with self._lock:
+            self._file.flush()
+            with open(self.path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line of a killed run
+                        continue
+                    if entry.get('plan') == self.plan:
+                        states[entry['host']] = entry
+        return states
+
+    def completed(self):
+        '''
+        Hosts whose last state under the current plan is verified or unchanged
+        '''
+        return {host for host, entry in self.states().items() if entry['state'] in COMPLETED}
@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import change_journal
+from change_journal import ChangeJournal
+
+
+class TestChangeJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "acl_journal.jsonl")
+
+    def journal(self, plan="plan-a"):
+        journal = ChangeJournal(self.path, plan=plan)
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_last_state_wins(self):
+        journal = self.journal()
+        journal.record("10.0.0.1", change_journal.CONNECTED, "sw1")
+        journal.record("10.0.0.1", change_journal.COMMITTED, "sw1")
+        journal.record("10.0.0.2", change_journal.FAILED, "sw2", "Authentication failed")
+        journal.record("10.0.0.1", change_journal.VERIFIED, "sw1")
+        states = journal.states()
+        self.assertEqual(states["10.0.0.1"]["state"], change_journal.VERIFIED)
+        self.assertEqual(states["10.0.0.2"]["error"], "Authentication failed")
+        self.assertNotIn("error", states["10.0.0.1"])
+
+    def test_completed_only_verified_or_unchanged(self):
+        journal = self.journal()
+        journal.record("10.0.0.1", change_journal.VERIFIED)
+        journal.record("10.0.0.2", change_journal.UNCHANGED)
+        journal.record("10.0.0.3", change_journal.ROLLED_BACK)
+        journal.record("10.0.0.4", change_journal.ROLLBACK_FAILED)
+        journal.record("10.0.0.5", change_journal.COMMITTED)
+        # A device verified earlier and failed on a later run is not done
+        journal.record("10.0.0.6", change_journal.VERIFIED)
+        journal.record("10.0.0.6", change_journal.FAILED)
+        self.assertEqual(journal.completed(), {"10.0.0.1", "10.0.0.2"})
+
+    def test_completed_is_tied_to_the_plan_digest(self):
+        journal = self.journal("plan-a")
+        journal.record("10.0.0.1", change_journal.VERIFIED)
+        journal.close()
+
+        journal = self.journal("plan-b")
+        self.assertEqual(journal.completed(), set())
+        journal.record("10.0.0.2", change_journal.VERIFIED)
+        self.assertEqual(journal.completed(), {"10.0.0.2"})
+        journal.close()
+
+        self.assertEqual(self.journal("plan-a").completed(), {"10.0.0.1"})
+
+    def test_torn_last_line(self):
+        journal = self.journal()
+        journal.record("10.0.0.1", change_journal.VERIFIED)
+        journal.close()
+        # A killed run left half a line behind
+        with open(self.path, "a") as journal_file:
+            journal_file.write('{"ts": "2026-10-18 10:00:00", "host": "10.0.0.2", "pl')
+
+        journal = self.journal()
+        self.assertEqual(journal.completed(), {"10.0.0.1"})
+        journal.record("10.0.0.2", change_journal.VERIFIED)
+        self.assertEqual(journal.completed(), {"10.0.0.1", "10.0.0.2"})
+        journal.close()
+        with open(self.path) as journal_file:
+            lines = journal_file.read().splitlines()
+        # The new entry starts on its own line after the torn one
+        self.assertEqual(json.loads(lines[-1])["host"], "10.0.0.2")
+        self.assertEqual(len(lines), 3)
+
+    def test_concurrent_records(self):
+        journal = self.journal()
+        hosts = [f"10.0.{index // 250}.{index % 250}" for index in range(1000)]
+        threads = [threading.Thread(target=lambda chunk: [journal.record(host, change_journal.VERIFIED)
+                                                          for host in chunk],
+                                    args=(hosts[index::8],)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(journal.completed(), set(hosts))
+        journal.close()
+        with open(self.path) as journal_file:
+            self.assertEqual(len([json.loads(line) for line in journal_file]), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,281 @@
+"""
+Script to run several audit checks on Cisco devices in a single login per device
+
+Applicable only for IOS/IOS-XE devices
+
+Workflow:
+    - Read the device inventory (device_list.csv) captured from Solarwinds Query.
+    - Log into each device once and run the commands of every selected check
+      with a single device.cli([...]) call.
+    - Generate one CSV report per check (same reports as check_reload.py, check_scp.py
+      and test.py), or one combined wide report with --wide.
+"""
+import argparse
+import time
+from datetime import datetime
+from rich import print as rprint
+import adaptive_limiter
+import async_engine
+import output_archive
+import parsers
+import phase_timer
+import reachability
+from config_cache import cache, parse_show_run
+from inventory import classify_platform, load_devices, DeviceRecord, IOS
+from inventory_store import InventoryStore
+from result_sink import ResultSink
+from phase_timer import timer
+from session_pool import pool
+
+
+##########################
+# Global Variables
+##########################
+SW_REPORT_FILE = "./device_list.csv"
+WIDE_REPORT_NAME = "Cisco device audit report {date}.csv"
+DEVICE_COLUMNS = ["Device Name", "IP Address", "Machine Type", "IOS Version", "Region"]
+REPORT_SORT = ["Region", "Device Name"]
+SPILL_EVERY = 1000  # spill sorted runs of N devices to disk, merged into the report at the end
+
+
+##########################
+# Output parsers
+##########################
+def parse_reload_reason(output, platform=IOS):
+    return parsers.parse("show version", platform, output)["reload_reason"] or ""
+
+
+def parse_scp_status(output, platform=IOS):
+    return "\n".join(parsers.parse("show running-config", platform, output)["scp_lines"])
+
+
+def parse_snmp_config(output, platform=IOS):
+    # The report keeps the raw "| inc snmp-server" output, as test.py always did
+    return output.strip()
+
+
+##########################
+# Checks
+##########################
+class Check:
+    '''
+    One audit check
+        - name => check name used on the command line
+        - command => show command sent to the device
+        - column => report column holding the parsed result
+        - report_name => csv report name, {date} is replaced by today's date
+        - parser => callable(output, platform) returning the value stored in column
+        - supported_only => only run on devices classified as IOS/IOS-XE
+    '''
+    def __init__(self, name, command, column, report_name, parser, supported_only=True):
+        self.name = name
+        self.command = command
+        self.column = column
+        self.report_name = report_name
+        self.parser = parser
+        self.supported_only = supported_only
+
+    def applies_to(self, device_data):
+        if not self.supported_only:
+            return True
+        return classify_platform(device_data["Machine Type"]) == IOS
+
+
+CHECKS = {
+    "reload": Check("reload", "show version | i reason:", "Reload reason",
+                    "Cisco device abnormal reload report {date}.csv", parse_reload_reason),
+    "scp": Check("scp", "show run | i scp", "SCP Status",
+                 "SCP Report {date}.csv", parse_scp_status),
+    "snmp": Check("snmp", "show run | inc snmp-server", "SNMP config",
+                  "SNMP config report {date}.csv", parse_snmp_config, supported_only=False),
+}
+
+
+##########################
+# Multi-check collector
+##########################
+class Collector:
+    '''
+    Run every selected check on each device in one session and build the reports
+        - checks => list of Check objects
+        - username/password => device credentials
+        - wide => build one combined report instead of one report per check
+        - max_age => answer running-config checks from snapshots younger than max_age seconds
+        - limiters => adaptive_limiter.LimiterGroup bounding the thread engines
+        - prescan => reachability sweep before SSH: "tcp", "banner" or "off"
+    '''
+    def __init__(self, checks, username, password, wide=False, max_age=None, limiters=None,
+                 prescan='tcp', prescan_timeout=reachability.PRESCAN_TIMEOUT):
+        self.checks = checks
+        self.prescan = prescan
+        self.prescan_timeout = prescan_timeout
+        self.limiters = limiters or adaptive_limiter.LimiterGroup()
+        self.max_age = max_age
+        self.username = username
+        self.password = password
+        self.wide = wide
+        date = datetime.now().strftime('%d-%b-%Y')
+        if wide:
+            self.sinks = {None: ResultSink(path=WIDE_REPORT_NAME.format(date=date),
+                                           spill_every=SPILL_EVERY, sort_by=REPORT_SORT)}
+        else:
+            self.sinks = {check.name: ResultSink(path=check.report_name.format(date=date),
+                                                 spill_every=SPILL_EVERY, sort_by=REPORT_SORT)
+                          for check in checks}
+
+    def checks_for(self, device_data):
+        return [check for check in self.checks if check.applies_to(device_data)]
+
+    def _push(self, device_data, values):
+        row = {column: device_data[column] for column in DEVICE_COLUMNS if column in device_data}
+        if self.wide:
+            row.update({check.column: values.get(check.column, "") for check in self.checks})
+            self.sinks[None].push(row)
+            return
+        for check in self.checks_for(device_data):
+            self.sinks[check.name].push(dict(row, **{check.column: values[check.column]}))
+
+    def save_output(self, device_data, cli_output):
+        output_archive.record_all(device_data, cli_output)
+        values = {}
+        for check in self.checks_for(device_data):
+            values[check.column] = check.parser(cli_output[check.command], device_data.platform)
+        rprint(f"✅ {device_data['Device Name']} :: {values}")
+        self._push(device_data, values)
+
+    def save_error(self, device_data, err):
+        values = {check.column: err for check in self.checks_for(device_data)}
+        rprint(f"❌ {device_data['Device Name']} :: {err}")
+        self._push(device_data, values)
+
+    def collect(self, device_data):
+        '''
+        Access device via SSH once and run the commands of every applicable check
+            - device_data => device record from the inventory
+        '''
+        commands = [check.command for check in self.checks_for(device_data)]
+        host = device_data["IP Address"]
+        cached = []
+        if self.max_age is not None:
+            cached = [command for command in commands if parse_show_run(command)[0]]
+        live = [command for command in commands if command not in cached]
+        name, region = device_data["Device Name"], device_data.get("Region")
+        try:
+            with self.limiters.slot(device_data) as slot:
+                cli_output = {}
+                if cached:
+                    with timer.phase('cached command', name, region):
+                        # The session of a cache miss is kept for the live commands below
+                        cli_output = {command: cache.run(host, "ios", self.username, self.password,
+                                                         command, self.max_age, keep=bool(live))
+                                      for command in cached}
+                if live:
+                    start = time.perf_counter()
+                    with pool.napalm(host, "ios", self.username, self.password) as device:
+                        slot.connected()
+                        timer.record('connect', name, region, start)
+                        with timer.phase('show command', name, region):
+                            cli_output.update(device.cli(live))
+            self.save_output(device_data, cli_output)
+        except Exception as err:
+            self.save_error(device_data, err)
+
+    def run(self, devices, engine="adaptive", concurrency=async_engine.DEFAULT_CONCURRENCY):
+        devices = [device for device in devices if self.checks_for(device)]
+        # Dead devices are reported without ever opening a session
+        devices, unreachable = reachability.prescan(devices, self.prescan, self.prescan_timeout)
+        for device, _ in unreachable:
+            self.save_error(device, reachability.UNREACHABLE)
+        # Cached lookups are local file reads, only cache misses need a session
+        if engine == "async" and self.max_age is None:
+            # The async engine sends one command list to a batch of devices,
+            # so group devices by the checks that apply to them
+            groups = {}
+            for device in devices:
+                key = tuple(check.name for check in self.checks_for(device))
+                groups.setdefault(key, []).append(device)
+            for names, group in groups.items():
+                commands = [CHECKS[name].command for name in names]
+                async_engine.run_commands(group, commands, self.username, self.password,
+                                          self.save_output, self.save_error, concurrency=concurrency)
+        else:
+            self.limiters.map(self.collect, devices)
+
+    def write_reports(self):
+        for sink in self.sinks.values():
+            sink.write_csv(sort_by=REPORT_SORT)
+            rprint(f"✅ {sink.path} - Successfully generated!")
+
+
+##########################
+# Inventory
+##########################
+def get_devices(solarwinds_results):
+    '''
+    Read the device inventory generated by get_device_list_from_all_region.py
+        - solarwinds_results => csv report (device_list.csv)
+    '''
+    rprint(f"[yellow]Getting devices from {solarwinds_results}...[/yellow]")
+    return list(load_devices(solarwinds_results))
+
+
+##########################
+# Main Script
+##########################
+def main(argv=None):
+    '''
+    Main Script
+        - argv => command line arguments (default: sys.argv)
+    '''
+    parser = argparse.ArgumentParser(description="Run several device checks in one login per device")
+    parser.add_argument('-u', '--username', type=str, metavar='USERNAME',\
+        help='Username to access network device', required=True)
+    parser.add_argument('-p', '--password', type=str, metavar='PASSWORD',\
+        help='Password to access network device', required=True)
+    parser.add_argument('-c', '--checks', nargs='+', default=list(CHECKS), choices=list(CHECKS),\
+        help='Checks to run (default: all)')
+    parser.add_argument('--wide', action='store_true',\
+        help='Write one combined report instead of one report per check')
+    parser.add_argument('--engine', type=str, default="adaptive", choices=["adaptive", "thread", "async"],\
+        help='Collection engine: adaptive worker threads, 100 worker threads or asyncio (default: adaptive)')
+    parser.add_argument('--concurrency', type=int, default=async_engine.DEFAULT_CONCURRENCY, metavar='',\
+        help='Maximum concurrent SSH sessions for the async engine')
+    parser.add_argument('--db', type=str, default=None, metavar='',\
+        help='Select devices from this SQLite inventory instead of device_list.csv')
+    parser.add_argument('--region', nargs='+', default=None, choices=['US', 'EMEA', 'APAC'],\
+        help='Only collect devices of these regions')
+    parser.add_argument('--max-age', type=int, default=None, metavar='',\
+        help='Use cached running-configs younger than this many seconds (0 forces a refresh)')
+    adaptive_limiter.add_arguments(parser)
+    reachability.add_arguments(parser)
+    phase_timer.add_arguments(parser)
+    output_archive.add_arguments(parser)
+    args = parser.parse_args(argv)
+    output_archive.from_args(args)
+
+    collector = Collector([CHECKS[name] for name in args.checks], args.username, args.password,
+                          wide=args.wide, max_age=args.max_age,
+                          limiters=adaptive_limiter.from_args(args), prescan=args.prescan,
+                          prescan_timeout=args.prescan_timeout)
+    if args.db:
+        # The checks parse by platform, so rows are wrapped like device_list.csv records
+        devices = [DeviceRecord(row["Device Name"], row["IP Address"], row["Machine Type"],
+                                row["IOS Version"], row["Region"])
+                   for row in InventoryStore(args.db).select(region=args.region)]
+    else:
+        devices = get_devices(SW_REPORT_FILE)
+        if args.region:
+            devices = [device for device in devices if device["Region"] in args.region]
+    collector.run(devices, engine=args.engine, concurrency=args.concurrency)
+    collector.write_reports()
+    if args.concurrency_log:
+        collector.limiters.write_log(args.concurrency_log)
+    phase_timer.report(args)
+    output_archive.close()
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    main()
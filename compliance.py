@@ -0,0 +1,261 @@
+"""
+Script to audit device password/credential compliance with a declarative rule set
+
+Applicable only for IOS/IOS-XE, NXOS devices
+
+Workflow:
+    - Rules are plain data (RULES below, or a JSON file passed with --rules): a name, the
+      platforms they apply to, a regex and whether the line is required or forbidden.
+    - The rules of each platform are compiled once into a single combined matcher and
+      every device's running-config is scanned in one pass.
+    - Large batches of configs are evaluated in a process pool, separate from the SSH threads.
+    - Generate a CSV pass/fail matrix (one row per device, one column per rule).
+"""
+import argparse
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from rich import print as rprint
+import adaptive_limiter
+import output_archive
+import reachability
+from config_cache import run_command
+from inventory import load_devices, IOS, NXOS
+from result_sink import ResultSink
+
+
+##########################
+# Global Variables
+##########################
+DEVICES_FILE = "devices.csv"
+REPORT_NAME = "Password compliance report {date}.csv"
+CONFIG_COMMAND = "show running-config"
+# Filtered running-config holding every line the built-in RULES look at
+PASSWORD_COMMAND = "show running-config | include secret|username|password"
+PROCESS_POOL_THRESHOLD = 50 * 1024 * 1024  # bytes of config text before using a process pool
+PASS = "PASS"
+FAIL = "FAIL"
+NOT_APPLICABLE = "N/A"
+ERROR = "ERROR"
+
+RULES = [
+    {
+        "name": "ios-enable-secret",
+        "platforms": [IOS],
+        "match": "required",
+        "pattern": r"^enable secret 9 \$9\$Tr\.fJkiWqTDLNE\$uZnlmaQm7TjDezx3X59P\.rZBh3diBR6z41Op8/igj5g$",
+    },
+    {
+        "name": "ios-admin-secret",
+        "platforms": [IOS],
+        "match": "required",
+        "pattern": r"^username admin secret 9 \$9\$\.E8i4elg0kVv5U\$mhwRPfT6\.rIGwYtLKaL2PLkajzxH2s7rBcSPDPiureM$",
+    },
+    {
+        "name": "ios-no-type7-password",
+        "platforms": [IOS],
+        "match": "forbidden",
+        "pattern": r"\bpassword 7 ",
+    },
+    {
+        "name": "nxos-admin-password",
+        "platforms": [NXOS],
+        "match": "required",
+        "pattern": r"admin password 5 \$1\$032E0B12035A31020F0700044932",
+    },
+]
+
+
+##########################
+# Compiled rule set
+##########################
+class RuleSet:
+    '''
+    Rules compiled into one combined matcher per platform
+        - rules => list of rule dicts (name, platforms, match, pattern)
+    Every rule becomes an optional lookahead with a named group, so matching one
+    line against the combined regex tells which rules that line satisfies.
+    '''
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.names = [rule["name"] for rule in self.rules]
+        self._matchers = {}
+        for platform in {platform for rule in self.rules for platform in rule["platforms"]}:
+            platform_rules = [(index, rule) for index, rule in enumerate(self.rules)
+                              if platform in rule["platforms"]]
+            combined = "".join(f"(?=.*?(?P<r{index}>{rule['pattern']}))?"
+                               for index, rule in platform_rules)
+            self._matchers[platform] = (re.compile(combined), platform_rules)
+
+    def evaluate(self, config, platform):
+        '''
+        Scan a config once and return {rule name: PASS/FAIL/N/A}
+            - config => running-config text
+            - platform => ios / nxos_ssh
+        '''
+        result = {name: NOT_APPLICABLE for name in self.names}
+        if platform not in self._matchers:
+            return result
+        matcher, platform_rules = self._matchers[platform]
+        seen = set()
+        for line in config.splitlines():
+            match = matcher.match(line)
+            seen.update(key for key, value in match.groupdict().items() if value is not None)
+        for index, rule in platform_rules:
+            found = f"r{index}" in seen
+            required = rule["match"] == "required"
+            result[rule["name"]] = PASS if found == required else FAIL
+        return result
+
+    def failures(self, config, platform):
+        '''
+        Names of the rules a config fails, empty when it is compliant
+        '''
+        return [name for name, status in self.evaluate(config, platform).items() if status == FAIL]
+
+
+_worker_rule_set = None
+
+
+def _init_worker(rules):
+    global _worker_rule_set
+    _worker_rule_set = RuleSet(rules)
+
+
+def _evaluate_worker(job):
+    config, platform = job
+    return _worker_rule_set.evaluate(config, platform)
+
+
+def evaluate_configs(rules, jobs, workers=None, threshold=PROCESS_POOL_THRESHOLD):
+    '''
+    Evaluate many (config, platform) jobs, in a process pool when they are large
+        - rules => list of rule dicts
+        - jobs => list of (config, platform)
+        - workers => process pool size (None lets the pool decide, 0 forces inline)
+    '''
+    if workers == 0 or sum(len(config) for config, _ in jobs) < threshold:
+        rule_set = RuleSet(rules)
+        return [rule_set.evaluate(config, platform) for config, platform in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(rules,)) as executor:
+        return list(executor.map(_evaluate_worker, jobs, chunksize=16))
+
+
+def load_rules(path=None):
+    '''
+    Load rules from a JSON file (same layout as RULES), or the built-in RULES
+    '''
+    if not path:
+        return RULES
+    with open(path) as rules_file:
+        return json.load(rules_file)
+
+
+##########################
+# Audit
+##########################
+def fetch_config(device, username, password, max_age=None, limiters=None):
+    '''
+    Get the running-config of a device, returns (device, config or exception)
+        - limiters => adaptive_limiter.LimiterGroup holding a session slot while fetching
+    '''
+    try:
+        with limiters.slot(device) if limiters else nullcontext():
+            return device, run_command(device["IP Address"], device.platform, username, password,
+                                       CONFIG_COMMAND, max_age=max_age)
+    except Exception as err:
+        rprint(f"❌ {device['Device Name']} :: {err}")
+        return device, err
+
+
+def audit(devices, username, password, rules, max_age=None, workers=None, limiters=None,
+          prescan='tcp', prescan_timeout=reachability.PRESCAN_TIMEOUT):
+    '''
+    Fetch every device config over SSH threads and evaluate the rule set
+        - limiters => adaptive_limiter.LimiterGroup running the SSH threads
+        - prescan => reachability sweep before SSH: "tcp", "banner" or "off"
+    Returns a list of report rows (device columns + one column per rule + Compliant)
+    '''
+    names = [rule["name"] for rule in rules]
+    limiters = limiters or adaptive_limiter.LimiterGroup()
+    devices, unreachable = reachability.prescan(devices, prescan, prescan_timeout)
+    fetched = limiters.map(lambda device: fetch_config(device, username, password, max_age, limiters),
+                           devices)
+    fetched += [(device, reachability.UNREACHABLE) for device, _ in unreachable]
+
+    collected = [(device, config) for device, config in fetched
+                 if isinstance(config, str) and config != reachability.UNREACHABLE]
+    results = evaluate_configs(rules, [(config, device.platform) for device, config in collected],
+                               workers=workers)
+    evaluated = {id(device): result for (device, _), result in zip(collected, results)}
+
+    rows = []
+    for device, config in fetched:
+        row = {"Device Name": device["Device Name"], "IP Address": device["IP Address"],
+               "Platform": device.platform}
+        result = evaluated.get(id(device))
+        if result is None:
+            row.update({name: ERROR for name in names})
+            row["Compliant"] = ERROR
+            row["Error"] = str(config)
+        else:
+            row.update(result)
+            row["Compliant"] = "No" if FAIL in result.values() else "Yes"
+            row["Error"] = ""
+        rows.append(row)
+    return rows
+
+
+##########################
+# Main Script
+##########################
+def main(argv=None):
+    '''
+    Main Script
+        - argv => command line arguments (default: sys.argv)
+    '''
+    parser = argparse.ArgumentParser(description="Check device password compliance")
+    parser.add_argument('-u', '--username', type=str, metavar='USERNAME',\
+        help='Username to access network device', required=True)
+    parser.add_argument('-p', '--password', type=str, metavar='PASSWORD',\
+        help='Password to access network device', required=True)
+    parser.add_argument('--devices', type=str, default=DEVICES_FILE, metavar='',\
+        help=f'Device inventory csv (default: {DEVICES_FILE})')
+    parser.add_argument('--rules', type=str, default=None, metavar='',\
+        help='JSON rule file, defaults to the built-in rules')
+    parser.add_argument('--workers', type=int, default=None, metavar='',\
+        help='Process pool size for rule evaluation (0 evaluates in the main process)')
+    parser.add_argument('--max-age', type=int, default=None, metavar='',\
+        help='Use cached running-configs younger than this many seconds (0 forces a refresh)')
+    parser.add_argument('--engine', type=str, default="adaptive", choices=["adaptive", "thread"],\
+        help='SSH threads: adaptive concurrency or 100 worker threads (default: adaptive)')
+    adaptive_limiter.add_arguments(parser)
+    reachability.add_arguments(parser)
+    output_archive.add_arguments(parser)
+    args = parser.parse_args(argv)
+    output_archive.from_args(args)
+
+    rules = load_rules(args.rules)
+    limiters = adaptive_limiter.from_args(args)
+    devices = list(load_devices(args.devices, platforms=[IOS, NXOS]))
+    report = ResultSink(path=REPORT_NAME.format(date=datetime.now().strftime('%d-%b-%Y')))
+    for row in audit(devices, args.username, args.password, rules, args.max_age, args.workers,
+                     limiters, args.prescan, args.prescan_timeout):
+        rprint(f"{'✅' if row['Compliant'] == 'Yes' else '❌'} {row['Device Name']} :: "
+               f"Compliant: {row['Compliant']}")
+        report.push(row)
+    report.write_csv(sort_by=["Device Name"])
+    rprint(f"✅ {report.path} - Successfully generated!")
+    if args.concurrency_log:
+        limiters.write_log(args.concurrency_log)
+    output_archive.close()
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import unittest
+from compliance import RuleSet, evaluate_configs, FAIL, NOT_APPLICABLE, PASS
+from inventory import IOS, NXOS
+
+
+RULES = [
+    {"name": "enable-secret", "platforms": [IOS], "match": "required",
+     "pattern": r"^enable secret 9 \S+$"},
+    {"name": "admin-user", "platforms": [IOS], "match": "required",
+     "pattern": r"^username admin\b"},
+    {"name": "no-type7-password", "platforms": [IOS], "match": "forbidden",
+     "pattern": r"\bpassword 7 "},
+    {"name": "nxos-admin-password", "platforms": [NXOS], "match": "required",
+     "pattern": r"^username admin password 5 "},
+]
+
+COMPLIANT_IOS = """hostname sw1
+enable secret 9 $9$abc$def
+username admin privilege 15 secret 9 $9$xyz
+line vty 0 4
+ transport input ssh
+"""
+
+
+class TestRuleSet(unittest.TestCase):
+
+    def setUp(self):
+        self.rule_set = RuleSet(RULES)
+
+    def test_compliant_config_passes(self):
+        result = self.rule_set.evaluate(COMPLIANT_IOS, IOS)
+        self.assertEqual(result["enable-secret"], PASS)
+        self.assertEqual(result["admin-user"], PASS)
+        self.assertEqual(result["no-type7-password"], PASS)
+
+    def test_missing_required_and_present_forbidden_fail(self):
+        config = "hostname sw2\nusername guest password 7 0822455D0A16\n"
+        result = self.rule_set.evaluate(config, IOS)
+        self.assertEqual(result["enable-secret"], FAIL)
+        self.assertEqual(result["admin-user"], FAIL)
+        self.assertEqual(result["no-type7-password"], FAIL)
+
+    def test_rules_of_other_platforms_are_not_applicable(self):
+        result = self.rule_set.evaluate(COMPLIANT_IOS, IOS)
+        self.assertEqual(result["nxos-admin-password"], NOT_APPLICABLE)
+        result = self.rule_set.evaluate("username admin password 5 $1$abc role network-admin\n", NXOS)
+        self.assertEqual(result["nxos-admin-password"], PASS)
+        self.assertEqual(result["enable-secret"], NOT_APPLICABLE)
+
+    def test_unknown_platform_is_not_applicable(self):
+        result = self.rule_set.evaluate(COMPLIANT_IOS, "unsupported")
+        self.assertEqual(set(result.values()), {NOT_APPLICABLE})
+        self.assertEqual(list(result), [rule["name"] for rule in RULES])
+
+    def test_one_line_satisfies_two_rules(self):
+        # One line both holds the admin user and breaks the type 7 rule
+        config = "enable secret 9 $9$abc$def\nusername admin password 7 0822455D0A16\n"
+        result = self.rule_set.evaluate(config, IOS)
+        self.assertEqual(result["admin-user"], PASS)
+        self.assertEqual(result["no-type7-password"], FAIL)
+        self.assertEqual(result["enable-secret"], PASS)
+
+    def test_failures_lists_failed_rules(self):
+        self.assertEqual(self.rule_set.failures(COMPLIANT_IOS, IOS), [])
+        config = "enable secret 9 $9$abc$def\nusername admin password 7 0822455D0A16\n"
+        self.assertEqual(self.rule_set.failures(config, IOS), ["no-type7-password"])
+
+    def test_evaluate_configs_matches_inline(self):
+        jobs = [(COMPLIANT_IOS, IOS), ("hostname sw2\n", IOS), ("hostname n1\n", NXOS)]
+        expected = [self.rule_set.evaluate(config, platform) for config, platform in jobs]
+        self.assertEqual(evaluate_configs(RULES, jobs, workers=0), expected)
+        self.assertEqual(evaluate_configs(RULES, jobs, workers=2, threshold=0), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
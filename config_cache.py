@@ -0,0 +1,165 @@
+"""
+Local running-config snapshot cache
+
+Each device's full running-config is fetched once over SSH and stored on disk
+(<cache_dir>/<host>.cfg plus a small JSON file with the fetch time and a
+SHA-256 of the text). "show running-config | include <regex>" style commands
+are then answered locally against the cached text instead of logging into the
+device again. Snapshots older than max_age seconds are refreshed.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import output_archive
+from session_pool import pool
+
+
+##########################
+# Global Variables
+##########################
+CACHE_DIR = "./config_cache"
+DEFAULT_MAX_AGE = 24 * 60 * 60
+SHOW_RUN_FILTER = re.compile(
+    r"^\s*sh\w*\s+run\w*(?:-config)?\s*(?:\|\s*i\w*\s+(?P<pattern>.+?))?\s*$"
+)
+
+
+def parse_show_run(command):
+    '''
+    Split a "show running-config [| include <regex>]" command
+        - command => cli command
+    Returns (True, pattern or None) when the command can be answered from a
+    cached running-config, (False, None) otherwise
+    '''
+    match = SHOW_RUN_FILTER.match(command)
+    if not match:
+        return False, None
+    return True, match.group("pattern")
+
+
+def include(config, pattern):
+    '''
+    Emulate the IOS "| include <regex>" output filter on config text
+    '''
+    regex = re.compile(pattern)
+    return "\n".join(line for line in config.splitlines() if regex.search(line))
+
+
+##########################
+# Snapshot Cache
+##########################
+class ConfigCache:
+    '''
+    On-disk running-config snapshots keyed by device
+        - cache_dir => directory holding the snapshots
+        - max_age => default age in seconds after which a snapshot is refreshed
+    '''
+    def __init__(self, cache_dir=CACHE_DIR, max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _paths(self, host):
+        name = re.sub(r"[^\w.-]", "_", host)
+        return (os.path.join(self.cache_dir, f"{name}.cfg"),
+                os.path.join(self.cache_dir, f"{name}.json"))
+
+    def load(self, host):
+        '''
+        Return (config, metadata) of a cached snapshot or (None, None)
+        '''
+        config_path, meta_path = self._paths(host)
+        try:
+            with open(meta_path) as meta_file:
+                metadata = json.load(meta_file)
+            with open(config_path, encoding="utf-8") as config_file:
+                config = config_file.read()
+        except (OSError, ValueError):
+            return None, None
+        if hashlib.sha256(config.encode()).hexdigest() != metadata.get("sha256"):
+            return None, None
+        return config, metadata
+
+    def store(self, host, config):
+        '''
+        Write a snapshot atomically and return its metadata
+        '''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        config_path, meta_path = self._paths(host)
+        metadata = {
+            "host": host,
+            "fetched_at": time.time(),
+            "sha256": hashlib.sha256(config.encode()).hexdigest(),
+        }
+        for path, content in ((config_path, config), (meta_path, json.dumps(metadata))):
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as temp_file:
+                temp_file.write(content)
+            os.replace(temp_path, path)
+        return metadata
+
+    def fetch(self, host, platform, username, password, keep=False):
+        '''
+        Pull the full running-config from the device and cache it
+            - keep => keep the session open for the caller's next command on this device
+        '''
+        with pool.napalm(host, platform, username, password, keep=keep) as device:
+            config = device.get_config(retrieve="running")["running"]
+        output_archive.record(host, "show running-config", config, host, platform)
+        self.store(host, config)
+        return config
+
+    def get(self, host, platform, username, password, max_age=None, keep=False):
+        '''
+        Return the running-config of a device, from disk when younger than max_age
+            - max_age => seconds, defaults to the cache max_age, 0 forces a refresh
+        '''
+        max_age = self.max_age if max_age is None else max_age
+        config, metadata = self.load(host)
+        if config is not None and time.time() - metadata["fetched_at"] <= max_age:
+            with self._lock:
+                self.hits += 1
+            return config
+        with self._lock:
+            self.misses += 1
+        return self.fetch(host, platform, username, password, keep)
+
+    def run(self, host, platform, username, password, command, max_age=None, keep=False):
+        '''
+        Answer a show command, locally when it only filters the running-config
+            - command => e.g. "show running-config | include secret|username"
+            - keep => keep the session open for the caller's next command on this device
+        '''
+        cacheable, pattern = parse_show_run(command)
+        if not cacheable:
+            with pool.netmiko(host, platform, username, password, keep=keep) as conn:
+                output = conn.send_command(command)
+            output_archive.record(host, command, output, host, platform)
+            return output
+        config = self.get(host, platform, username, password, max_age, keep)
+        return config if pattern is None else include(config, pattern)
+
+
+##########################
+# Process wide cache
+##########################
+cache = ConfigCache()
+
+
+def run_command(host, platform, username, password, command, max_age=None, keep=False):
+    '''
+    Run a show command live, or from the snapshot cache when max_age is given
+        - max_age => None always asks the device, otherwise the snapshot age limit in seconds
+        - keep => keep the session open when more commands follow on this device
+    '''
+    if max_age is None:
+        with pool.netmiko(host, platform, username, password, keep=keep) as conn:
+            output = conn.send_command(command)
+        output_archive.record(host, command, output, host, platform)
+        return output
+    return cache.run(host, platform, username, password, command, max_age, keep)
@@ -0,0 +1,169 @@
+"""
+cvx - one command line for the fleet scripts
+
+    python cvx.py <command> [arguments of the script]
+    python cvx.py reload-check --engine async
+    python cvx.py acl-push -u admin -p secret --resume
+    python cvx.py import-report
+
+Every command is the "module:function" of an existing script, imported only when
+that command runs, so `cvx --help` or a small cron job never loads napalm,
+netmiko, orionsdk or the other scripts. The scripts themselves import their
+heavy dependencies on first use.
+
+import-report runs `<command> --help` of every command under `python -X importtime`,
+lists the slowest imports and exits 1 when a command starts slower than the
+startup budget or loads one of HEAVY_MODULES before doing any work.
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+
+##########################
+# Global Variables
+##########################
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+COMMANDS = {
+    'inventory': ('get_device_list_from_all_region:main', 'Pull the device list from SolarWinds'),
+    'reload-check': ('check_reload:cli', 'Report abnormal reload reasons'),
+    'scp-check': ('check_scp:cli', 'Report the SCP server configuration'),
+    'snmp-check': ('test:cli', 'Report the SNMP configuration'),
+    'collect': ('collector:main', 'Run several checks in one login per device'),
+    'replay': ('output_archive:main', 'Re-run parsers and checks against archived outputs'),
+    'run-job': ('job_spec:main', 'Run a declarative job spec as a streaming stage DAG'),
+    'acl-push': ('acl_update20:main', 'Push the ACL change plan'),
+    'scp-enable': ('scp_update:main', 'Enable the SCP server'),
+    'password-audit': ('compliance:main', 'Audit password/credential compliance'),
+}
+HEAVY_MODULES = ['napalm', 'netmiko', 'orionsdk', 'pandas', 'pyarrow', 'asyncssh', 'paramiko']
+STARTUP_BUDGET = 0.5  # seconds for `cvx <command> --help`
+TOP_IMPORTS = 10
+
+
+##########################
+# Dispatch
+##########################
+def load_command(name):
+    '''
+    Import the module of a command and return its entry point
+        - name => key of COMMANDS
+    '''
+    module_name, function_name = COMMANDS[name][0].split(':')
+    sys.path.insert(0, SCRIPT_DIR)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def run_command(name, argv):
+    '''
+    Run a command with the remaining command line arguments
+    '''
+    entry_point = load_command(name)
+    # The script's own parser shows "cvx <command>" in its usage line
+    sys.argv[0] = f"cvx {name}"
+    return entry_point(argv)
+
+
+##########################
+# Import time report
+##########################
+def parse_import_time(stderr):
+    '''
+    Parse `python -X importtime` output, returns [(cumulative seconds, module)]
+    '''
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        imports.append((int(cumulative) / 1e6, module.strip()))
+    return imports
+
+
+def measure_startup(name):
+    '''
+    Time `cvx <name> --help` in a fresh interpreter, returns a report row
+    '''
+    command = [sys.executable, '-X', 'importtime', os.path.abspath(__file__), name, '--help']
+    start = time.perf_counter()
+    process = subprocess.run(command, capture_output=True, text=True, cwd=SCRIPT_DIR)
+    startup = time.perf_counter() - start
+    imports = parse_import_time(process.stderr)
+    loaded = {module.split('.')[0] for _, module in imports}
+    return {
+        'command': name,
+        'startup': startup,
+        'imports': sorted(imports, reverse=True)[:TOP_IMPORTS],
+        'heavy': [module for module in HEAVY_MODULES if module in loaded],
+        'exit code': process.returncode,
+    }
+
+
+def import_report(argv=None):
+    '''
+    Measure the startup time of every command against the budget
+    '''
+    from rich import print as rprint
+    parser = argparse.ArgumentParser(prog="cvx import-report",
+                                     description="Startup time and slowest imports of every command")
+    parser.add_argument('commands', nargs='*', default=None, metavar='command',\
+        help=f'Commands to measure: {", ".join(COMMANDS)} (default: all)')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET, metavar='',\
+        help=f'Startup budget in seconds per command (default: {STARTUP_BUDGET})')
+    parser.add_argument('--top', type=int, default=TOP_IMPORTS, metavar='',\
+        help=f'Slowest imports listed per command (default: {TOP_IMPORTS})')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.commands or [] if name not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown command(s): {', '.join(unknown)}")
+
+    failures = 0
+    for name in args.commands or COMMANDS:
+        row = measure_startup(name)
+        over_budget = row['startup'] > args.budget
+        failed = over_budget or row['heavy'] or row['exit code'] != 0
+        failures += bool(failed)
+        rprint(f"{'❌' if failed else '✅'} {name:<15} {row['startup'] * 1000:>7.0f} ms"
+               f"{'  over budget' if over_budget else ''}"
+               f"{'  loads ' + ', '.join(row['heavy']) if row['heavy'] else ''}"
+               f"{'  exit code ' + str(row['exit code']) if row['exit code'] != 0 else ''}")
+        for cumulative, module in row['imports'][:args.top]:
+            rprint(f"      {cumulative * 1000:>7.1f} ms  {module}")
+    if failures:
+        rprint(f"[red]❌ {failures} command(s) over the {args.budget}s startup budget or loading heavy modules")
+        return 1
+    rprint(f"✅ Every command starts within {args.budget}s")
+    return 0
+
+
+##########################
+# Main Script
+##########################
+def main(argv=None):
+    '''
+    Main Script
+    '''
+    commands = "\n".join(f"  {name:<16}{description}" for name, (_, description) in COMMANDS.items())
+    parser = argparse.ArgumentParser(prog="cvx", formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Fleet scripts",
+                                     epilog=f"commands:\n{commands}\n  {'import-report':<16}"
+                                            f"Startup time and slowest imports of every command\n\n"
+                                            f"Run `cvx <command> --help` for the options of a command.")
+    parser.add_argument('command', choices=list(COMMANDS) + ['import-report'], metavar='command',\
+        help='Command to run')
+    parser.add_argument('arguments', nargs=argparse.REMAINDER,\
+        help='Arguments of the command')
+    args = parser.parse_args(argv)
+    if args.command == 'import-report':
+        return import_report(args.arguments)
+    return run_command(args.command, args.arguments)
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    sys.exit(main())
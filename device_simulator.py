@@ -0,0 +1,582 @@
+"""
+Simulated IOS / NX-OS device fleet for benchmarks
+
+Serves thousands of fake Cisco devices over SSH (asyncssh) on loopback
+addresses, so the fleet scripts can be measured without a real network:
+    - device i listens on 127.100.<i // 250>.<i % 250 + 1>, every device on the same port
+      (point the scripts at it with SSH_PORT=<port>)
+    - interactive CLI with prompt, terminal length/width, pipes (| include/exclude/begin)
+      and canned "show version" / "show running-config" / "show ip access-lists" output
+    - configuration mode, and the file based candidate workflow NAPALM uses for IOS
+      (scp to flash:, dir, verify /md5, copy ... running-config, configure replace)
+      and checkpoint/rollback for NX-OS, so ACL pushes and rollbacks change the config
+    - configurable command latency, authentication delay, failure rate (rejected
+      logins) and hang rate (sessions that never show a prompt)
+
+Run:
+    python device_simulator.py --devices 1000 --port 2222 --inventory ./bench
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import os
+import random
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+
+##########################
+# Global Variables
+##########################
+IOS = 'ios'
+NXOS = 'nxos_ssh'
+DEFAULT_PORT = 2222
+DEFAULT_USERNAME = 'cisco'
+DEFAULT_PASSWORD = 'cisco'
+HANG_SECONDS = 3600
+FLASH_FREE = 1850000000
+REGIONS = ['US', 'EMEA', 'APAC']
+COMPLIANT_ACL_20 = [
+    'permit 172.20.10.0 0.0.0.15',
+    'permit 139.65.136.0 0.0.3.255',
+    'permit 139.65.140.0 0.0.3.255',
+    'deny any log',
+]
+LEGACY_ACL_20 = [
+    'permit 172.20.10.0 0.0.0.15',
+    'deny any log',
+]
+RELOAD_REASONS = ['Reload Command', 'power-on', 'Critical software exception', 'Unknown reason']
+IOS_VERSION = """Cisco IOS XE Software, Version 16.09.05
+Cisco IOS Software [Fuji], Virtual XE Software (X86_64_LINUX_IOSD-UNIVERSALK9-M), Version 16.9.5, RELEASE SOFTWARE (fc1)
+Technical Support: http://www.cisco.com/techsupport
+Copyright (c) 1986-2020 by Cisco Systems, Inc.
+
+ROM: IOS-XE ROMMON
+
+{name} uptime is 12 weeks, 3 days, 4 hours, 21 minutes
+Uptime for this control processor is 12 weeks, 3 days, 4 hours, 23 minutes
+System returned to ROM by reload
+System image file is "bootflash:packages.conf"
+Last reload reason: {reason}
+
+cisco CSR1000V (VXE) processor (revision VXE) with 2392579K/3075K bytes of memory.
+Processor board ID 9XXXXXXXXXX
+3 Gigabit Ethernet interfaces
+32768K bytes of non-volatile configuration memory.
+3978420K bytes of physical memory.
+
+Configuration register is 0x2102
+"""
+NXOS_VERSION = """Cisco Nexus Operating System (NX-OS) Software
+TAC support: http://www.cisco.com/tac
+Copyright (C) 2002-2020, Cisco and/or its affiliates.
+
+Software
+  BIOS: version 07.69
+  NXOS: version 9.3(5)
+
+Hardware
+  cisco Nexus9000 C93180YC-EX chassis
+  Device name: {name}
+
+Kernel uptime is 84 day(s), 4 hour(s), 21 minute(s), 9 second(s)
+
+Last reset at 155062 usecs after Mon Jan 11 09:12:01 2021
+  Reason: {reason}
+  System version: 9.3(5)
+"""
+PIPE = re.compile(r'\s+\|\s+(i|in|inc|incl|include|e|ex|exc|exclude|b|be|begin)\s+(.*)$')
+INVALID_INPUT = "% Invalid input detected at '^' marker."
+
+
+def device_address(index):
+    return f"127.100.{index // 250}.{index % 250 + 1}"
+
+
+##########################
+# Device model
+##########################
+class SimulatedDevice:
+    '''
+    CLI and configuration state of one fake device, independent of the SSH transport
+        - index => position in the fleet, gives the address and seeds the profile
+        - platform => ios / nxos_ssh
+        - flash_dir => directory holding the device's flash:/bootflash: files
+    '''
+    def __init__(self, index, platform, flash_dir, rng=None):
+        rng = rng or random.Random(index)
+        self.index = index
+        self.platform = platform
+        self.name = f"{'nxs' if platform == NXOS else 'rtr'}{index:05d}"
+        self.address = device_address(index)
+        self.region = REGIONS[index % len(REGIONS)]
+        self.flash_dir = flash_dir
+        self.file_system = 'bootflash:' if platform == NXOS else 'flash:'
+        os.makedirs(os.path.join(flash_dir, self.file_system), exist_ok=True)
+        self.reload_reason = rng.choice(RELOAD_REASONS)
+        self.scp_enabled = rng.random() < 0.5
+        self.snmp = [f'snmp-server community {rng.choice(["public", "n3tw0rk"])} RO 20',
+                     'snmp-server location DC1']
+        self.acls = {'20': list(COMPLIANT_ACL_20 if rng.random() < 0.5 else LEGACY_ACL_20)}
+        if platform == NXOS:
+            self.acls = {'20': [self._nxos_entry(entry) for entry in self.acls['20']]}
+        self.mode = 'exec'
+        self.acl = None
+
+    @staticmethod
+    def _nxos_entry(entry):
+        action, *rest = entry.split()
+        if rest[0] == 'any':
+            return f'{action} ip any any' + (' log' if 'log' in rest else '')
+        address, wildcard = rest[:2]
+        prefix = 32 - sum(bin(int(octet)).count('1') for octet in wildcard.split('.'))
+        return f'{action} ip {address}/{prefix} any'
+
+    ##########################
+    # Output
+    ##########################
+    @property
+    def prompt(self):
+        suffix = {'exec': '#', 'config': '(config)#'}.get(self.mode)
+        if suffix is None:
+            suffix = '(config-acl)#' if self.platform == NXOS else '(config-std-nacl)#'
+        return f'{self.name}{suffix}'
+
+    def running_config(self):
+        lines = ['Building configuration...', '', 'Current configuration : 4096 bytes', '!',
+                 f'hostname {self.name}', '!']
+        if self.platform == NXOS:
+            lines = ['!Command: show running-config', '!Running configuration last done at: now',
+                     '', 'version 9.3(5) Bios:version 07.69', f'hostname {self.name}',
+                     'username admin password 5 $1$032E0B12035A31020F0700044932  role network-admin']
+        else:
+            lines += ['enable secret 9 $9$Tr.fJkiWqTDLNE$uZnlmaQm7TjDezx3X59P.rZBh3diBR6z41Op8/igj5g',
+                      'username admin secret 9 $9$.E8i4elg0kVv5U$mhwRPfT6.rIGwYtLKaL2PLkajzxH2s7rBcSPDPiureM',
+                      '!']
+            if self.scp_enabled:
+                lines.append('ip scp server enable')
+        for name, entries in sorted(self.acls.items()):
+            header = f'ip access-list {name}' if self.platform == NXOS else f'ip access-list standard {name}'
+            lines.append(header)
+            lines += [f' {entry}' for entry in entries]
+            lines.append('!')
+        lines += self.snmp
+        lines += ['!', 'line vty 0 4', ' access-class 20 in', ' transport input ssh', '!', 'end']
+        return '\n'.join(lines)
+
+    def show_access_lists(self, name=None):
+        lines = []
+        for acl_name, entries in sorted(self.acls.items()):
+            if name and acl_name != name:
+                continue
+            if self.platform == NXOS:
+                lines.append(f'IP access list {acl_name}')
+                lines += [f'        {10 * (seq + 1)} {entry}' for seq, entry in enumerate(entries)]
+                continue
+            lines.append(f'Standard IP access list {acl_name}')
+            for seq, entry in enumerate(entries):
+                words = entry.split()
+                if words[1] == 'host':
+                    words = [words[0]] + words[2:]
+                elif words[1] != 'any':
+                    words = [words[0], f'{words[1]}, wildcard bits {words[2]}'] + words[3:]
+                lines.append(f'    {10 * (seq + 1)} {" ".join(words)}')
+        return '\n'.join(lines)
+
+    ##########################
+    # Flash files
+    ##########################
+    def _flash_path(self, path):
+        # flash:/merge_config.txt, flash:merge_config.txt, bootflash:x => file in flash_dir
+        file_system, _, name = path.partition(':')
+        return os.path.join(self.flash_dir, f'{file_system}:', name.lstrip('/'))
+
+    def dir(self, path=''):
+        target = path or self.file_system
+        if target.rstrip('/').endswith(':'):
+            directory = self._flash_path(target)
+            names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        else:
+            if not os.path.exists(self._flash_path(target)):
+                return f'%Error opening {target} (No such file or directory)'
+            directory, names = os.path.dirname(self._flash_path(target)), [os.path.basename(target)]
+        lines = [f'Directory of {self.file_system}/', '']
+        for index, name in enumerate(names):
+            size = os.path.getsize(os.path.join(directory, name))
+            lines.append(f'   {index + 11}  -rw-     {size:>10}  Jan 11 2021 09:12:01 +00:00  {name}')
+        lines += ['', f'7897796608 bytes total ({FLASH_FREE} bytes free)']
+        return '\n'.join(lines)
+
+    def md5(self, path):
+        try:
+            with open(self._flash_path(path), 'rb') as flash_file:
+                digest = hashlib.md5(flash_file.read()).hexdigest()
+        except OSError:
+            return f'%Error opening {path} (No such file or directory)'
+        return f'.....Done!\nverify /md5 ({path}) = {digest}'
+
+    def copy(self, source, destination):
+        if source in ('running-config', 'system:running-config'):
+            if destination in ('startup-config', 'nvram:startup-config'):
+                return '[OK]'
+            with open(self._flash_path(destination), 'w') as flash_file:
+                flash_file.write(self.running_config())
+            return f'{len(self.running_config())} bytes copied in 0.120 secs'
+        try:
+            with open(self._flash_path(source)) as flash_file:
+                config = flash_file.read()
+        except OSError:
+            return f'%Error opening {source} (No such file or directory)'
+        if destination in ('running-config', 'system:running-config'):
+            self.apply_config(config.splitlines())
+            return f'{len(config)} bytes copied in 0.250 secs ({len(config) * 4} bytes/sec)'
+        return INVALID_INPUT
+
+    def replace(self, path):
+        # configure replace / rollback: rebuild the ACLs from a saved config file
+        try:
+            with open(self._flash_path(path)) as flash_file:
+                config = flash_file.read().splitlines()
+        except OSError:
+            return f'%Error opening {path} (No such file or directory)'
+        self.acls = {}
+        self.scp_enabled = False
+        self.snmp = []
+        self.apply_config(config)
+        return 'Total number of passes: 1\nRollback Done'
+
+    ##########################
+    # Configuration
+    ##########################
+    def apply_config(self, lines):
+        mode = self.mode
+        self.mode = 'config'
+        for line in lines:
+            self.configure(line)
+        self.mode = mode
+        self.acl = None
+
+    def configure(self, line):
+        '''
+        Apply one configuration mode line, returns the output
+        '''
+        line = line.strip()
+        words = line.split()
+        if not words or line.startswith('!'):
+            return ''
+        if words[0] in ('end', 'exit') and self.mode == 'acl':
+            self.mode, self.acl = ('config', None) if words[0] == 'exit' else ('exec', None)
+            return ''
+        if words[0] == 'end' or (words[0] == 'exit' and self.mode == 'config'):
+            self.mode = 'exec'
+            return ''
+        if self.mode == 'acl' and words[0] in ('permit', 'deny', 'remark'):
+            self.acls[self.acl].append(' '.join(words))
+            return ''
+        if self.mode == 'acl' and words[0].isdigit():
+            self.acls[self.acl].append(' '.join(words[1:]))
+            return ''
+        self.mode, self.acl = 'config', None
+        if words[:2] == ['no', 'ip'] and 'access-list' in words:
+            self.acls.pop(words[-1], None)
+            return ''
+        if words[:2] == ['ip', 'access-list']:
+            self.acl = words[-1]
+            self.acls.setdefault(self.acl, [])
+            self.mode = 'acl'
+            return ''
+        if line == 'ip scp server enable':
+            self.scp_enabled = True
+        elif line == 'no ip scp server enable':
+            self.scp_enabled = False
+        elif line.startswith('snmp-server '):
+            self.snmp.append(line)
+        # file prompt quiet, hostname, building configuration... are accepted silently
+        return ''
+
+    ##########################
+    # Exec commands
+    ##########################
+    def run(self, command):
+        '''
+        Run one command in the current mode, returns the output
+        '''
+        command = command.strip()
+        if self.mode != 'exec':
+            if command.startswith('do '):
+                return self.exec_command(command[3:])
+            return self.configure(command)
+        return self.exec_command(command)
+
+    def exec_command(self, command):
+        pipe = PIPE.search(command)
+        if pipe:
+            command = command[:pipe.start()]
+        output = self._exec(command.strip())
+        if pipe:
+            keyword, pattern = pipe.group(1)[0], re.compile(pipe.group(2).strip())
+            lines = output.splitlines()
+            if keyword == 'i':
+                lines = [line for line in lines if pattern.search(line)]
+            elif keyword == 'e':
+                lines = [line for line in lines if not pattern.search(line)]
+            else:
+                start = next((index for index, line in enumerate(lines) if pattern.search(line)), len(lines))
+                lines = lines[start:]
+            output = '\n'.join(lines)
+        return output
+
+    def _exec(self, command):
+        words = command.split()
+        if not words:
+            return ''
+        if words[0] in ('terminal', 'term'):
+            return ''
+        if words[0] in ('conf', 'configure') and 'replace' in words:
+            return self.replace(words[words.index('replace') + 1])
+        if words[0] in ('conf', 'configure'):
+            self.mode = 'config'
+            return 'Enter configuration commands, one per line.  End with CNTL/Z.'
+        if words[:2] == ['show', 'version']:
+            template = NXOS_VERSION if self.platform == NXOS else IOS_VERSION
+            reason = 'Reset Requested by CLI command reload' if self.platform == NXOS else self.reload_reason
+            return template.format(name=self.name, reason=reason)
+        if words[0] == 'show' and len(words) > 1 and words[1] in ('run', 'running-config', 'runn'):
+            return self.running_config()
+        if words[:2] == ['show', 'ip'] and len(words) > 2 and words[2].startswith('access-list'):
+            return self.show_access_lists(words[3] if len(words) > 3 else None)
+        if words[:2] == ['show', 'hostname']:
+            return self.name
+        if words[0] == 'dir':
+            return self.dir(words[1] if len(words) > 1 else '')
+        if words[0] == 'verify' and len(words) > 2:
+            return self.md5(words[-1])
+        if words[0] == 'copy' and len(words) > 2:
+            return self.copy(words[1], words[2])
+        if words[:2] == ['checkpoint', 'file'] and len(words) > 2:
+            return self.copy('running-config', words[2])
+        if words[:3] == ['rollback', 'running-config', 'file'] and len(words) > 3:
+            return self.replace(words[3])
+        if words[0] in ('write', 'wr'):
+            return 'Building configuration...\n[OK]'
+        if words[0] == 'show':
+            return ''
+        return INVALID_INPUT
+
+
+def build_fleet(count, start=0, nxos_ratio=0.1, flash_root=None, seed=0):
+    '''
+    Create the device models of the fleet slice [start, start + count)
+    '''
+    flash_root = flash_root or tempfile.mkdtemp(prefix='device-flash-')
+    devices = []
+    for index in range(start, start + count):
+        rng = random.Random(seed * 1000003 + index)
+        platform = NXOS if rng.random() < nxos_ratio else IOS
+        devices.append(SimulatedDevice(index, platform, os.path.join(flash_root, str(index)), rng))
+    return devices
+
+
+def write_inventory(directory, count, nxos_ratio=0.1, seed=0):
+    '''
+    Write device_list.csv and devices.csv for a simulated fleet into directory
+    '''
+    os.makedirs(directory, exist_ok=True)
+    device_list = os.path.join(directory, 'device_list.csv')
+    devices_csv = os.path.join(directory, 'devices.csv')
+    with open(device_list, 'w', newline='') as list_file, open(devices_csv, 'w', newline='') as devices_file:
+        list_writer = csv.writer(list_file)
+        devices_writer = csv.writer(devices_file)
+        list_writer.writerow(['Device Name', 'IP Address', 'Machine Type', 'IOS Version', 'Region'])
+        devices_writer.writerow(['Device Name', 'IP Address', 'machine type'])
+        for index in range(count):
+            rng = random.Random(seed * 1000003 + index)
+            platform = NXOS if rng.random() < nxos_ratio else IOS
+            name = f"{'nxs' if platform == NXOS else 'rtr'}{index:05d}"
+            machine_type = 'Cisco Nexus 93180YC-EX' if platform == NXOS else 'Cisco CSR1000V'
+            version = '9.3(5)' if platform == NXOS else '16.9.5'
+            list_writer.writerow([name, device_address(index), machine_type, version,
+                                  REGIONS[index % len(REGIONS)]])
+            devices_writer.writerow([name, device_address(index), 'nexus' if platform == NXOS else 'ios'])
+    return device_list, devices_csv
+
+
+##########################
+# SSH transport
+##########################
+def _asyncssh():
+    try:
+        import asyncssh
+    except ImportError as err:
+        raise SystemExit("The device simulator needs asyncssh: pip install asyncssh") from err
+    return asyncssh
+
+
+class Behaviour:
+    '''
+    Timing and failure profile applied to every simulated session
+        - latency => seconds added to every command (plus up to 50% jitter)
+        - auth_delay => seconds spent validating the password (AAA round trip)
+        - failure_rate => share of logins rejected
+        - hang_rate => share of sessions that log in but never show a prompt
+    '''
+    def __init__(self, latency=0.05, auth_delay=0.2, failure_rate=0.0, hang_rate=0.0,
+                 username=DEFAULT_USERNAME, password=DEFAULT_PASSWORD, seed=0):
+        self.latency = latency
+        self.auth_delay = auth_delay
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.username = username
+        self.password = password
+        self.rng = random.Random(seed)
+
+    async def command_delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency * (1 + self.rng.random() / 2))
+
+
+def _server_class(asyncssh, behaviour):
+    class DeviceServer(asyncssh.SSHServer):
+        def begin_auth(self, username):
+            return True
+
+        def password_auth_supported(self):
+            return True
+
+        async def validate_password(self, username, password):
+            await asyncio.sleep(behaviour.auth_delay)
+            if behaviour.rng.random() < behaviour.failure_rate:
+                return False
+            return username == behaviour.username and password == behaviour.password
+
+    return DeviceServer
+
+
+async def _session(asyncssh, device, behaviour, process):
+    # Exec channel (asyncssh engine conn.run): one command and exit
+    if process.command:
+        await behaviour.command_delay()
+        process.stdout.write(device.exec_command(process.command) + '\n')
+        process.exit(0)
+        return
+    if behaviour.rng.random() < behaviour.hang_rate:
+        await asyncio.sleep(HANG_SECONDS)
+        process.exit(0)
+        return
+    device.mode = 'exec'
+    process.stdout.write(f'\n{device.prompt}')
+    while True:
+        try:
+            line = await process.stdin.readline()
+        except asyncssh.TerminalSizeChanged:
+            continue
+        except (asyncssh.BreakReceived, asyncssh.SignalReceived, asyncssh.ConnectionLost):
+            break
+        if not line:
+            break
+        command = line.strip()
+        if device.mode == 'exec' and command in ('exit', 'logout', 'quit'):
+            break
+        if command:
+            await behaviour.command_delay()
+        output = device.run(command)
+        process.stdout.write((f'{output}\n' if output else '') + device.prompt)
+    process.exit(0)
+
+
+async def serve(devices, port=DEFAULT_PORT, behaviour=None):
+    '''
+    Start one SSH listener per device, returns the asyncssh servers
+    '''
+    asyncssh = _asyncssh()
+    behaviour = behaviour or Behaviour()
+    host_key = asyncssh.generate_private_key('ssh-rsa')
+    server_class = _server_class(asyncssh, behaviour)
+    servers = []
+    for device in devices:
+        servers.append(await asyncssh.create_server(
+            server_class, device.address, port, server_host_keys=[host_key],
+            process_factory=lambda process, device=device: _session(asyncssh, device, behaviour, process),
+            sftp_factory=lambda chan, device=device: asyncssh.SFTPServer(chan, chroot=device.flash_dir),
+            allow_scp=True))
+    return servers
+
+
+def raise_file_limit():
+    # One listening socket per device plus the client sessions
+    try:
+        import resource
+    except ImportError:
+        return
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit != hard_limit:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+
+
+##########################
+# Main Script
+##########################
+def main(argv=None):
+    '''
+    Main Script
+    '''
+    parser = argparse.ArgumentParser(description="Serve a simulated IOS/NX-OS fleet over SSH")
+    parser.add_argument('--devices', type=int, default=100, metavar='',\
+        help='Number of simulated devices (default: 100)')
+    parser.add_argument('--start', type=int, default=0, metavar='',\
+        help='Index of the first device served by this process, to shard a fleet')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, metavar='',\
+        help=f'SSH port of every device (default: {DEFAULT_PORT})')
+    parser.add_argument('--nxos-ratio', type=float, default=0.1, metavar='',\
+        help='Share of NX-OS devices (default: 0.1)')
+    parser.add_argument('--latency', type=float, default=0.05, metavar='',\
+        help='Seconds added to every command (default: 0.05)')
+    parser.add_argument('--auth-delay', type=float, default=0.2, metavar='',\
+        help='Seconds spent authenticating a login (default: 0.2)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, metavar='',\
+        help='Share of logins rejected (default: 0)')
+    parser.add_argument('--hang-rate', type=float, default=0.0, metavar='',\
+        help='Share of sessions that never show a prompt (default: 0)')
+    parser.add_argument('--seed', type=int, default=0, metavar='',\
+        help='Seed of the device profiles and failures (default: 0)')
+    parser.add_argument('--inventory', type=str, default=None, metavar='',\
+        help='Write device_list.csv and devices.csv of the whole fleet into this directory')
+    args = parser.parse_args(argv)
+
+    if args.inventory:
+        write_inventory(args.inventory, args.start + args.devices, args.nxos_ratio, args.seed)
+    raise_file_limit()
+    flash_root = tempfile.mkdtemp(prefix='device-flash-')
+    devices = build_fleet(args.devices, args.start, args.nxos_ratio, flash_root, args.seed)
+    behaviour = Behaviour(args.latency, args.auth_delay, args.failure_rate, args.hang_rate,
+                          seed=args.seed)
+
+    async def _main():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        await serve(devices, args.port, behaviour)
+        # The benchmark waits for this line before starting the scripts
+        print(f"READY {len(devices)} devices on port {args.port}", flush=True)
+        await stop.wait()
+
+    start = time.perf_counter()
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutil.rmtree(flash_root, ignore_errors=True)
+        print(f"Simulator stopped after {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    main()
@@ -2,100 +2,171 @@
 Script to fetch and pull device list from Solarwinds
 This script will generate a csv file named "device_list.csv" containing the devices
 that has been queried from Solarwinds.
+
+The US, EMEA and APAC Orion servers are queried at the same time, page by page,
+and every page is streamed to a temporary csv as soon as it arrives. The previous
+device_list.csv is only replaced when every region succeeded.
 """
-import csv
 import argparse
-import urllib3
-from orionsdk import SwisClient
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from rich import print as rprint
+from inventory_store import InventoryStore
+from report_writer import ReportWriter
+
+
+##########################
+# Global Variables
+##########################
+DEVICE_LIST_FILE = "device_list.csv"
+FIELDNAMES = ['Device Name', 'IP Address', 'Machine Type', 'IOS Version', 'Region']
+PAGE_SIZE = 5000
+QUERY = "SELECT DisplayName, IP_address, MachineType, IOSversion,\
+        Vendor FROM Orion.Nodes where DisplayName like '%PHRCSL34F13%' or DisplayName like '%BIR240SL1%'or DisplayName like '%ALMRA01%' order by DisplayName asc"
 
 
 ##########################
 # Script Argument
 ##########################
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-parser = argparse.ArgumentParser(description="Fetch and pull devices list from all regions")
-parser.add_argument('-u', '--username', type=str, metavar='',\
-    help='SolarWinds username', required=True)
-parser.add_argument('-p', '--password', type=str, metavar='',\
-    help='SolarWinds password', required=True)
-parser.add_argument('-us', '--us_npm_server', type=str, metavar='',\
-    help='SolarWinds NPM US server', required=True)
-parser.add_argument('-emea', '--emea_npm_server', type=str, metavar='',\
-    help='SolarWinds NPM EMEA server', required=True)
-parser.add_argument('-apac', '--apac_npm_server', type=str, metavar='',\
-    help='SolarWinds NPM APAC server', required=True)
-args = parser.parse_args()
-
-npm_server_us = args.us_npm_server
-npm_server_emea = args.emea_npm_server
-npm_server_apac = args.apac_npm_server
-sw_username = args.username
-sw_password = args.password
+def parse_args(argv=None):
+    '''
+    Parse the script arguments
+    '''
+    parser = argparse.ArgumentParser(description="Fetch and pull devices list from all regions")
+    parser.add_argument('-u', '--username', type=str, metavar='',\
+        help='SolarWinds username', required=True)
+    parser.add_argument('-p', '--password', type=str, metavar='',\
+        help='SolarWinds password', required=True)
+    parser.add_argument('-us', '--us_npm_server', type=str, metavar='',\
+        help='SolarWinds NPM US server', required=True)
+    parser.add_argument('-emea', '--emea_npm_server', type=str, metavar='',\
+        help='SolarWinds NPM EMEA server', required=True)
+    parser.add_argument('-apac', '--apac_npm_server', type=str, metavar='',\
+        help='SolarWinds NPM APAC server', required=True)
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, metavar='',\
+        help=f'Rows fetched per SWIS query page (default: {PAGE_SIZE})')
+    parser.add_argument('--db', type=str, default=None, metavar='',\
+        help='Also sync the node list into this SQLite inventory (e.g. inventory.db)')
+    parser.add_argument('-v', '--verbose', action='store_true',\
+        help='Print every fetched device')
+    return parser.parse_args(argv)
 
 
 ##########################
 # Solarwinds Query function
 ##########################
-def solarwinds_query(server, username, password, region):
+def solarwinds_query(server, username, password, region, page_size=PAGE_SIZE, verbose=False):
     '''
-    Get all device list from Solarwinds using defined Query
+    Get all device list from Solarwinds using defined Query, one page at a time
         - server => solarwinds npm server ip address
         - username => solarwinds username
         - password => solarwinds password
         - region => solarwinds region
+        - page_size => rows per query page (SWQL "WITH ROWS x TO y")
+    Yields one device dict per node
     '''
     rprint(f"[#FFF833]Querying {region} devices from Orion NPM server {server}... [/#FFF833]")
+    from orionsdk import SwisClient
     swis = SwisClient(server, username, password)
-    # import ipdb; ipdb.set_trace()
-    results = swis.query("SELECT DisplayName, IP_address, MachineType, IOSversion,\
-        Vendor FROM Orion.Nodes where DisplayName like '%PHRCSL34F13%' or DisplayName like '%BIR240SL1%'or DisplayName like '%ALMRA01%' order by DisplayName asc")
-    output = []
-    for row in results['results']:
-        device_name = "{DisplayName}".format(**row).split('.')[0]
-        ip_address = "{IP_address}".format(**row)
-        machine_type = "{MachineType}".format(**row)
-        ios_version = "{IOSversion}".format(**row)
-        if not ios_version:
-            ios_version = "None"
-
-        device_info = {
-                "Device Name": device_name,
-                "IP Address": ip_address,
-                "Machine Type": machine_type,
-                "IOS Version": ios_version,
-                "Region": region
-            }
-        output.append(device_info)
-
-        rprint(f"[#43FF33]✅ Successfully fetched and copied Hostname: {device_name} |"
-            f" IP Address: {ip_address} | Machine Type: {machine_type} | IOS Version: {ios_version}"
-            f" | Region: {region} [/#43FF33]")
-
-    rprint(f"[cyan]{region} device count: {len(output)}[/cyan]")
-    return output
+    first_row = 1
+    while True:
+        results = swis.query(f"{QUERY} WITH ROWS {first_row} TO {first_row + page_size - 1}")
+        rows = results['results']
+        for row in rows:
+            device_name = "{DisplayName}".format(**row).split('.')[0]
+            ip_address = "{IP_address}".format(**row)
+            machine_type = "{MachineType}".format(**row)
+            ios_version = "{IOSversion}".format(**row)
+            if not ios_version:
+                ios_version = "None"
+
+            device_info = {
+                    "Device Name": device_name,
+                    "IP Address": ip_address,
+                    "Machine Type": machine_type,
+                    "IOS Version": ios_version,
+                    "Region": region
+                }
+            if verbose:
+                rprint(f"[#43FF33]✅ Successfully fetched and copied Hostname: {device_name} |"
+                    f" IP Address: {ip_address} | Machine Type: {machine_type} | IOS Version: {ios_version}"
+                    f" | Region: {region} [/#43FF33]")
+            yield device_info
+
+        if len(rows) < page_size:
+            break
+        first_row += page_size
+
+
+def query_region(server, username, password, region, writer, page_size=PAGE_SIZE, verbose=False,
+                 store=None):
+    '''
+    Stream one region's devices into the csv writer
+        - store => InventoryStore synced with the region's node list
+    Returns (region, device count, elapsed seconds, inventory delta or None)
+    '''
+    start = time.perf_counter()
+    count = 0
+    devices = []
+    for device_info in solarwinds_query(server, username, password, region, page_size, verbose):
+        writer.write(device_info)
+        if store is not None:
+            devices.append(device_info)
+        count += 1
+    delta = store.sync(region, devices) if store is not None else None
+    elapsed = time.perf_counter() - start
+    rprint(f"[cyan]{region} device count: {count} ({elapsed:.1f}s)[/cyan]")
+    return region, count, elapsed, delta
 
 
 ##########################
 # Main Script
 ##########################
-def main():
+def main(argv=None):
     '''
     Main Script
     '''
-    servers = [npm_server_us, npm_server_emea, npm_server_apac]
+    args = parse_args(argv)
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    servers = [args.us_npm_server, args.emea_npm_server, args.apac_npm_server]
     regions = ['US', 'EMEA', 'APAC']
-    results = []
-    for server, region in zip(servers, regions):
-        region_device_list = solarwinds_query(server, sw_username, sw_password, region)
-        results += region_device_list
-
-    with open('device_list.csv', 'w', newline='') as us_csv_file:
-        fieldnames  = ['Device Name', 'IP Address', 'Machine Type', 'IOS Version', 'Region']
-        writer = csv.DictWriter(us_csv_file, fieldnames=fieldnames)
-        writer.writeheader()
-        for result in results:
-            writer.writerow(result)
+
+    store = InventoryStore(args.db) if args.db else None
+    start = time.perf_counter()
+    # Regions stream into a temp file, the previous device list is only
+    # replaced once every region came back complete
+    temp_file = f"{DEVICE_LIST_FILE}.tmp"
+    summary, failed = [], []
+    with ReportWriter(temp_file, FIELDNAMES, overwrite=True) as writer:
+        with ThreadPoolExecutor(max_workers=len(regions)) as executor:
+            futures = [
+                executor.submit(query_region, server, args.username, args.password, region,
+                                writer, args.page_size, args.verbose, store)
+                for server, region in zip(servers, regions)
+            ]
+            for region, future in zip(regions, futures):
+                try:
+                    summary.append(future.result())
+                except Exception as err:
+                    rprint(f"[red]❌ {region} query failed: {err}[/red]")
+                    failed.append(region)
+
+    for region, count, elapsed, delta in summary:
+        changes = ""
+        if delta is not None:
+            changes = (f" | +{delta['added']} ~{delta['changed']} -{delta['removed']}"
+                       f" ={delta['unchanged']}")
+        rprint(f"[cyan]{region:<5} {count:>7} devices in {elapsed:6.1f}s{changes}[/cyan]")
+    if store is not None:
+        store.close()
+    if failed:
+        os.remove(temp_file)
+        raise SystemExit(f"❌ {', '.join(failed)} failed, {DEVICE_LIST_FILE} was left unchanged")
+    os.replace(temp_file, DEVICE_LIST_FILE)
+    rprint(f"[cyan]Total {sum(summary_row[1] for summary_row in summary)} devices in "
+           f"{time.perf_counter() - start:.1f}s written to {DEVICE_LIST_FILE}[/cyan]")
 
 
 ##########################
@@ -0,0 +1,149 @@
+"""
+Lightweight device inventory loader
+
+Streams device_list.csv (or devices.csv) into compact DeviceRecord objects and
+classifies each device's platform in the same pass with precompiled matchers,
+so the collectors no longer need pandas, read_csv and iterrows() to pick and
+ship their targets.
+"""
+import csv
+import re
+
+
+##########################
+# Platform classifier
+##########################
+IOS = "ios"
+NXOS = "nxos_ssh"
+UNSUPPORTED = "unsupported"
+
+UNSUPPORTED_DEVICES = [
+    "Cisco Unified Communications Manager",
+    "WLC",
+    "Wireless",
+    "Air",
+    "AIR",
+    "WsSvcFwm1sc",
+    "ASA",
+]
+NEXUS_MATCHER = re.compile("nexus", re.IGNORECASE)
+UNSUPPORTED_MATCHER = re.compile("|".join(map(re.escape, UNSUPPORTED_DEVICES)))
+
+
+def classify_platform(machine_type):
+    '''
+    Return the NAPALM platform of a SolarWinds machine type
+        - Nexus => nxos_ssh (same rule acl_update20.py applies to "machine type")
+        - Call manager, wireless, ASA... => unsupported
+        - everything else => ios
+    '''
+    if NEXUS_MATCHER.search(machine_type):
+        return NXOS
+    if UNSUPPORTED_MATCHER.search(machine_type):
+        return UNSUPPORTED
+    return IOS
+
+
+##########################
+# Device record
+##########################
+class DeviceRecord:
+    '''
+    One inventory row, indexable by its csv column names like a pandas Series
+    Columns other than the inventory ones (report results) are kept in extra.
+    '''
+    __slots__ = ("name", "ip_address", "machine_type", "ios_version", "region", "platform", "extra")
+
+    FIELDS = {
+        "Device Name": "name",
+        "IP Address": "ip_address",
+        "Machine Type": "machine_type",
+        "IOS Version": "ios_version",
+        "Region": "region",
+    }
+
+    def __init__(self, name, ip_address, machine_type, ios_version=None, region=None):
+        self.name = name
+        self.ip_address = ip_address
+        self.machine_type = machine_type
+        self.ios_version = ios_version
+        self.region = region
+        self.platform = classify_platform(machine_type)
+        self.extra = None
+
+    def __getitem__(self, column):
+        attribute = self.FIELDS.get(column)
+        if attribute is not None and getattr(self, attribute) is not None:
+            return getattr(self, attribute)
+        if self.extra is not None and column in self.extra:
+            return self.extra[column]
+        raise KeyError(column)
+
+    def __setitem__(self, column, value):
+        attribute = self.FIELDS.get(column)
+        if attribute is not None:
+            setattr(self, attribute, value)
+            return
+        if self.extra is None:
+            self.extra = {}
+        self.extra[column] = value
+
+    def __contains__(self, column):
+        try:
+            self[column]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, column, default=None):
+        try:
+            return self[column]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        '''
+        Report row with the inventory columns first, then the result columns
+        '''
+        row = {column: getattr(self, attribute) for column, attribute in self.FIELDS.items()
+               if getattr(self, attribute) is not None}
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+    def __repr__(self):
+        return f"DeviceRecord({self.name!r}, {self.ip_address!r}, {self.platform!r})"
+
+
+##########################
+# Inventory loader
+##########################
+def load_devices(path, platforms=None):
+    '''
+    Stream device records from an inventory csv
+        - path => device_list.csv (Machine Type) or devices.csv (machine type)
+        - platforms => only yield devices classified as one of these platforms
+    '''
+    with open(path, newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = {name.lower(): index for index, name in enumerate(header)}
+        name_index = columns["device name"]
+        ip_index = columns["ip address"]
+        type_index = columns["machine type"]
+        version_index = columns.get("ios version")
+        region_index = columns.get("region")
+        for row in reader:
+            if not row:
+                continue
+            record = DeviceRecord(
+                row[name_index],
+                row[ip_index],
+                row[type_index],
+                row[version_index] if version_index is not None else None,
+                row[region_index] if region_index is not None else None,
+            )
+            if platforms is None or record.platform in platforms:
+                yield record
@@ -0,0 +1,148 @@
+"""
+SQLite-backed device inventory
+
+Keeps the SolarWinds node list in a local, indexed SQLite database. A sync only
+writes the nodes that were added, changed (detected by hashing each row) or
+removed since the last sync, and the collectors select their targets with an
+indexed query instead of re-parsing device_list.csv with pandas.
+"""
+import csv
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+##########################
+# Global Variables
+##########################
+INVENTORY_DB = "./inventory.db"
+COLUMNS = {
+    "Device Name": "device_name",
+    "IP Address": "ip_address",
+    "Machine Type": "machine_type",
+    "IOS Version": "ios_version",
+    "Region": "region",
+}
+# Bumped when the devices table layout changes, older tables are rebuilt
+SCHEMA_VERSION = 2
+# Nodes are keyed by their polling IP address: the short device name is not
+# unique (sw1.site-a and sw1.site-b both become sw1)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    region TEXT NOT NULL,
+    device_name TEXT NOT NULL,
+    ip_address TEXT NOT NULL,
+    machine_type TEXT,
+    ios_version TEXT,
+    row_hash TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (region, ip_address)
+);
+CREATE INDEX IF NOT EXISTS devices_machine_type ON devices (machine_type);
+CREATE INDEX IF NOT EXISTS devices_ios_version ON devices (ios_version);
+CREATE INDEX IF NOT EXISTS devices_device_name ON devices (device_name);
+"""
+
+
+def row_hash(device_info):
+    '''
+    Hash the inventory fields of a device to detect changes between syncs
+    '''
+    values = "\x1f".join(str(device_info.get(column, "")) for column in COLUMNS)
+    return hashlib.sha1(values.encode()).hexdigest()
+
+
+##########################
+# Inventory Store
+##########################
+class InventoryStore:
+    '''
+    Local device inventory
+        - path => sqlite database file
+    '''
+    def __init__(self, path=INVENTORY_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            # The table only mirrors Orion, the next sync fills it again
+            self._conn.execute("DROP TABLE IF EXISTS devices")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def sync(self, region, devices):
+        '''
+        Apply the current node list of one region, writing only the delta
+            - region => region the node list belongs to
+            - devices => iterable of device dicts (device_list.csv columns)
+        Returns a dict with added/changed/removed/unchanged counts
+        Raises ValueError instead of emptying a region when the node list is empty
+        '''
+        counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        now = time.time()
+        devices = [dict(device_info, Region=region) for device_info in devices]
+        with self._lock, self._conn:
+            known = dict(self._conn.execute(
+                "SELECT ip_address, row_hash FROM devices WHERE region = ?", (region,)))
+            if not devices and known:
+                # An empty answer is far more likely a broken query than a decommissioned region
+                raise ValueError(f"{region} returned no devices, keeping its {len(known)} known devices")
+            upserts = []
+            for device_info in devices:
+                ip_address = device_info["IP Address"]
+                digest = row_hash(device_info)
+                previous = known.pop(ip_address, None)
+                if previous == digest:
+                    counts["unchanged"] += 1
+                    continue
+                counts["added" if previous is None else "changed"] += 1
+                upserts.append((region, device_info.get("Device Name"), ip_address,
+                                device_info.get("Machine Type"), device_info.get("IOS Version"),
+                                digest, now))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO devices (region, device_name, ip_address, machine_type,"
+                " ios_version, row_hash, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)", upserts)
+            self._conn.executemany(
+                "DELETE FROM devices WHERE region = ? AND ip_address = ?",
+                [(region, ip_address) for ip_address in known])
+            counts["removed"] = len(known)
+        return counts
+
+    def select(self, region=None, machine_type=None, ios_version=None, exclude_machine_types=()):
+        '''
+        Select devices, returned as dicts with the device_list.csv column names
+            - region/machine_type/ios_version => exact match filters (str or list)
+            - exclude_machine_types => skip machine types containing any of these strings
+        '''
+        clauses, params = [], []
+        for column, value in (("region", region), ("machine_type", machine_type),
+                              ("ios_version", ios_version)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        for name in exclude_machine_types:
+            clauses.append("instr(machine_type, ?) = 0")
+            params.append(name)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (f"SELECT {', '.join(COLUMNS.values())} FROM devices{where}"
+                 " ORDER BY device_name")
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{name: row[column] for name, column in COLUMNS.items()} for row in rows]
+
+    def export_csv(self, path):
+        '''
+        Write the whole inventory in the device_list.csv layout
+        '''
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(COLUMNS))
+            writer.writeheader()
+            writer.writerows(self.select())
@@ -0,0 +1,58 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from inventory_store import InventoryStore
+
+
+def node(name, ip_address, ios_version="17.3.4"):
+    return {"Device Name": name, "IP Address": ip_address,
+            "Machine Type": "Cisco Catalyst 9300", "IOS Version": ios_version}
+
+
+class TestInventorySync(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "inventory.db")
+        self.store = InventoryStore(self.path)
+        self.addCleanup(self.store.close)
+
+    def test_delta(self):
+        self.store.sync("US", [node("sw1", "10.0.0.1"), node("sw2", "10.0.0.2")])
+        delta = self.store.sync("US", [node("sw1", "10.0.0.1", "17.6.1"), node("sw3", "10.0.0.3")])
+        self.assertEqual(delta, {"added": 1, "changed": 1, "removed": 1, "unchanged": 0})
+        self.assertEqual([row["Device Name"] for row in self.store.select(region="US")], ["sw1", "sw3"])
+
+    def test_same_short_name_twice(self):
+        # sw1.site-a and sw1.site-b are both "sw1" once the domain is cut off
+        devices = [node("sw1", "10.0.0.1"), node("sw1", "10.1.0.1")]
+        self.assertEqual(self.store.sync("US", devices)["added"], 2)
+        self.assertEqual(self.store.sync("US", devices)["unchanged"], 2)
+        self.assertEqual(sorted(row["IP Address"] for row in self.store.select()),
+                         ["10.0.0.1", "10.1.0.1"])
+
+    def test_empty_region_is_not_removed(self):
+        self.store.sync("US", [node("sw1", "10.0.0.1")])
+        self.store.sync("EMEA", [node("sw9", "10.9.0.1")])
+        with self.assertRaises(ValueError):
+            self.store.sync("US", [])
+        self.assertEqual(len(self.store.select(region="US")), 1)
+        # A region that never had devices may stay empty
+        self.assertEqual(self.store.sync("APAC", [])["removed"], 0)
+
+    def test_old_layout_is_rebuilt(self):
+        self.store.close()
+        os.remove(self.path)
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE devices (region TEXT NOT NULL, device_name TEXT NOT NULL,"
+                         " PRIMARY KEY (region, device_name))")
+        self.store = InventoryStore(self.path)
+        self.addCleanup(self.store.close)
+        self.assertEqual(self.store.sync("US", [node("sw1", "10.0.0.1")])["added"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
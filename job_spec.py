@@ -0,0 +1,477 @@
+"""
+Declarative fleet jobs run as a streaming stage DAG
+
+A job is plain data (JOBS below, or a JSON file with the same layout): the
+checks it runs and a list of stages, each with a type, its parameters and the
+stages it reads from ("after", the previous stage by default).
+
+    inventory -> probe -> collect -> parse -> report
+
+compile_job() turns the spec into a pipeline.StageGraph. Devices stream from
+stage to stage through bounded queues, so the first devices are being probed
+and collected while the inventory is still loading, and a slow stage (SSH
+logins) holds back the stages feeding it instead of piling devices up in memory.
+A stage can feed several others, e.g. one parse stage and one report per check.
+
+Stage types:
+    - inventory => source: csv (device_list.csv), db (SQLite inventory) or solarwinds
+    - probe => tcp/22 connect or SSH banner probe, unreachable devices skip SSH
+    - collect => one SSH session per device running the commands of the checks
+    - parse => the collector.py check parsers (parsers.py templates), filling the report columns
+    - report => ResultSink csv report, written when the stage drains
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from rich import print as rprint
+import adaptive_limiter
+import output_archive
+import phase_timer
+import reachability
+from collector import CHECKS, DEVICE_COLUMNS, REPORT_SORT, SPILL_EVERY
+from config_cache import cache, parse_show_run
+from inventory import DeviceRecord, load_devices
+from phase_timer import timer
+from pipeline import Stage, StageGraph
+from session_pool import pool
+
+
+##########################
+# Global Variables
+##########################
+SW_REPORT_FILE = "./device_list.csv"
+INVENTORY_DB = "inventory.db"
+PROBE_WORKERS = 200
+PARSE_WORKERS = 4
+
+JOBS = {
+    "reload-check": {
+        "description": "Reload reason of every IOS/IOS-XE device",
+        "checks": ["reload"],
+        "stages": [
+            {"name": "inventory", "type": "inventory", "source": "csv", "path": SW_REPORT_FILE,
+             "platforms": ["ios"]},
+            {"name": "probe", "type": "probe", "mode": "tcp"},
+            {"name": "collect", "type": "collect"},
+            {"name": "parse", "type": "parse"},
+            {"name": "report", "type": "report", "path": "Cisco device abnormal reload report {date}.csv"},
+        ],
+    },
+    "scp-check": {
+        "description": "SCP server configuration of every IOS/IOS-XE device",
+        "checks": ["scp"],
+        "stages": [
+            {"name": "inventory", "type": "inventory", "source": "csv", "path": SW_REPORT_FILE,
+             "platforms": ["ios"]},
+            {"name": "probe", "type": "probe", "mode": "tcp"},
+            {"name": "collect", "type": "collect"},
+            {"name": "parse", "type": "parse"},
+            {"name": "report", "type": "report", "path": "SCP Report {date}.csv"},
+        ],
+    },
+    "audit": {
+        "description": "Reload, SCP and SNMP checks in one login, one report per check",
+        "checks": ["reload", "scp", "snmp"],
+        "stages": [
+            {"name": "inventory", "type": "inventory", "source": "csv", "path": SW_REPORT_FILE},
+            {"name": "probe", "type": "probe", "mode": "tcp"},
+            {"name": "collect", "type": "collect"},
+            {"name": "parse", "type": "parse"},
+            {"name": "reload report", "type": "report", "after": "parse", "checks": ["reload"],
+             "path": "Cisco device abnormal reload report {date}.csv"},
+            {"name": "scp report", "type": "report", "after": "parse", "checks": ["scp"],
+             "path": "SCP Report {date}.csv"},
+            {"name": "snmp report", "type": "report", "after": "parse", "checks": ["snmp"],
+             "path": "SNMP config report {date}.csv"},
+        ],
+    },
+}
+
+
+##########################
+# Job items
+##########################
+class Task:
+    '''
+    One device travelling through the job stages
+        - device => inventory DeviceRecord, parsed results are stored as its columns
+        - output => {command: raw output} filled by the collect stage
+        - error => reason the device failed, later stages skip it and report the error
+    '''
+    __slots__ = ("device", "output", "error")
+
+    def __init__(self, device):
+        self.device = device
+        self.output = {}
+        self.error = None
+
+
+def _checks(stage, spec):
+    names = stage.get("checks", spec.get("checks", list(CHECKS)))
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        raise ValueError(f"Stage {stage['name']}: unknown checks {', '.join(unknown)}")
+    return [CHECKS[name] for name in names]
+
+
+##########################
+# Stage types
+##########################
+def _solarwinds_devices(stage, context):
+    # One thread per Orion server, pages are handed over as soon as they arrive
+    from get_device_list_from_all_region import solarwinds_query
+    if not context.get("sw_username") or not context.get("sw_password"):
+        raise SystemExit("The solarwinds inventory needs --sw-username and --sw-password")
+    servers = stage["servers"]
+    devices = queue.Queue(maxsize=stage.get("queue", 1000))
+    done = object()
+
+    def query(region, server):
+        try:
+            for device_info in solarwinds_query(server, context["sw_username"], context["sw_password"],
+                                                region, stage.get("page_size", 5000)):
+                devices.put(device_info)
+        finally:
+            devices.put(done)
+
+    for region, server in servers.items():
+        threading.Thread(target=query, args=(region, server), name=f"solarwinds-{region}",
+                         daemon=True).start()
+    remaining = len(servers)
+    while remaining:
+        device_info = devices.get()
+        if device_info is done:
+            remaining -= 1
+            continue
+        yield DeviceRecord(device_info["Device Name"], device_info["IP Address"],
+                           device_info["Machine Type"], device_info["IOS Version"],
+                           device_info["Region"])
+
+
+def inventory_stage(stage, spec, context):
+    '''
+    Source stage streaming devices from a csv, the SQLite inventory or SolarWinds
+        - source => "csv" (path), "db" (path) or "solarwinds" (servers: {region: server})
+        - platforms => only keep devices of these platforms (ios, nxos_ssh)
+        - regions => only keep devices of these regions
+    '''
+    source = stage.get("source", "csv")
+    platforms = stage.get("platforms")
+    regions = stage.get("regions")
+
+    def devices():
+        if source == "csv":
+            records = load_devices(stage.get("path", SW_REPORT_FILE), platforms=platforms)
+        elif source == "db":
+            from inventory_store import InventoryStore
+            records = (DeviceRecord(row["Device Name"], row["IP Address"], row["Machine Type"],
+                                    row["IOS Version"], row["Region"])
+                       for row in InventoryStore(stage.get("path", INVENTORY_DB)).select(region=regions))
+        elif source == "solarwinds":
+            records = _solarwinds_devices(stage, context)
+        else:
+            raise ValueError(f"Stage {stage['name']}: unknown inventory source {source}")
+        for device in records:
+            if platforms and device.platform not in platforms:
+                continue
+            if regions and device.region not in regions:
+                continue
+            yield Task(device)
+
+    return Stage(stage["name"], devices)
+
+
+def probe_stage(stage, spec, context):
+    '''
+    Probe tcp/22 (or the SSH banner) so dead devices never take an SSH worker
+        - mode => "tcp", "banner" or "off"
+        - timeout => seconds a device has to answer
+    '''
+    mode = stage.get("mode", "tcp")
+    timeout = stage.get("timeout", reachability.PRESCAN_TIMEOUT)
+
+    def probe(task):
+        if task.error or mode == "off":
+            return task
+        host = task.device["IP Address"]
+        if mode == "banner":
+            result, _, _ = reachability.probe_ssh_banner(host, timeout=timeout)
+            reachable, reason = result != reachability.CLOSED, "no SSH banner"
+        else:
+            reachable, reason = reachability.probe_tcp(host, timeout=timeout)
+        if not reachable:
+            rprint(f"❌ {task.device['Device Name']} :: {reachability.UNREACHABLE} ({reason})")
+            task.error = reachability.UNREACHABLE
+        return task
+
+    return Stage(stage["name"], probe, workers=stage.get("workers", PROBE_WORKERS),
+                 queue_size=stage.get("queue"))
+
+
+def collect_stage(stage, spec, context):
+    '''
+    Log into each device once and run the commands of every applicable check
+        - max_age => answer running-config commands from snapshots younger than max_age seconds
+        - workers => SSH threads, the adaptive limiters decide how many log in at once
+    '''
+    checks = _checks(stage, spec)
+    max_age = stage.get("max_age", context.get("max_age"))
+    limiters = context["limiters"]
+
+    def collect(task):
+        device_data = task.device
+        commands = [check.command for check in checks if check.applies_to(device_data)]
+        if not commands:
+            return None
+        if task.error:
+            return task
+        host = device_data["IP Address"]
+        name, region = device_data["Device Name"], device_data.get("Region")
+        cached = []
+        if max_age is not None:
+            cached = [command for command in commands if parse_show_run(command)[0]]
+        live = [command for command in commands if command not in cached]
+        try:
+            with limiters.slot(device_data) as slot:
+                if cached:
+                    with timer.phase('cached command', name, region):
+                        # The session of a cache miss is kept for the live commands below
+                        task.output = {command: cache.run(host, "ios", context["username"],
+                                                          context["password"], command, max_age,
+                                                          keep=bool(live))
+                                       for command in cached}
+                if live:
+                    start = time.perf_counter()
+                    with pool.napalm(host, "ios", context["username"], context["password"]) as device:
+                        slot.connected()
+                        timer.record('connect', name, region, start)
+                        with timer.phase('show command', name, region):
+                            task.output.update(device.cli(live))
+            output_archive.record_all(device_data, task.output)
+        except Exception as err:
+            task.error = err
+        return task
+
+    workers = stage.get("workers", limiters.budget)
+    return Stage(stage["name"], collect, workers=workers, queue_size=stage.get("queue"))
+
+
+def parse_stage(stage, spec, context):
+    '''
+    Parse the raw outputs into the check columns, failed devices get the error instead
+    '''
+    checks = _checks(stage, spec)
+
+    def parse(task):
+        device_data = task.device
+        applicable = [check for check in checks if check.applies_to(device_data)]
+        if task.error:
+            for check in applicable:
+                device_data[check.column] = task.error
+            rprint(f"❌ {device_data['Device Name']} :: {task.error}")
+            return task
+        try:
+            values = {check.column: check.parser(task.output[check.command], device_data.platform)
+                      for check in applicable}
+        except Exception as err:
+            task.error = err
+            return parse(task)
+        for column, value in values.items():
+            device_data[column] = value
+        rprint(f"✅ {device_data['Device Name']} :: {values}")
+        return task
+
+    return Stage(stage["name"], parse, workers=stage.get("workers", PARSE_WORKERS),
+                 queue_size=stage.get("queue"))
+
+
+def report_stage(stage, spec, context):
+    '''
+    Push rows into a ResultSink, the csv report is written once the stage drains
+        - path => report name, {date} is replaced by today's date
+        - checks => only report these check columns, devices they don't apply to are left out
+    '''
+    from result_sink import ResultSink
+    checks = _checks(stage, spec) if "checks" in stage else None
+    sort_by = stage.get("sort_by", REPORT_SORT)
+    sink = ResultSink(path=stage["path"].format(date=context["date"]),
+                      spill_every=stage.get("spill_every", SPILL_EVERY), sort_by=sort_by)
+
+    def report(task):
+        device_data = task.device
+        if checks is None:
+            sink.push(device_data.to_dict())
+            return None
+        applicable = [check for check in checks if check.applies_to(device_data)]
+        if applicable:
+            row = {column: device_data[column] for column in DEVICE_COLUMNS if column in device_data}
+            row.update({check.column: device_data.get(check.column, "") for check in applicable})
+            sink.push(row)
+        return None
+
+    def close():
+        sink.write_csv(sort_by=sort_by)
+        rprint(f"✅ {sink.path} - Successfully generated!")
+
+    return Stage(stage["name"], report, workers=1, queue_size=stage.get("queue"), close=close)
+
+
+STAGE_TYPES = {
+    "inventory": inventory_stage,
+    "probe": probe_stage,
+    "collect": collect_stage,
+    "parse": parse_stage,
+    "report": report_stage,
+}
+
+
+##########################
+# Job compiler
+##########################
+def load_job(name_or_path):
+    '''
+    Return a built-in job by name, or load a JSON job file
+    '''
+    if name_or_path in JOBS:
+        return JOBS[name_or_path]
+    with open(name_or_path) as job_file:
+        return json.load(job_file)
+
+
+def job_inputs(spec):
+    '''
+    Resolve the "after" of every stage, returns {stage name: [input stage names]}
+    Raises ValueError on duplicate names, unknown inputs or cycles.
+    '''
+    names = [stage["name"] for stage in spec["stages"]]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate stage names: {', '.join(sorted(duplicates))}")
+    inputs = {}
+    for index, stage in enumerate(spec["stages"]):
+        after = stage.get("after", names[index - 1] if index else [])
+        after = [after] if isinstance(after, str) else list(after)
+        unknown = [name for name in after if name not in names]
+        if unknown:
+            raise ValueError(f"Stage {stage['name']} reads from unknown stages: {', '.join(unknown)}")
+        inputs[stage["name"]] = after
+
+    # Kahn's algorithm, whatever is left over sits on a cycle
+    pending = {name: len(after) for name, after in inputs.items()}
+    ready = [name for name, count in pending.items() if count == 0]
+    while ready:
+        name = ready.pop()
+        for child, after in inputs.items():
+            if name in after:
+                pending[child] -= 1
+                if pending[child] == 0:
+                    ready.append(child)
+    cycle = [name for name, count in pending.items() if count > 0]
+    if cycle:
+        raise ValueError(f"Stages form a cycle: {', '.join(cycle)}")
+    return inputs
+
+
+def compile_job(spec, context):
+    '''
+    Build the StageGraph of a job spec
+        - spec => job dict (checks, stages)
+        - context => run settings: username, password, limiters, date, max_age...
+    '''
+    inputs = job_inputs(spec)
+    stages = []
+    for stage in spec["stages"]:
+        if stage.get("type") not in STAGE_TYPES:
+            raise ValueError(f"Stage {stage['name']}: unknown type {stage.get('type')}")
+        is_source = not inputs[stage["name"]]
+        if is_source != (stage["type"] == "inventory"):
+            raise ValueError(f"Stage {stage['name']}: only inventory stages can (and must) have no input")
+        stages.append(STAGE_TYPES[stage["type"]](stage, spec, context))
+    return StageGraph(stages, inputs)
+
+
+def describe(spec):
+    inputs = job_inputs(spec)
+    for stage in spec["stages"]:
+        after = ", ".join(inputs[stage["name"]]) or "-"
+        params = {key: value for key, value in stage.items() if key not in ("name", "type", "after")}
+        rprint(f"  {stage['name']:<16} {stage['type']:<10} after: {after:<16} {params}")
+
+
+def run_job(spec, username, password, limiters=None, max_age=None, sw_username=None, sw_password=None):
+    '''
+    Compile and run a job, returns the StageGraph with its per-stage counts
+    '''
+    context = {
+        "username": username,
+        "password": password,
+        "limiters": limiters or adaptive_limiter.LimiterGroup(),
+        "date": datetime.now().strftime('%d-%b-%Y'),
+        "max_age": max_age,
+        "sw_username": sw_username,
+        "sw_password": sw_password,
+    }
+    graph = compile_job(spec, context)
+    graph.run()
+    graph.print_summary()
+    return graph
+
+
+##########################
+# Main Script
+##########################
+def main(argv=None):
+    '''
+    Main Script
+        - argv => command line arguments (default: sys.argv)
+    '''
+    parser = argparse.ArgumentParser(description="Run a declarative fleet job")
+    parser.add_argument('job', nargs='?', default=None,\
+        help=f'Built-in job ({", ".join(JOBS)}) or JSON job file')
+    parser.add_argument('-u', '--username', type=str, metavar='USERNAME',\
+        help='Username to access network device')
+    parser.add_argument('-p', '--password', type=str, metavar='PASSWORD',\
+        help='Password to access network device')
+    parser.add_argument('--sw-username', type=str, default=None, metavar='',\
+        help='SolarWinds username for solarwinds inventory stages')
+    parser.add_argument('--sw-password', type=str, default=None, metavar='',\
+        help='SolarWinds password for solarwinds inventory stages')
+    parser.add_argument('--max-age', type=int, default=None, metavar='',\
+        help='Use cached running-configs younger than this many seconds (0 forces a refresh)')
+    parser.add_argument('--show', action='store_true',\
+        help='Print the stages of the job and exit')
+    parser.add_argument('--engine', type=str, default="adaptive", choices=["adaptive", "thread"],\
+        help='SSH threads: adaptive concurrency or 100 worker threads (default: adaptive)')
+    adaptive_limiter.add_arguments(parser)
+    phase_timer.add_arguments(parser)
+    output_archive.add_arguments(parser)
+    args = parser.parse_args(argv)
+    output_archive.from_args(args)
+
+    if args.job is None:
+        for name, spec in JOBS.items():
+            rprint(f"{name:<14} {spec.get('description', '')}")
+        return
+    spec = load_job(args.job)
+    if args.show:
+        job_inputs(spec)
+        describe(spec)
+        return
+    if not args.username or not args.password:
+        parser.error("the following arguments are required: -u/--username, -p/--password")
+    limiters = adaptive_limiter.from_args(args)
+    run_job(spec, args.username, args.password, limiters, args.max_age, args.sw_username, args.sw_password)
+    if args.concurrency_log:
+        limiters.write_log(args.concurrency_log)
+    phase_timer.report(args)
+    output_archive.close()
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    main()
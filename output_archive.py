@@ -0,0 +1,378 @@
+"""
+Content-addressed archive of raw device outputs
+
+Every command output a script collects can be kept for later questions ("which
+devices have snmp-server community X?", "which reloaded due to power?") without
+another fleet-wide SSH run:
+
+    <archive>/objects/ab/cdef....z   zlib-compressed output, named by its SHA-256
+    <archive>/index.db               SQLite index: device, host, platform, command,
+                                     collection time and the digest of the output
+
+Identical outputs (the same ACL or config section on hundreds of devices) are
+stored once. The replay API feeds the latest (or any past) outputs to a
+parsers.py field, a collector check or any callable, fully offline.
+
+    python output_archive.py --field reload_reason --command "show version"
+    python output_archive.py --grep "snmp-server community X" --command "show running-config"
+"""
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from rich import print as rprint
+
+
+##########################
+# Global Variables
+##########################
+ARCHIVE_DIR = "./output_archive"
+COMPRESSION_LEVEL = 6
+COMMIT_EVERY = 500  # index rows written per transaction
+REPORT_NAME = "Archive replay report {date}.csv"
+INCLUDE_FILTER = re.compile(r"\|\s*i\w*\s+(?P<pattern>.+?)\s*$")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    device TEXT NOT NULL,
+    host TEXT,
+    platform TEXT,
+    command TEXT NOT NULL,
+    collected_at REAL NOT NULL,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_device_command ON outputs (device, command, collected_at);
+CREATE INDEX IF NOT EXISTS outputs_command ON outputs (command, collected_at);
+CREATE INDEX IF NOT EXISTS outputs_digest ON outputs (digest);
+"""
+
+
+##########################
+# Output Archive
+##########################
+class OutputArchive:
+    '''
+    Compressed, deduplicated store of raw outputs with a device/command/time index
+        - path => archive directory
+    '''
+    def __init__(self, path=ARCHIVE_DIR):
+        self.path = path
+        self.stored = 0
+        self.deduplicated = 0
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(os.path.join(path, "index.db"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, "objects", digest[:2], f"{digest[2:]}.z")
+
+    def put(self, output):
+        '''
+        Store an output once, returns its SHA-256 digest
+        '''
+        data = output.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            with self._lock:
+                self.deduplicated += 1
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as object_file:
+            object_file.write(zlib.compress(data, COMPRESSION_LEVEL))
+        os.replace(temp_path, path)
+        with self._lock:
+            self.stored += 1
+        return digest
+
+    def get(self, digest):
+        '''
+        Return the output stored under a digest
+        '''
+        with open(self._object_path(digest), "rb") as object_file:
+            return zlib.decompress(object_file.read()).decode("utf-8")
+
+    def record(self, device, command, output, host=None, platform=None, collected_at=None):
+        '''
+        Archive one command output of a device
+            - device => device name (or host when the name is not known)
+            - command => command as sent to the device
+            - output => raw output text
+        '''
+        if not isinstance(output, str):
+            return None
+        digest = self.put(output)
+        row = (device, host, platform, command, collected_at or time.time(), digest, len(output))
+        with self._lock:
+            self._conn.execute("INSERT INTO outputs VALUES (?, ?, ?, ?, ?, ?, ?)", row)
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+        return digest
+
+    def record_all(self, device_data, cli_output):
+        '''
+        Archive a NAPALM style {command: output} dict of an inventory device
+        '''
+        collected_at = time.time()
+        for command, output in cli_output.items():
+            self.record(device_data["Device Name"], command, output, device_data.get("IP Address"),
+                        getattr(device_data, "platform", None), collected_at)
+
+    def entries(self, command=None, device=None, before=None, latest=True):
+        '''
+        Index rows, newest first
+            - command => exact command (str or list)
+            - device => device name
+            - before => only outputs collected before this time (epoch seconds)
+            - latest => only the newest output of each device/command
+        '''
+        clauses, params = [], []
+        for column, value in (("command", command), ("device", device)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            if not values:
+                return
+            clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        if before is not None:
+            clauses.append("collected_at < ?")
+            params.append(before)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = f"SELECT * FROM outputs{where} ORDER BY collected_at DESC"
+        with self._lock:
+            self._conn.commit()
+            rows = self._conn.execute(query, params).fetchall()
+        seen = set()
+        for row in rows:
+            key = (row["device"], row["command"])
+            if latest and key in seen:
+                continue
+            seen.add(key)
+            yield dict(row)
+
+    def commands(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT command FROM outputs ORDER BY command")]
+
+    def replay(self, func, command=None, device=None, before=None, latest=True):
+        '''
+        Run func(output, entry) over archived outputs, yields (entry, result)
+        Outputs shared by many devices are decompressed once.
+        '''
+        get = lru_cache(maxsize=256)(self.get)
+        for entry in self.entries(command, device, before, latest):
+            yield entry, func(get(entry["digest"]), entry)
+
+
+##########################
+# Process wide archive
+##########################
+archive = None
+
+
+def enable(path=ARCHIVE_DIR):
+    '''
+    Start archiving the outputs collected by this process
+    '''
+    global archive
+    if archive is None:
+        archive = OutputArchive(path)
+    return archive
+
+
+def record_all(device_data, cli_output):
+    '''
+    Archive collected outputs when archiving is enabled, no-op otherwise
+    '''
+    if archive is not None:
+        archive.record_all(device_data, cli_output)
+
+
+def record(device, command, output, host=None, platform=None):
+    if archive is not None:
+        archive.record(device, command, output, host, platform)
+
+
+def add_arguments(parser):
+    '''
+    Add the archive flag to a script's argument parser
+    '''
+    parser.add_argument('--archive', type=str, default=None, metavar='',\
+        help=f'Keep every raw output in this content-addressed archive (e.g. {ARCHIVE_DIR})')
+
+
+def from_args(args):
+    if getattr(args, 'archive', None):
+        enable(args.archive)
+
+
+def close():
+    '''
+    Flush the archive index and print the deduplication summary
+    '''
+    global archive
+    if archive is None:
+        return
+    rprint(f"[cyan]Archive {archive.path}: {archive.stored} new outputs, "
+           f"{archive.deduplicated} deduplicated[/cyan]")
+    archive.close()
+    archive = None
+
+
+##########################
+# Check replay
+##########################
+def include_pattern(command):
+    '''
+    Pattern of a command's "| include <regex>" filter, None when unfiltered
+    '''
+    match = INCLUDE_FILTER.search(command)
+    return match.group("pattern") if match else None
+
+
+def answers_check(command, check_command):
+    '''
+    True when an archived command can be replayed for a check's command
+        - command => archived command, e.g. "show running-config"
+        - check_command => collector check command, e.g. "show run | i scp"
+    The show command must be the same and the "| include" pattern too, or the
+    archived output must be unfiltered (the check's filter is applied at replay).
+    '''
+    import parsers
+    if parsers.normalize_command(command) != parsers.normalize_command(check_command):
+        return False
+    return include_pattern(command) in (None, include_pattern(check_command))
+
+
+##########################
+# Main Script
+##########################
+def main(argv=None):
+    '''
+    Main Script
+        - argv => command line arguments (default: sys.argv)
+    '''
+    parser = argparse.ArgumentParser(description="Re-run parsers and checks against archived outputs")
+    parser.add_argument('--archive', type=str, default=ARCHIVE_DIR, metavar='',\
+        help=f'Archive directory (default: {ARCHIVE_DIR})')
+    parser.add_argument('--command', type=str, default=None, metavar='',\
+        help='Only replay outputs of this command')
+    parser.add_argument('--device', type=str, default=None, metavar='',\
+        help='Only replay outputs of this device')
+    parser.add_argument('--before', type=str, default=None, metavar='',\
+        help='Replay the outputs as they were before this date (YYYY-MM-DD[ HH:MM])')
+    parser.add_argument('--all', action='store_true',\
+        help='Replay every archived output, not only the latest per device and command')
+    replay_with = parser.add_mutually_exclusive_group()
+    replay_with.add_argument('--field', type=str, default=None, metavar='',\
+        help='parsers.py field to extract, e.g. reload_reason or snmp_communities')
+    replay_with.add_argument('--check', type=str, default=None, metavar='',\
+        help='collector.py check to re-run (reload, scp, snmp)')
+    replay_with.add_argument('--grep', type=str, default=None, metavar='',\
+        help='Regex, reports the matching lines of every output')
+    parser.add_argument('--list', action='store_true',\
+        help='List the archived commands and exit')
+    args = parser.parse_args(argv)
+
+    with OutputArchive(args.archive) as output_archive:
+        if args.list or not (args.field or args.check or args.grep):
+            for command in output_archive.commands():
+                rprint(command)
+            return
+
+        command = args.command
+        if args.field:
+            import parsers
+            column = args.field
+
+            def func(output, entry):
+                try:
+                    return parsers.parse(entry["command"], entry["platform"], output)[args.field]
+                except KeyError:
+                    # No template for this command, or the field is not one of its fields
+                    return None
+        elif args.check:
+            from collector import CHECKS
+            from config_cache import include
+            check = CHECKS[args.check]
+            column = check.column
+            # The check's own outputs and unfiltered outputs of the same show
+            # command (config_cache archives "show running-config") both qualify
+            command = command or [archived for archived in output_archive.commands()
+                                  if answers_check(archived, check.command)]
+            pattern = include_pattern(check.command)
+
+            def func(output, entry):
+                # Apply the check's "| include" filter to an unfiltered output
+                if pattern and include_pattern(entry["command"]) is None:
+                    output = include(output, pattern)
+                return check.parser(output, entry["platform"])
+        else:
+            regex = re.compile(args.grep)
+            column = "Matches"
+            func = lambda output, entry: [line for line in output.splitlines() if regex.search(line)]
+
+        before = datetime.fromisoformat(args.before).timestamp() if args.before else None
+        report_name = REPORT_NAME.format(date=datetime.now().strftime('%d-%b-%Y %H%M%S'))
+        fieldnames = ["Device Name", "IP Address", "Platform", "Command", "Collected at", column]
+        matched = 0
+        replayed = set()
+        with open(report_name, "w", newline="") as report_file:
+            writer = csv.DictWriter(report_file, fieldnames=fieldnames)
+            writer.writeheader()
+            for entry, value in output_archive.replay(func, command, args.device, before,
+                                                      latest=not args.all):
+                # --grep only reports the devices with a match
+                if value is None or (args.grep and not value):
+                    continue
+                # A --check may have a filtered and a full output per device, newest wins
+                if args.check and not args.all:
+                    if entry["device"] in replayed:
+                        continue
+                    replayed.add(entry["device"])
+                if isinstance(value, list):
+                    value = "\n".join(map(str, value))
+                matched += 1
+                writer.writerow({
+                    "Device Name": entry["device"],
+                    "IP Address": entry["host"] or "",
+                    "Platform": entry["platform"] or "",
+                    "Command": entry["command"],
+                    "Collected at": datetime.fromtimestamp(entry["collected_at"]).strftime('%Y-%m-%d %H:%M:%S'),
+                    column: value if value is not None else "",
+                })
+    rprint(f"✅ {report_name} - {matched} outputs replayed")
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import csv
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import output_archive
+from output_archive import OutputArchive, answers_check, include_pattern
+
+
+RUNNING_CONFIG = "\n".join([
+    "hostname sw2",
+    "ip scp server enable",
+    "snmp-server community public RO",
+    "line vty 0 4",
+])
+
+
+class TestCheckCommands(unittest.TestCase):
+
+    def test_include_pattern(self):
+        self.assertEqual(include_pattern("show run | i scp"), "scp")
+        self.assertEqual(include_pattern("show run | inc snmp-server"), "snmp-server")
+        self.assertIsNone(include_pattern("show running-config"))
+
+    def test_same_filter_answers(self):
+        self.assertTrue(answers_check("sh run | include scp", "show run | i scp"))
+        self.assertTrue(answers_check("show version | i reason:", "show version | i reason:"))
+
+    def test_other_filter_does_not_answer(self):
+        self.assertFalse(answers_check("show run | inc snmp-server", "show run | i scp"))
+        self.assertFalse(answers_check("show run | i scp", "show run | inc snmp-server"))
+
+    def test_unfiltered_output_answers(self):
+        self.assertTrue(answers_check("show running-config", "show run | i scp"))
+        self.assertFalse(answers_check("show running-config", "show version | i reason:"))
+        self.assertFalse(answers_check("show run | i scp", "show running-config"))
+
+
+class TestReplayCheck(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "archive")
+        with OutputArchive(self.path) as archive:
+            # sw1 has both check outputs, the snmp one newer; sw2 only a full config
+            archive.record("sw1", "show run | i scp", "ip scp server enable\n", "10.0.0.1", "ios", 100)
+            archive.record("sw1", "show run | inc snmp-server", "snmp-server community public RO\n",
+                           "10.0.0.1", "ios", 200)
+            archive.record("sw2", "show running-config", RUNNING_CONFIG, "10.0.0.2", "ios", 150)
+            archive.record("sw3", "show version | i reason:", "Last reload reason: power-on\n",
+                           "10.0.0.3", "ios", 300)
+        printer = mock.patch.object(output_archive, "rprint", lambda text: None)
+        printer.start()
+        self.addCleanup(printer.stop)
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        self.addCleanup(os.chdir, cwd)
+
+    def replay(self, check):
+        output_archive.main(["--archive", self.path, "--check", check])
+        report_name, = glob.glob("Archive replay report *.csv")
+        with open(report_name, newline="") as report_file:
+            rows = list(csv.DictReader(report_file))
+        os.remove(report_name)
+        return {row["Device Name"]: row for row in rows}
+
+    def test_scp_check_ignores_snmp_outputs(self):
+        rows = self.replay("scp")
+        self.assertEqual(sorted(rows), ["sw1", "sw2"])
+        self.assertEqual(rows["sw1"]["Command"], "show run | i scp")
+        self.assertEqual(rows["sw1"]["SCP Status"], "ip scp server enable")
+        self.assertEqual(rows["sw2"]["SCP Status"], "ip scp server enable")
+
+    def test_snmp_check_ignores_scp_outputs(self):
+        rows = self.replay("snmp")
+        self.assertEqual(sorted(rows), ["sw1", "sw2"])
+        self.assertEqual(rows["sw1"]["Command"], "show run | inc snmp-server")
+        self.assertEqual(rows["sw1"]["SNMP config"], "snmp-server community public RO")
+        # The check's filter is applied to the full running-config
+        self.assertEqual(rows["sw2"]["SNMP config"], "snmp-server community public RO")
+
+
+if __name__ == '__main__':
+    unittest.main()
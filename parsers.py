@@ -0,0 +1,206 @@
+"""
+Structured parsers for CLI output
+
+Every (command, platform) pair has a template of named fields, each a regex
+compiled once per process with the type of its value (str, int, bool or a list
+of every match). The registry normalizes the command first ("sh ver | i reason:"
+and "show version" share the show version template) and picks the IOS or NX-OS
+wording, so the scripts get typed fields instead of stripping "Reason:" off raw
+text.
+
+Parsing a short filtered output is cheaper than shipping it to another process,
+so it runs inline. Outputs above PROCESS_POOL_THRESHOLD (full show version /
+show running-config) are parsed in a process pool, so a large parse never holds
+the GIL the SSH worker threads need. The pool is started lazily from an SSH
+worker thread, so its processes are spawned rather than forked: forking a
+process with live threads can copy a lock another thread is holding.
+"""
+import atexit
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from inventory import IOS, NXOS
+
+
+##########################
+# Global Variables
+##########################
+PROCESS_POOL_THRESHOLD = 256 * 1024  # bytes of output before a parse moves to the process pool
+KEYWORDS = ["show", "version", "running-config", "startup-config", "access-lists", "ip", "ssh",
+            "inventory", "interfaces", "brief"]
+
+
+##########################
+# Templates
+##########################
+class Field:
+    '''
+    One value extracted from an output
+        - name => field name
+        - pattern => regex run in MULTILINE mode, the value is group "value" (or the whole match)
+        - kind => str, int, bool (any match) or list (every match)
+    '''
+    def __init__(self, name, pattern, kind=str):
+        self.name = name
+        self.regex = re.compile(pattern, re.MULTILINE)
+        self.kind = kind
+
+    def _value(self, match):
+        if "value" in self.regex.groupindex:
+            return match.group("value").strip()
+        return match.group(0).strip()
+
+    def extract(self, text):
+        if self.kind is list:
+            return [self._value(match) for match in self.regex.finditer(text)]
+        match = self.regex.search(text)
+        if self.kind is bool:
+            return match is not None
+        if match is None:
+            return None
+        value = self._value(match)
+        return int(value) if self.kind is int else value
+
+
+class Template:
+    '''
+    The fields of one command on one platform
+        - command => normalized command, e.g. "show version"
+        - platform => ios / nxos_ssh
+        - fields => list of Field
+    '''
+    def __init__(self, command, platform, fields):
+        self.command = command
+        self.platform = platform
+        self.fields = fields
+
+    def parse(self, text):
+        '''
+        Return {field name: typed value} of an output
+        '''
+        return {field.name: field.extract(text) for field in self.fields}
+
+
+RUNNING_CONFIG_FIELDS = [
+    Field("hostname", r"^hostname (?P<value>\S+)"),
+    Field("scp_server", r"^(?:ip scp server enable|feature scp-server)\s*$", bool),
+    Field("scp_lines", r"^.*\bscp\b.*$", list),
+    Field("snmp_lines", r"^snmp-server .*$", list),
+    Field("snmp_communities", r"^snmp-server community (?P<value>\S+)", list),
+    Field("usernames", r"^username (?P<value>\S+)", list),
+]
+
+TEMPLATES = [
+    Template("show version", IOS, [
+        Field("hostname", r"^(?P<value>\S+) uptime is "),
+        Field("uptime", r"^\S+ uptime is (?P<value>.+)$"),
+        Field("version", r"Cisco IOS.*?,? Version (?P<value>[^\s,]+)"),
+        Field("image", r'^System image file is "(?P<value>[^"]+)"'),
+        Field("serial", r"^Processor board ID (?P<value>\S+)"),
+        # IOS "Last reload reason:", IOS-XE "Reload reason:" and older "Reason:" lines
+        Field("reload_reason", r"^\s*(?:Last reload reason|Reload reason|Reason)\s*:\s*(?P<value>.*)$"),
+        Field("config_register", r"Configuration register is (?P<value>\S+)"),
+    ]),
+    Template("show version", NXOS, [
+        Field("hostname", r"^\s*Device name:\s*(?P<value>\S+)"),
+        Field("uptime", r"^Kernel uptime is (?P<value>.+)$"),
+        Field("version", r"^\s*(?:NXOS|system):\s+version (?P<value>\S+)"),
+        Field("image", r"^\s*(?:NXOS|system) image file is:\s*(?P<value>\S+)"),
+        Field("serial", r"Processor Board ID (?P<value>\S+)"),
+        # NX-OS reports "Last reset ..." followed by an indented "Reason: ..." line
+        Field("reload_reason", r"^\s*Reason:\s*(?P<value>.*)$"),
+    ]),
+    Template("show running-config", IOS, RUNNING_CONFIG_FIELDS),
+    Template("show running-config", NXOS, RUNNING_CONFIG_FIELDS),
+]
+
+
+##########################
+# Registry
+##########################
+@lru_cache(maxsize=1024)
+def normalize_command(command):
+    '''
+    Drop the output filter and expand abbreviations: "sh run | i scp" => "show running-config"
+    '''
+    words = []
+    for word in command.split("|", 1)[0].split():
+        word = word.lower()
+        words.append(next((keyword for keyword in KEYWORDS if keyword.startswith(word)), word))
+    return " ".join(words)
+
+
+class ParserRegistry:
+    '''
+    Templates keyed by (normalized command, platform)
+    Unknown platforms (unsupported, None) fall back to the IOS templates.
+    '''
+    def __init__(self, templates=()):
+        self._templates = {}
+        for template in templates:
+            self.register(template)
+
+    def register(self, template):
+        self._templates[(template.command, template.platform)] = template
+
+    def get(self, command, platform=IOS):
+        command = normalize_command(command)
+        template = self._templates.get((command, platform)) or self._templates.get((command, IOS))
+        if template is None:
+            raise KeyError(f"No parser for {command!r} on {platform}")
+        return template
+
+    def parse(self, command, platform, text):
+        return self.get(command, platform).parse(text)
+
+
+registry = ParserRegistry(TEMPLATES)
+
+
+##########################
+# Process pool
+##########################
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _parse_worker(job):
+    # Worker processes compile the templates once, when they import this module
+    command, platform, text = job
+    return registry.parse(command, platform, text)
+
+
+def _process_pool(workers=None):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def parse(command, platform, text, threshold=PROCESS_POOL_THRESHOLD):
+    '''
+    Parse one output into typed fields, in the process pool when it is large
+        - command => command as sent to the device
+        - platform => ios / nxos_ssh
+        - text => raw output
+    '''
+    if len(text) < threshold:
+        return registry.parse(command, platform, text)
+    # Only the calling thread waits, the other SSH threads keep the GIL
+    return _process_pool().submit(_parse_worker, (command, platform, text)).result()
+
+
+def parse_many(jobs, workers=None, threshold=PROCESS_POOL_THRESHOLD):
+    '''
+    Parse many (command, platform, text) jobs, in a process pool when they are large
+        - workers => process pool size (None lets the pool decide, 0 forces inline)
+    '''
+    jobs = list(jobs)
+    if workers == 0 or sum(len(text) for _, _, text in jobs) < threshold:
+        return [registry.parse(command, platform, text) for command, platform, text in jobs]
+    return list(_process_pool(workers).map(_parse_worker, jobs, chunksize=16))
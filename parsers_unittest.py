@@ -0,0 +1,128 @@
+import unittest
+import parsers
+from inventory import IOS, NXOS, UNSUPPORTED
+from parsers import normalize_command, registry
+
+
+IOS_VERSION = """Cisco IOS XE Software, Version 17.03.04
+Cisco IOS Software [Amsterdam], Catalyst L3 Switch Software (CAT9K_IOSXE), Version 17.3.4, RELEASE SOFTWARE (fc3)
+sw1 uptime is 2 weeks, 3 days, 4 hours, 5 minutes
+Uptime for this control processor is 2 weeks, 3 days, 4 hours, 7 minutes
+System returned to ROM by Reload Command
+Last reload reason: Reload Command
+System image file is "flash:packages.conf"
+Processor board ID FOC1234X0AB
+Configuration register is 0x102
+"""
+
+NXOS_VERSION = """Cisco Nexus Operating System (NX-OS) Software
+Software
+  BIOS: version 05.39
+  NXOS: version 9.3(8)
+  NXOS image file is: bootflash:///nxos.9.3.8.bin
+Hardware
+  cisco Nexus9000 C93180YC-EX chassis
+  Processor Board ID FDO21120U8N
+  Device name: n9k-1
+Kernel uptime is 120 day(s), 3 hour(s), 2 minute(s), 1 second(s)
+Last reset at 123456 usecs after Mon Jun 13 10:00:00 2026
+  Reason: Reset Requested by CLI command reload
+"""
+
+RUNNING_CONFIG = """hostname sw1
+username admin privilege 15 secret 9 $9$abc
+username ops secret 9 $9$def
+ip scp server enable
+snmp-server community public RO
+snmp-server community private RW
+snmp-server location DC1
+interface GigabitEthernet0/1
+ description uplink
+"""
+
+
+class TestNormalizeCommand(unittest.TestCase):
+
+    def test_abbreviations(self):
+        self.assertEqual(normalize_command("sh ver"), "show version")
+        self.assertEqual(normalize_command("sh run"), "show running-config")
+        self.assertEqual(normalize_command("show run"), "show running-config")
+        self.assertEqual(normalize_command("sh ip access-lists 20"), "show ip access-lists 20")
+
+    def test_output_filter_is_dropped(self):
+        self.assertEqual(normalize_command("show version | i reason:"), "show version")
+        self.assertEqual(normalize_command("show run | inc snmp-server"), "show running-config")
+        self.assertEqual(normalize_command("sh run | i scp"), "show running-config")
+
+    def test_case_and_spaces(self):
+        self.assertEqual(normalize_command("  SH   RUN  "), "show running-config")
+
+
+class TestTemplates(unittest.TestCase):
+
+    def test_ios_show_version(self):
+        fields = registry.parse("show version", IOS, IOS_VERSION)
+        self.assertEqual(fields["hostname"], "sw1")
+        self.assertEqual(fields["uptime"], "2 weeks, 3 days, 4 hours, 5 minutes")
+        self.assertEqual(fields["version"], "17.03.04")
+        self.assertEqual(fields["image"], "flash:packages.conf")
+        self.assertEqual(fields["serial"], "FOC1234X0AB")
+        self.assertEqual(fields["reload_reason"], "Reload Command")
+        self.assertEqual(fields["config_register"], "0x102")
+
+    def test_ios_filtered_reload_reason(self):
+        # "show version | i reason:" on IOS-XE and older IOS wording
+        self.assertEqual(registry.parse("show version | i reason:", IOS,
+                                        "Last reload reason: power-on\n")["reload_reason"], "power-on")
+        self.assertEqual(registry.parse("sh ver | i reason:", IOS,
+                                        "  Reason: Watchdog\n")["reload_reason"], "Watchdog")
+        self.assertIsNone(registry.parse("show version", IOS, "")["reload_reason"])
+
+    def test_nxos_show_version(self):
+        fields = registry.parse("show version", NXOS, NXOS_VERSION)
+        self.assertEqual(fields["hostname"], "n9k-1")
+        self.assertEqual(fields["version"], "9.3(8)")
+        self.assertEqual(fields["image"], "bootflash:///nxos.9.3.8.bin")
+        self.assertEqual(fields["serial"], "FDO21120U8N")
+        self.assertEqual(fields["reload_reason"], "Reset Requested by CLI command reload")
+        self.assertNotIn("config_register", fields)
+
+    def test_running_config(self):
+        fields = registry.parse("show running-config", IOS, RUNNING_CONFIG)
+        self.assertEqual(fields["hostname"], "sw1")
+        self.assertTrue(fields["scp_server"])
+        self.assertEqual(fields["scp_lines"], ["ip scp server enable"])
+        self.assertEqual(fields["snmp_communities"], ["public", "private"])
+        self.assertEqual(len(fields["snmp_lines"]), 3)
+        self.assertEqual(fields["usernames"], ["admin", "ops"])
+        self.assertFalse(registry.parse("sh run | i scp", IOS, "")["scp_server"])
+        self.assertTrue(registry.parse("show run", NXOS, "feature scp-server\n")["scp_server"])
+
+    def test_unknown_platform_falls_back_to_ios(self):
+        self.assertIs(registry.get("show version", UNSUPPORTED), registry.get("show version", IOS))
+        self.assertIs(registry.get("show version", None), registry.get("show version", IOS))
+
+    def test_unknown_command(self):
+        with self.assertRaises(KeyError):
+            registry.get("show inventory", IOS)
+
+
+class TestParse(unittest.TestCase):
+
+    def test_large_output_in_process_pool(self):
+        padding = "!\n" * (parsers.PROCESS_POOL_THRESHOLD // 2)
+        text = IOS_VERSION + padding
+        self.assertGreaterEqual(len(text), parsers.PROCESS_POOL_THRESHOLD)
+        self.assertEqual(parsers.parse("show version", IOS, text),
+                         registry.parse("show version", IOS, text))
+
+    def test_parse_many(self):
+        jobs = [("show version", IOS, IOS_VERSION), ("show version", NXOS, NXOS_VERSION),
+                ("show run", IOS, RUNNING_CONFIG)]
+        expected = [registry.parse(*job) for job in jobs]
+        self.assertEqual(parsers.parse_many(jobs, workers=0), expected)
+        self.assertEqual(parsers.parse_many(jobs, workers=2, threshold=0), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Per-device phase timing for the fleet scripts
+
+Wraps the expensive steps of a run (SSH connect/AAA, show commands,
+load_merge_candidate, commit_config, post-change checks, rollbacks...) and
+records how long each took for each device. At the end of a run the timer
+prints p50/p95/p99 per phase and region, and can export the events as a Chrome
+trace (chrome://tracing or https://ui.perfetto.dev) showing the run's
+concurrency timeline, one row per worker thread.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from rich import print as rprint
+
+
+def percentile(values, pct):
+    '''
+    Nearest-rank percentile of a sorted list
+    '''
+    if not values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+##########################
+# Phase Timer
+##########################
+class PhaseTimer:
+    '''
+    Collect (phase, device, region, start, end, thread) events from any thread
+    '''
+    def __init__(self):
+        self.started = time.perf_counter()
+        # deque.append is atomic, workers never wait on each other here
+        self._events = deque()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self._events = deque()
+
+    def record(self, phase, device, region='', start=None, end=None):
+        '''
+        Record a phase that started at start (time.perf_counter()) and ends now or at end
+        '''
+        end = time.perf_counter() if end is None else end
+        self._events.append((phase, device, region or '', start, end, threading.get_ident()))
+
+    @contextmanager
+    def phase(self, phase, device, region=''):
+        '''
+        Time the body of the with block as one phase of a device
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, device, region, start)
+
+    def __len__(self):
+        return len(self._events)
+
+    def summary(self):
+        '''
+        Return one row per (phase, region) and per phase over all regions
+        with count, p50, p95, p99, max and total seconds
+        '''
+        durations = {}
+        for phase, _, region, start, end, _ in list(self._events):
+            durations.setdefault((phase, region), []).append(end - start)
+            if region:
+                durations.setdefault((phase, 'All'), []).append(end - start)
+        rows = []
+        # Overall row first, then one row per region
+        for (phase, region), values in sorted(durations.items(),
+                                              key=lambda item: (item[0][0], item[0][1] != 'All', item[0][1])):
+            values.sort()
+            rows.append({'Phase': phase, 'Region': region or '-', 'Count': len(values),
+                         'p50': percentile(values, 50), 'p95': percentile(values, 95),
+                         'p99': percentile(values, 99), 'Max': values[-1], 'Total': sum(values)})
+        return rows
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        rprint(f"[cyan]{'Phase':<22} {'Region':<6} {'Count':>6} {'p50':>8} {'p95':>8} "
+               f"{'p99':>8} {'Max':>8}[/cyan]")
+        for row in rows:
+            rprint(f"[cyan]{row['Phase']:<22} {row['Region']:<6} {row['Count']:>6} "
+                   f"{row['p50']:>7.2f}s {row['p95']:>7.2f}s {row['p99']:>7.2f}s "
+                   f"{row['Max']:>7.2f}s[/cyan]")
+
+    def write_trace(self, path):
+        '''
+        Export the events as Chrome trace JSON (complete "X" events, microseconds)
+        '''
+        pid = os.getpid()
+        events = [{'name': phase, 'cat': region or 'device', 'ph': 'X', 'pid': pid, 'tid': thread,
+                   'ts': round((start - self.started) * 1e6), 'dur': round((end - start) * 1e6),
+                   'args': {'device': device, 'region': region}}
+                  for phase, device, region, start, end, thread in list(self._events)]
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+        rprint(f"✅ {path} - Trace with {len(events)} events written")
+        return path
+
+
+def add_arguments(parser):
+    '''
+    Add the trace export flag to a script's argument parser
+    '''
+    parser.add_argument('--trace', type=str, default=None, metavar='',\
+        help='Write per-device phase timings as a Chrome trace JSON file')
+
+
+def report(args=None):
+    '''
+    Print the phase summary and export the trace when --trace was given
+    '''
+    timer.print_summary()
+    if args is not None and getattr(args, 'trace', None):
+        timer.write_trace(args.trace)
+
+
+timer = PhaseTimer()
@@ -0,0 +1,227 @@
+"""
+Staged pipeline scheduler for fleet-wide jobs
+
+Each stage has its own pool of worker threads and a bounded input queue. Items
+flow from one stage to the next as soon as they are ready, so a slow stage
+(e.g. opening SSH sessions) overlaps with the work of the stages behind it and
+the total runtime follows the slowest stage instead of the sum of all stages.
+
+StageGraph runs the same stages wired as a DAG: a stage without inputs is a
+source producing the items, a stage may feed several stages (every child gets
+each item) and wait for several inputs.
+"""
+import queue
+import threading
+import time
+from rich import print as rprint
+
+
+_STOP = object()
+
+
+def _close(stage):
+    if stage.close is None:
+        return
+    try:
+        stage.close()
+    except Exception as err:
+        rprint(f"[red]❌ {stage.name} stage failed to close: {err}")
+        stage.errors.append(err)
+
+
+##########################
+# Pipeline Stage
+##########################
+class Stage:
+    '''
+    One step of a pipeline
+        - name => stage name used in log messages
+        - func => callable(item) returning the item to hand to the next stage,
+                  or None to drop it from the pipeline
+        - workers => number of threads running this stage
+        - queue_size => bound of the stage input queue (defaults to 2 x workers)
+        - close => callable() run once when the last worker of the stage exits
+    '''
+    def __init__(self, name, func, workers=1, queue_size=None, close=None):
+        self.name = name
+        self.func = func
+        self.close = close
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=queue_size or self.workers * 2)
+        self.errors = []
+        self._running = self.workers
+        self._lock = threading.Lock()
+
+    def stop(self):
+        '''
+        Tell every worker of this stage that no more items will arrive
+        '''
+        for _ in range(self.workers):
+            self.queue.put(_STOP)
+
+    def worker_done(self):
+        '''
+        Return True when the calling worker is the last one of the stage to exit
+        '''
+        with self._lock:
+            self._running -= 1
+            return self._running == 0
+
+
+##########################
+# Pipeline Scheduler
+##########################
+class Pipeline:
+    '''
+    Run items through a list of stages, each with its own bounded concurrency
+        - stages => ordered list of Stage objects
+    '''
+    def __init__(self, stages):
+        self.stages = stages
+        self.results = []
+        self._results_lock = threading.Lock()
+
+    def _work(self, index):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                break
+            try:
+                item = stage.func(item)
+            except Exception as err:
+                rprint(f"[red]❌ {stage.name} stage failed: {err}")
+                stage.errors.append(err)
+                continue
+            if item is None:
+                continue
+            if next_stage is not None:
+                next_stage.queue.put(item)
+            else:
+                with self._results_lock:
+                    self.results.append(item)
+        if stage.worker_done():
+            _close(stage)
+            if next_stage is not None:
+                next_stage.stop()
+
+    def run(self, items):
+        '''
+        Feed items into the first stage and block until the last stage drains
+            - items => any iterable, consumed lazily so inventory can stream in
+        '''
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for number in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(index,),
+                                          name=f"{stage.name}-{number}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            self.stages[0].queue.put(item)
+        self.stages[0].stop()
+
+        for thread in threads:
+            thread.join()
+        return self.results
+
+
+##########################
+# Stage Graph
+##########################
+class StageGraph:
+    '''
+    Run stages wired as a DAG, items stream between them through the bounded stage queues
+        - stages => list of Stage objects
+        - inputs => {stage name: [names of the stages feeding it]}, stages without
+                    inputs are sources whose func() returns an iterable of items
+    A full queue blocks the stages feeding it, so a slow stage throttles everything
+    upstream instead of piling items up in memory.
+    '''
+    def __init__(self, stages, inputs):
+        self.stages = {stage.name: stage for stage in stages}
+        self.inputs = {name: list(inputs.get(name, [])) for name in self.stages}
+        self.outputs = {name: [] for name in self.stages}
+        for name, parents in self.inputs.items():
+            for parent in parents:
+                self.outputs[parent].append(self.stages[name])
+        for stage in self.sources():
+            # One thread iterates a source
+            stage.workers = stage._running = 1
+        self.counts = {name: {'in': 0, 'out': 0} for name in self.stages}
+        self.finished = {}
+        self._pending = {name: len(parents) for name, parents in self.inputs.items()}
+        self._lock = threading.Lock()
+        self._started = None
+
+    def sources(self):
+        return [stage for name, stage in self.stages.items() if not self.inputs[name]]
+
+    def _emit(self, stage, item):
+        with self._lock:
+            self.counts[stage.name]['out'] += 1
+        for child in self.outputs[stage.name]:
+            child.queue.put(item)
+
+    def _finish(self, stage):
+        _close(stage)
+        self.finished[stage.name] = time.perf_counter() - self._started
+        for child in self.outputs[stage.name]:
+            with self._lock:
+                self._pending[child.name] -= 1
+                last_input = self._pending[child.name] == 0
+            if last_input:
+                child.stop()
+
+    def _produce(self, stage):
+        try:
+            for item in stage.func():
+                self._emit(stage, item)
+        except Exception as err:
+            rprint(f"[red]❌ {stage.name} stage failed: {err}")
+            stage.errors.append(err)
+        if stage.worker_done():
+            self._finish(stage)
+
+    def _work(self, stage):
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                break
+            with self._lock:
+                self.counts[stage.name]['in'] += 1
+            try:
+                item = stage.func(item)
+            except Exception as err:
+                rprint(f"[red]❌ {stage.name} stage failed: {err}")
+                stage.errors.append(err)
+                continue
+            if item is not None:
+                self._emit(stage, item)
+        if stage.worker_done():
+            self._finish(stage)
+
+    def run(self):
+        '''
+        Start every stage and block until all of them have drained
+        '''
+        self._started = time.perf_counter()
+        threads = []
+        for name, stage in self.stages.items():
+            target = self._work if self.inputs[name] else self._produce
+            for number in range(stage.workers):
+                thread = threading.Thread(target=target, args=(stage,),
+                                          name=f"{name}-{number}", daemon=True)
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return self.counts
+
+    def print_summary(self):
+        for name, counts in self.counts.items():
+            errors = len(self.stages[name].errors)
+            rprint(f"[cyan]{name:<16} {counts['in']:>7} in {counts['out']:>7} out "
+                   f"{errors:>5} errors, drained after {self.finished.get(name, 0):6.1f}s[/cyan]")
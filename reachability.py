@@ -0,0 +1,165 @@
+"""
+Lightweight reachability checks for network devices
+
+Used to prove a device still accepts management connections without paying for
+a full SSH login (key exchange + authentication + prompt detection).
+
+prescan() sweeps a whole target list at once on an asyncio event loop (TCP/22
+connect, optionally waiting for the SSH banner), so dead devices are reported as
+"Unreachable" in seconds instead of each holding a worker for the full
+NAPALM/Netmiko timeout.
+"""
+import asyncio
+import os
+import socket
+import time
+from rich import print as rprint
+
+
+##########################
+# Probe results
+##########################
+OPEN = 'open'
+CLOSED = 'closed'
+AMBIGUOUS = 'ambiguous'
+UNREACHABLE = 'Unreachable'
+# Management SSH port of every device, SSH_PORT points the scripts at device_simulator.py
+SSH_PORT = int(os.environ.get('SSH_PORT', 22))
+PRESCAN_MODES = ['tcp', 'banner', 'off']
+PRESCAN_TIMEOUT = 3.0
+PRESCAN_CONCURRENCY = 2000
+
+
+##########################
+# SSH banner probe
+##########################
+def probe_ssh_banner(host, port=SSH_PORT, timeout=3.0):
+    '''
+    Open a fresh TCP connection and wait for the SSH identification banner
+        - host => device ip address
+        - port => ssh port
+        - timeout => seconds to wait for the connection and the banner
+    Returns (result, banner, latency) where result is one of:
+        - OPEN => device sent an "SSH-" banner, so the vty ACL admitted us
+        - CLOSED => connection refused/reset or closed without a banner
+        - AMBIGUOUS => timed out or sent something unexpected
+    '''
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            banner = sock.recv(256)
+    except (ConnectionRefusedError, ConnectionResetError):
+        return CLOSED, '', time.perf_counter() - start
+    except OSError:
+        return AMBIGUOUS, '', time.perf_counter() - start
+
+    latency = time.perf_counter() - start
+    banner = banner.decode('ascii', errors='replace').strip()
+    if banner.startswith('SSH-'):
+        return OPEN, banner, latency
+    if not banner:
+        return CLOSED, banner, latency
+    return AMBIGUOUS, banner, latency
+
+
+def probe_tcp(host, port=SSH_PORT, timeout=PRESCAN_TIMEOUT):
+    '''
+    Blocking tcp connect for callers probing one device at a time (job_spec.py)
+    Returns (reachable, reason) like the async pre-scan
+    '''
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True, ''
+    except (ConnectionRefusedError, ConnectionResetError):
+        return False, f'tcp/{port} refused'
+    except socket.timeout:
+        return False, f'no answer on tcp/{port} within {timeout:g}s'
+    except OSError as err:
+        return False, str(err)
+
+
+##########################
+# Async pre-scan
+##########################
+def _socket_budget(concurrency):
+    # Every probe holds a file descriptor, stay below the process limit
+    try:
+        import resource
+    except ImportError:
+        return concurrency
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return concurrency
+    return max(1, min(concurrency, soft_limit - 128))
+
+
+async def _probe(semaphore, host, port, timeout, banner):
+    # Returns (reachable, reason)
+    async with semaphore:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (ConnectionRefusedError, ConnectionResetError):
+            return False, f'tcp/{port} refused'
+        except asyncio.TimeoutError:
+            return False, f'no answer on tcp/{port} within {timeout:g}s'
+        except OSError as err:
+            return False, str(err)
+        try:
+            if not banner:
+                return True, ''
+            data = await asyncio.wait_for(reader.read(256), timeout)
+        except (asyncio.TimeoutError, OSError):
+            # The port answered, let the SSH stage decide
+            return True, ''
+        finally:
+            writer.close()
+        if not data:
+            return False, 'connection closed without an SSH banner'
+        return True, ''
+
+
+def prescan(devices, mode='tcp', timeout=PRESCAN_TIMEOUT, concurrency=PRESCAN_CONCURRENCY,
+            port=SSH_PORT, host_of=None):
+    '''
+    Sweep every device at once and split them into reachable and unreachable
+        - devices => device records (or any objects host_of understands)
+        - mode => "tcp" (connect only), "banner" (also wait for the SSH banner) or "off"
+        - timeout => seconds to wait for the connection (and banner)
+        - concurrency => probes in flight, capped by the open file limit
+        - host_of => callable(device) returning the host, defaults to device["IP Address"]
+    Returns (live devices, [(device, reason), ...] of unreachable devices)
+    A device that accepted the connection but sent no clean banner counts as live.
+    '''
+    devices = list(devices)
+    if mode == 'off' or not devices:
+        return devices, []
+    if host_of is None:
+        host_of = lambda device: device["IP Address"]
+
+    async def _main():
+        semaphore = asyncio.Semaphore(_socket_budget(concurrency))
+        return await asyncio.gather(*(_probe(semaphore, host_of(device), port, timeout, mode == 'banner')
+                                      for device in devices))
+
+    start = time.perf_counter()
+    results = asyncio.run(_main())
+    live, unreachable = [], []
+    for device, (reachable, reason) in zip(devices, results):
+        if reachable:
+            live.append(device)
+        else:
+            unreachable.append((device, reason))
+    rprint(f"[cyan]Pre-scan: {len(live)} reachable, {len(unreachable)} unreachable "
+           f"in {time.perf_counter() - start:.1f}s[/cyan]")
+    return live, unreachable
+
+
+def add_arguments(parser):
+    '''
+    Add the pre-scan flags to a script's argument parser
+    '''
+    parser.add_argument('--prescan', type=str, default='tcp', choices=PRESCAN_MODES,\
+        help='Reachability sweep before SSH: tcp/22 connect, SSH banner or off (default: tcp)')
+    parser.add_argument('--prescan-timeout', type=float, default=PRESCAN_TIMEOUT, metavar='',\
+        help=f'Seconds a device has to answer the pre-scan (default: {PRESCAN_TIMEOUT:g})')
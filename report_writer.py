@@ -0,0 +1,170 @@
+"""
+Single-writer CSV report pipeline
+
+Worker threads hand finished report rows to a ReportWriter, which owns the
+report file. One background thread batches the rows and writes them every
+batch_size rows or flush_interval seconds, so there is exactly one header and no
+interleaved writes however many workers are running. The same batches can also
+be written as row groups of a Parquet file (needs pyarrow) for dashboards.
+"""
+import csv
+import os
+import queue
+import threading
+import time
+from rich import print as rprint
+
+
+_STOP = object()
+
+
+def read_header(path):
+    '''
+    Return the header row of an existing csv file, or None when empty/missing
+    '''
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, newline='') as csv_file:
+        return next(csv.reader(csv_file), None)
+
+
+##########################
+# Report Writer
+##########################
+class ReportWriter:
+    '''
+    Own a report file and write rows handed over by worker threads
+        - path => csv report, appended to when it already has the same header
+        - fieldnames => report columns
+        - batch_size => rows written per batch
+        - flush_interval => seconds before a partial batch is written
+        - parquet_path => also write the rows to this Parquet file
+        - numeric_fields => columns stored as float in the Parquet file
+        - overwrite => start the csv from scratch instead of appending to it
+    '''
+    def __init__(self, path, fieldnames, batch_size=200, flush_interval=1.0,
+                 parquet_path=None, numeric_fields=(), overwrite=False):
+        self.path = path
+        self.overwrite = overwrite
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.parquet_path = parquet_path
+        self.numeric_fields = set(numeric_fields)
+        self.rows = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._csv_file = None
+        self._csv_writer = None
+        self._parquet_writer = None
+        self._schema = None
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        header = None if self.overwrite else read_header(self.path)
+        if header is not None and header != self.fieldnames:
+            # Never mix two layouts in one file, start a new report instead
+            root, ext = os.path.splitext(self.path)
+            self.path = f"{root} {time.strftime('%H%M%S')}{ext}"
+            rprint(f"[yellow]Existing report has different columns, writing to {self.path}")
+            header = None
+        self._csv_file = open(self.path, 'w' if self.overwrite else 'a', newline='')
+        self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=self.fieldnames,
+                                          extrasaction='ignore')
+        if header is None:
+            self._csv_writer.writeheader()
+        if self.parquet_path:
+            self._open_parquet()
+        self._thread = threading.Thread(target=self._run, name='report-writer', daemon=True)
+        self._thread.start()
+
+    def _open_parquet(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as err:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow") from err
+        self._schema = pa.schema([
+            (field, pa.float64() if field in self.numeric_fields else pa.string())
+            for field in self.fieldnames
+        ])
+        self._parquet_writer = pq.ParquetWriter(self.parquet_path, self._schema)
+
+    def write(self, row):
+        '''
+        Queue one report row, safe to call from any thread
+        Raises the error that stopped the writer thread, if any
+        '''
+        if self._error is not None:
+            raise self._error
+        self._queue.put(row)
+
+    def _run(self):
+        # A failed write (disk full, bad row) ends the thread; the error is kept
+        # and raised by the next write() and by close(), never lost with the thread
+        try:
+            self._write_batches()
+        except Exception as err:
+            self._error = err
+
+    def _write_batches(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                break
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        self._flush(batch)
+
+    def _flush(self, batch):
+        if not batch:
+            return
+        self._csv_writer.writerows(batch)
+        self._csv_file.flush()
+        if self._parquet_writer is not None:
+            import pyarrow as pa
+            columns = {
+                field: [self._parquet_value(field, row.get(field)) for row in batch]
+                for field in self.fieldnames
+            }
+            self._parquet_writer.write_table(pa.table(columns, schema=self._schema))
+        self.rows += len(batch)
+
+    def _parquet_value(self, field, value):
+        if value is None or value == '':
+            return None
+        if field in self.numeric_fields:
+            return float(value)
+        return str(value)
+
+    def close(self):
+        '''
+        Write the remaining rows and close the report files
+        Raises the error that stopped the writer thread, if any
+        '''
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        self._csv_file.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,56 @@
+import csv
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from report_writer import ReportWriter
+
+
+FIELDNAMES = ["Device Name", "Status"]
+
+
+class TestReportWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "report.csv")
+
+    def read_report(self):
+        with open(self.path, newline='') as csv_file:
+            return list(csv.DictReader(csv_file))
+
+    def test_rows_from_many_threads(self):
+        with ReportWriter(self.path, FIELDNAMES, batch_size=7) as writer:
+            threads = [threading.Thread(target=lambda index=index: [
+                writer.write({"Device Name": f"sw{index}-{row}", "Status": "ok"}) for row in range(50)])
+                for index in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(writer.rows, 200)
+        self.assertEqual(len(self.read_report()), 200)
+
+    def test_appends_under_the_same_header(self):
+        for name in ("sw1", "sw2"):
+            with ReportWriter(self.path, FIELDNAMES) as writer:
+                writer.write({"Device Name": name, "Status": "ok"})
+        self.assertEqual([row["Device Name"] for row in self.read_report()], ["sw1", "sw2"])
+
+    def test_write_error_is_raised(self):
+        writer = ReportWriter(self.path, FIELDNAMES, batch_size=1)
+        writer.start()
+        # Not a mapping, DictWriter fails on the writer thread
+        writer.write("sw1,ok")
+        writer._thread.join(timeout=5)
+        with self.assertRaises(AttributeError):
+            writer.write({"Device Name": "sw1", "Status": "ok"})
+        with self.assertRaises(AttributeError):
+            writer.close()
+        self.assertTrue(writer._csv_file.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
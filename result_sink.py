@@ -0,0 +1,272 @@
+"""
+Thread-safe result sink for the fleet collectors
+
+Worker threads push one record (dict) per device without taking a lock. The
+records are drained into column lists only when the report is materialized, so
+memory is proportional to the number of rows and the DataFrame/CSV is built
+exactly once (plain csv module, no pandas needed).
+
+With flush_every set, rows are appended to the CSV every N records instead of
+being kept in memory. The header is written with the first rows, so flush mode
+needs the report columns up front and rejects a record with any other column.
+
+With spill_every set, every N records are sorted and written to a spill file in
+<report>.spill/ and the final report is a k-way merge of the spill files, so
+memory stays flat, the report is still sorted and the spill files of an
+interrupted run can be merged afterwards with recover() (python result_sink.py
+<report>). Spill files are named after their run, and recover() only ever merges
+the files of one run.
+"""
+import argparse
+import csv
+import glob
+import heapq
+import os
+import queue
+import threading
+import time
+
+
+def spill_dir(path):
+    '''
+    Directory holding the spill files of a report
+    '''
+    return f"{path}.spill"
+
+
+def _read_spill(path):
+    with open(path, newline='') as csv_file:
+        yield from csv.DictReader(csv_file)
+
+
+def merge_spills(spill_files, path, sort_by):
+    '''
+    k-way merge sorted spill files into one sorted csv report
+        - spill_files => csv files, each already sorted by sort_by
+        - path => final report
+        - sort_by => sort columns
+    '''
+    columns = []
+    for spill_file in spill_files:
+        with open(spill_file, newline='') as csv_file:
+            for column in next(csv.reader(csv_file), []):
+                if column not in columns:
+                    columns.append(column)
+    rows = heapq.merge(*(_read_spill(spill_file) for spill_file in spill_files),
+                       key=lambda row: [row.get(column) or "" for column in sort_by])
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=columns, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def spill_runs(path):
+    '''
+    {run id: sorted spill files} of the runs that left spill files for a report
+    '''
+    runs = {}
+    for spill_file in sorted(glob.glob(os.path.join(spill_dir(path), "*.csv"))):
+        # <run id>-<sequence>.csv, the run id being <date>-<time>-<pid>
+        run_id = os.path.basename(spill_file).rsplit("-", 1)[0]
+        runs.setdefault(run_id, []).append(spill_file)
+    return runs
+
+
+def recover(path, run_id=None, sort_by=("Region", "Device Name")):
+    '''
+    Build a report from the spill files an interrupted run left behind
+        - path => report the interrupted run was writing
+        - run_id => run to recover, needed when several runs left spill files
+    Raises ValueError rather than merging the rows of different runs
+    '''
+    runs = spill_runs(path)
+    if run_id is None and len(runs) > 1:
+        raise ValueError(f"Spill files of several runs in {spill_dir(path)}: {', '.join(runs)}")
+    if run_id is None and runs:
+        run_id = next(iter(runs))
+    spill_files = runs.get(run_id)
+    if not spill_files:
+        return None
+    merge_spills(spill_files, path, list(sort_by))
+    for spill_file in spill_files:
+        os.remove(spill_file)
+    if not os.listdir(spill_dir(path)):
+        os.rmdir(spill_dir(path))
+    return path
+
+
+##########################
+# Result Sink
+##########################
+class ResultSink:
+    '''
+    Collect per-device records from many worker threads
+        - path => csv file written in flush/spill mode
+        - flush_every => append rows to path every N records (0 keeps everything in memory)
+        - spill_every => write sorted runs of N records to spill files, merged by write_csv
+        - sort_by => sort columns of the spill runs and the final report
+        - columns => report columns, taken from the records when omitted (required with flush_every)
+    '''
+    def __init__(self, path=None, flush_every=0, columns=None, spill_every=0, sort_by=None):
+        if (flush_every or spill_every) and not path:
+            raise ValueError("flush_every/spill_every need a csv path to write to")
+        if flush_every and not columns:
+            raise ValueError("flush_every needs the report columns, the csv header is written first")
+        self.path = path
+        self.flush_every = flush_every
+        self.spill_every = spill_every
+        self.sort_by = list(sort_by or [])
+        self.columns = list(columns) if columns else []
+        self.spill_files = []
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self._queue = queue.SimpleQueue()
+        self._data = {column: [] for column in self.columns}
+        self._buffered = 0
+        self._flushed = 0
+        self._lock = threading.Lock()
+
+    def push(self, record):
+        '''
+        Add one record, safe to call from any thread
+            - record => dict of column name to value
+        '''
+        self._queue.put(record)
+        if self.flush_every and self._queue.qsize() >= self.flush_every:
+            self.flush()
+        elif self.spill_every and self._queue.qsize() >= self.spill_every:
+            self.spill()
+
+    def __len__(self):
+        return self._flushed + self._buffered + self._queue.qsize()
+
+    def _drain(self):
+        # Caller must hold self._lock
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            unknown = [column for column in record if column not in self._data]
+            # The flush-mode csv header is the declared columns, spill files
+            # carry their own header
+            if unknown and self.flush_every:
+                raise ValueError(f"Columns {', '.join(unknown)} are not in the declared report columns")
+            for column in unknown:
+                self.columns.append(column)
+                self._data[column] = [""] * self._buffered
+            for column in self.columns:
+                self._data[column].append(record.get(column, ""))
+            self._buffered += 1
+
+    def _iter_rows(self):
+        # Caller must hold self._lock
+        columns = [self._data[column] for column in self.columns]
+        for index in range(self._buffered):
+            yield [column[index] for column in columns]
+
+    def _sorted_rows(self, sort_by):
+        # Caller must hold self._lock
+        rows = list(self._iter_rows())
+        sort_index = [self.columns.index(column) for column in sort_by or [] if column in self.columns]
+        if sort_index:
+            rows.sort(key=lambda row: [str(row[index]) for index in sort_index])
+        return rows
+
+    def _release(self):
+        # Caller must hold self._lock
+        self._flushed += self._buffered
+        self._buffered = 0
+        self._data = {column: [] for column in self.columns}
+
+    def flush(self):
+        '''
+        Append the buffered records to the csv file and release their memory
+        '''
+        with self._lock:
+            self._drain()
+            if not self._buffered:
+                return
+            # The first flush starts a fresh report, later ones append to it
+            first_flush = self._flushed == 0
+            with open(self.path, 'w' if first_flush else 'a', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                if first_flush:
+                    writer.writerow(self.columns)
+                writer.writerows(self._iter_rows())
+            self._release()
+
+    def spill(self):
+        '''
+        Write the buffered records, sorted, to a new spill file and release their memory
+        '''
+        with self._lock:
+            self._drain()
+            if not self._buffered:
+                return
+            os.makedirs(spill_dir(self.path), exist_ok=True)
+            spill_file = os.path.join(spill_dir(self.path),
+                                      f"{self.run_id}-{len(self.spill_files):05d}.csv")
+            with open(spill_file, 'w', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(self.columns)
+                writer.writerows(self._sorted_rows(self.sort_by))
+            self.spill_files.append(spill_file)
+            self._release()
+
+    def to_frame(self):
+        '''
+        Build a pandas DataFrame from the buffered records
+        '''
+        import pandas as pd
+        with self._lock:
+            self._drain()
+            return pd.DataFrame(self._data, columns=self.columns)
+
+    def write_csv(self, path=None, sort_by=None):
+        '''
+        Write the final report
+            - path => csv file, defaults to the sink path
+            - sort_by => columns to sort by (flush mode keeps arrival order,
+                         spill mode merges on the sink sort_by)
+        '''
+        if self.flush_every:
+            self.flush()
+            return self.path
+        path = path or self.path
+        if self.spill_files:
+            self.spill()
+            merge_spills(self.spill_files, path, self.sort_by)
+            for spill_file in self.spill_files:
+                os.remove(spill_file)
+            self.spill_files = []
+            if not os.listdir(spill_dir(self.path)):
+                os.rmdir(spill_dir(self.path))
+            return path
+        with self._lock:
+            self._drain()
+            rows = self._sorted_rows(sort_by or self.sort_by)
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(self.columns)
+            writer.writerows(rows)
+        return path
+
+
+##########################
+# Run Script
+##########################
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the spill files of an interrupted run")
+    parser.add_argument('report', type=str, help='Report csv the interrupted run was writing')
+    parser.add_argument('--run-id', type=str, default=None, metavar='',\
+        help='Run to recover when several runs left spill files')
+    args = parser.parse_args()
+    try:
+        recovered = recover(args.report, args.run_id)
+    except ValueError as err:
+        raise SystemExit(f"❌ {err}, pick one with --run-id")
+    if recovered:
+        print(f"✅ {args.report} - Recovered from spill files")
+    else:
+        print(f"❌ No spill files found for {args.report}")
@@ -0,0 +1,174 @@
+import csv
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from result_sink import ResultSink, recover, spill_dir, spill_runs
+
+
+SORT_BY = ["Region", "Device Name"]
+
+
+def read_report(path):
+    with open(path, newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        return reader.fieldnames, list(reader)
+
+
+def sort_key(row):
+    return [row[column] for column in SORT_BY]
+
+
+class TestResultSinkSpill(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "report.csv")
+
+    def devices(self, count, seed=1):
+        regions = ["US", "EMEA", "APAC"]
+        rows = [{"Device Name": f"sw{index:04d}", "Region": regions[index % 3], "Status": "ok"}
+                for index in range(count)]
+        random.Random(seed).shuffle(rows)
+        return rows
+
+    def test_spill_merge_is_sorted(self):
+        sink = ResultSink(path=self.path, spill_every=7, sort_by=SORT_BY)
+        rows = self.devices(100)
+        for row in rows:
+            sink.push(row)
+        self.assertGreater(len(sink.spill_files), 1)
+        self.assertEqual(len(sink), 100)
+
+        sink.write_csv()
+        _, report = read_report(self.path)
+        self.assertEqual(len(report), 100)
+        self.assertEqual(report, sorted(report, key=sort_key))
+        self.assertEqual({row["Device Name"] for row in report}, {row["Device Name"] for row in rows})
+
+    def test_spill_dir_removed(self):
+        sink = ResultSink(path=self.path, spill_every=5, sort_by=SORT_BY)
+        for row in self.devices(23):
+            sink.push(row)
+        sink.write_csv()
+        self.assertEqual(sink.spill_files, [])
+        self.assertFalse(os.path.exists(spill_dir(self.path)))
+
+    def test_columns_are_the_union_of_every_spill(self):
+        sink = ResultSink(path=self.path, spill_every=2, sort_by=SORT_BY)
+        sink.push({"Device Name": "b", "Region": "US", "Reload reason": "power-on"})
+        sink.push({"Device Name": "a", "Region": "US", "Reload reason": "reload"})
+        # Later records bring a column the first spill file does not have
+        sink.push({"Device Name": "c", "Region": "EMEA", "Reload reason": "", "Error": "timeout"})
+        sink.push({"Device Name": "d", "Region": "APAC", "Error": "auth failed"})
+        sink.write_csv()
+
+        columns, report = read_report(self.path)
+        self.assertEqual(columns, ["Device Name", "Region", "Reload reason", "Error"])
+        self.assertEqual([row["Device Name"] for row in report], ["d", "c", "a", "b"])
+        rows = {row["Device Name"]: row for row in report}
+        self.assertEqual(rows["b"]["Error"], "")
+        self.assertEqual(rows["d"]["Error"], "auth failed")
+        self.assertEqual(rows["d"]["Reload reason"], "")
+
+    def test_concurrent_pushes(self):
+        sink = ResultSink(path=self.path, spill_every=50, sort_by=SORT_BY)
+        rows = self.devices(2000)
+        threads = [threading.Thread(target=lambda chunk: [sink.push(row) for row in chunk],
+                                    args=(rows[index::8],)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sink.write_csv()
+        _, report = read_report(self.path)
+        self.assertEqual(len(report), 2000)
+        self.assertEqual(report, sorted(report, key=sort_key))
+
+    def test_recover_leftover_spill_files(self):
+        sink = ResultSink(path=self.path, spill_every=10, sort_by=SORT_BY)
+        for row in self.devices(35):
+            sink.push(row)
+        # The run is interrupted before write_csv: 3 spill files, 5 records lost in memory
+        self.assertEqual(len(sink.spill_files), 3)
+        self.assertFalse(os.path.exists(self.path))
+
+        self.assertEqual(recover(self.path), self.path)
+        _, report = read_report(self.path)
+        self.assertEqual(len(report), 30)
+        self.assertEqual(report, sorted(report, key=sort_key))
+        self.assertFalse(os.path.exists(spill_dir(self.path)))
+
+    def test_recover_without_spill_files(self):
+        self.assertIsNone(recover(self.path))
+
+    def interrupted_run(self, run_id, count):
+        sink = ResultSink(path=self.path, spill_every=10, sort_by=SORT_BY)
+        sink.run_id = run_id
+        for row in self.devices(count):
+            sink.push(row)
+        return sink
+
+    def test_recover_refuses_to_mix_runs(self):
+        self.interrupted_run("20260101-000000-100", 20)
+        self.interrupted_run("20260102-000000-200", 30)
+        self.assertEqual(sorted(spill_runs(self.path)), ["20260101-000000-100", "20260102-000000-200"])
+        with self.assertRaises(ValueError):
+            recover(self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_recover_one_run(self):
+        self.interrupted_run("20260101-000000-100", 20)
+        self.interrupted_run("20260102-000000-200", 30)
+        self.assertEqual(recover(self.path, "20260102-000000-200"), self.path)
+        _, report = read_report(self.path)
+        self.assertEqual(len(report), 30)
+        # The other run's spill files are left for their own recovery
+        self.assertEqual(list(spill_runs(self.path)), ["20260101-000000-100"])
+        self.assertEqual(recover(self.path), self.path)
+        self.assertFalse(os.path.exists(spill_dir(self.path)))
+
+    def test_in_memory_report_is_sorted(self):
+        sink = ResultSink(path=self.path, sort_by=SORT_BY)
+        for row in self.devices(20):
+            sink.push(row)
+        sink.write_csv()
+        _, report = read_report(self.path)
+        self.assertEqual(report, sorted(report, key=sort_key))
+        self.assertFalse(os.path.exists(spill_dir(self.path)))
+
+
+class TestResultSinkFlush(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "report.csv")
+
+    def test_flush_needs_columns(self):
+        with self.assertRaises(ValueError):
+            ResultSink(path=self.path, flush_every=2)
+
+    def test_late_declared_column_is_kept(self):
+        sink = ResultSink(path=self.path, flush_every=2, columns=["Device Name", "Status", "Error"])
+        sink.push({"Device Name": "sw1", "Status": "ok"})
+        sink.push({"Device Name": "sw2", "Status": "ok"})
+        # The header is written by now, the first error only shows up afterwards
+        sink.push({"Device Name": "sw3", "Status": "failed", "Error": "timeout"})
+        sink.write_csv()
+        fieldnames, report = read_report(self.path)
+        self.assertEqual(fieldnames, ["Device Name", "Status", "Error"])
+        self.assertEqual([row["Error"] for row in report], ["", "", "timeout"])
+
+    def test_undeclared_column_is_rejected(self):
+        sink = ResultSink(path=self.path, flush_every=1, columns=["Device Name", "Status"])
+        sink.push({"Device Name": "sw1", "Status": "ok"})
+        with self.assertRaises(ValueError):
+            sink.push({"Device Name": "sw2", "Status": "failed", "Error": "timeout"})
+
+
+if __name__ == '__main__':
+    unittest.main()
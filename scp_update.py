@@ -1,46 +1,87 @@
 import csv
 import argparse
 from rich import print as rprint
-from netmiko import ConnectHandler, NetmikoTimeoutException, NetmikoAuthenticationException
-from concurrent.futures import ThreadPoolExecutor
+from session_pool import pool
+import async_engine
+from contextlib import nullcontext
+import adaptive_limiter
+import phase_timer
+import time
+from phase_timer import timer
+import reachability
 
-def configure_scp_server(hostname, device_type, username, password):
+def configure_scp_server(hostname, device_type, username, password, limiter=None):
     if device_type != 'ios':
         rprint(f'[red]❌ SCP server configuration is not supported on {device_type} devices')
         return False
     try:
-        device = {
-            'device_type': 'cisco_ios',
-            'ip': hostname,
-            'username': username,
-            'password': password,
-        }
-        with ConnectHandler(**device) as conn:
-            conn.send_command('ip scp server enable')
+        with limiter.slot() if limiter else nullcontext() as slot:
+            start = time.perf_counter()
+            with pool.netmiko(hostname, 'cisco_ios', username, password) as conn:
+                if slot is not None:
+                    slot.connected()
+                timer.record('connect', hostname, start=start)
+                # A config command, same as the async engine's send_config
+                with timer.phase('send_config_set', hostname):
+                    conn.send_config_set(['ip scp server enable'])
         rprint(f'[green]✅ SCP server enabled on {hostname}')
-    except (NetmikoTimeoutException, NetmikoAuthenticationException) as e:
+    # One failed device must not stop limiters.map for the rest of the fleet
+    except Exception as e:
         rprint(f'[red]❌ Failed to configure SCP server on {hostname}: {e}')
 
-if __name__ == '__main__':
-    ##########################
-    # Script Arguments
-    ##########################
+def configure_scp_server_async(rows, username, password, concurrency):
+    devices = []
+    for row in rows:
+        device_type = row['machine type'].lower()
+        if device_type != 'ios':
+            rprint(f'[red]❌ SCP server configuration is not supported on {device_type} devices')
+            continue
+        devices.append(row)
+
+    def on_output(row, output):
+        rprint(f'[green]✅ SCP server enabled on {row["IP Address"]}')
+
+    def on_error(row, e):
+        rprint(f'[red]❌ Failed to configure SCP server on {row["IP Address"]}: {e}')
+
+    async_engine.send_config(devices, ['ip scp server enable'], username, password,
+                             on_output, on_error, concurrency=concurrency)
+
+def main(argv=None):
+    '''
+    Main Script
+        - argv => command line arguments (default: sys.argv)
+    '''
     parser = argparse.ArgumentParser(description="Credential to update ACL")
-    parser.add_argument('-u', '--username', type=str, metavar='',\
+    parser.add_argument('-u', '--username', type=str, metavar='USERNAME',\
         help='Username to access network device', required=True)
-    parser.add_argument('-p', '--password', type=str, metavar='',\
+    parser.add_argument('-p', '--password', type=str, metavar='PASSWORD',\
         help='Password to access network device', required=True)
-    args = parser.parse_args()
+    parser.add_argument('--engine', type=str, default='adaptive', choices=['adaptive', 'thread', 'async'],\
+        help='Execution engine: adaptive worker threads, 100 worker threads or asyncio (default: adaptive)')
+    parser.add_argument('--concurrency', type=int, default=async_engine.DEFAULT_CONCURRENCY, metavar='',\
+        help='Maximum concurrent SSH sessions for the async engine')
+    adaptive_limiter.add_arguments(parser)
+    reachability.add_arguments(parser)
+    phase_timer.add_arguments(parser)
+    args = parser.parse_args(argv)
     username = args.username
     password = args.password
     with open('devices.csv', 'r') as file:
-        reader = csv.DictReader(file)
-        with ThreadPoolExecutor(max_workers=100) as executor:
-            futures = []
-            for row in reader:
-                hostname = row['IP Address']
-                device_type = row['machine type'].lower()
-                future = executor.submit(configure_scp_server, hostname, device_type, username=username, password=password)
-                futures.append(future)
-            for future in futures:
-                future.result()
+        # Dead devices are reported without ever opening a session
+        reader, unreachable = reachability.prescan(csv.DictReader(file), args.prescan, args.prescan_timeout)
+        for row, reason in unreachable:
+            rprint(f'[red]❌ {reachability.UNREACHABLE}: {row["IP Address"]} ({reason})')
+        if args.engine == 'async':
+            configure_scp_server_async(reader, username, password, args.concurrency)
+        else:
+            limiters = adaptive_limiter.from_args(args)
+            limiters.map(lambda row: configure_scp_server(row['IP Address'], row['machine type'].lower(),
+                                                          username, password, limiters.get(row)),
+                         reader)
+            if args.concurrency_log:
+                limiters.write_log(args.concurrency_log)
+    phase_timer.report(args)
+
+if __name__ == '__main__':
+    main()
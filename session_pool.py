@@ -0,0 +1,186 @@
+"""
+Shared SSH session pool for the NAPALM and Netmiko call sites
+
+Sessions are keyed by (host, platform, credential) and always opened through
+NAPALM. NAPALM's ios and nxos_ssh drivers run on top of Netmiko, so Netmiko
+callers borrow the very same session (driver.device) instead of logging in
+again.
+
+Sessions are closed when they are returned, unless the caller asks to keep them
+(keep=True) because it will run more commands on the same device soon, e.g.
+the config cache followed by the live commands of a collector. Kept sessions
+are health checked before reuse, expire after max_idle seconds and the least
+recently used one is closed when more than max_size are idle, so a fleet sweep
+never holds hundreds of SSH sessions open.
+"""
+import atexit
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from reachability import SSH_PORT
+
+
+##########################
+# Platform mapping
+##########################
+NETMIKO_TO_NAPALM = {
+    'cisco_ios': 'ios',
+    'cisco_xe': 'ios',
+    'cisco_nxos': 'nxos_ssh',
+}
+
+
+def _napalm():
+    # Imported on first use so --help and dry runs don't pay for napalm
+    try:
+        import napalm
+    except ImportError as err:
+        raise SystemExit("The session pool needs napalm: pip install napalm") from err
+    return napalm
+
+
+def session_key(host, platform, username, password):
+    '''
+    Build the pool key of a session, the password is only kept as a digest
+    '''
+    platform = NETMIKO_TO_NAPALM.get(platform, platform)
+    credential = hashlib.sha256(f"{username}:{password}".encode()).hexdigest()
+    return (host, platform, username, credential)
+
+
+##########################
+# Session Pool
+##########################
+class SessionPool:
+    '''
+    Pool of open NAPALM sessions shared by every script in the process
+        - max_size => maximum number of idle sessions kept open
+        - max_idle => seconds an idle session is kept before it is closed
+        - health_check => check is_alive() before handing out an idle session
+    '''
+    def __init__(self, max_size=16, max_idle=60, health_check=True):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check = health_check
+        self.opened = 0
+        self.reused = 0
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _open(self, host, platform, username, password, optional_args=None):
+        driver = _napalm().get_network_driver(platform)
+        optional_args = dict(optional_args or {})
+        if SSH_PORT != 22:
+            optional_args.setdefault('port', SSH_PORT)
+        device = driver(hostname=host, username=username, password=password,
+                        optional_args=optional_args)
+        device.open()
+        with self._lock:
+            self.opened += 1
+        return device
+
+    @staticmethod
+    def _close(device):
+        try:
+            device.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, device):
+        if not self.health_check:
+            return True
+        try:
+            return device.is_alive().get('is_alive', False)
+        except Exception:
+            return False
+
+    def acquire(self, host, platform, username, password, optional_args=None):
+        '''
+        Borrow an open session, reusing an idle one when it is still healthy
+            - host => device ip address
+            - platform => napalm driver name (ios/nxos_ssh) or netmiko device type
+            - username => device username
+            - password => device password
+        '''
+        key = session_key(host, platform, username, password)
+        with self._lock:
+            idle = self._idle.pop(key, None)
+        if idle is not None:
+            device, last_used = idle
+            if time.monotonic() - last_used <= self.max_idle and self._is_healthy(device):
+                with self._lock:
+                    self.reused += 1
+                return device
+            self._close(device)
+        return self._open(host, key[1], username, password, optional_args)
+
+    def release(self, host, platform, username, password, device, discard=False, keep=False):
+        '''
+        Return a borrowed session, closing it unless keep is set
+            - discard => close the session even when keep is set (broken session)
+            - keep => keep the session idle for a caller that will reuse it
+        '''
+        if device is None:
+            return
+        if discard or not keep:
+            self._close(device)
+            return
+        key = session_key(host, platform, username, password)
+        evicted = []
+        with self._lock:
+            previous = self._idle.pop(key, None)
+            if previous is not None:
+                evicted.append(previous[0])
+            self._idle[key] = (device, time.monotonic())
+            now = time.monotonic()
+            for idle_key, (idle_device, last_used) in list(self._idle.items()):
+                if now - last_used > self.max_idle:
+                    del self._idle[idle_key]
+                    evicted.append(idle_device)
+            while len(self._idle) > self.max_size:
+                _, (idle_device, _) = self._idle.popitem(last=False)
+                evicted.append(idle_device)
+        for idle_device in evicted:
+            self._close(idle_device)
+
+    @contextmanager
+    def napalm(self, host, platform, username, password, optional_args=None, keep=False):
+        '''
+        Borrow a NAPALM driver for the duration of a with block
+            - keep => keep the session idle afterwards for the next command on this device
+        '''
+        device = self.acquire(host, platform, username, password, optional_args)
+        try:
+            yield device
+        except Exception:
+            self.release(host, platform, username, password, device, discard=True)
+            raise
+        self.release(host, platform, username, password, device, keep=keep)
+
+    @contextmanager
+    def netmiko(self, host, device_type, username, password, optional_args=None, keep=False):
+        '''
+        Borrow the Netmiko connection underneath a pooled NAPALM session
+            - device_type => netmiko device type (cisco_ios/cisco_nxos)
+        '''
+        with self.napalm(host, device_type, username, password, optional_args, keep) as device:
+            yield device.device
+
+    def close_all(self):
+        '''
+        Close every idle session
+        '''
+        with self._lock:
+            idle = list(self._idle.values())
+            self._idle.clear()
+        for device, _ in idle:
+            self._close(device)
+
+
+##########################
+# Process wide pool
+##########################
+pool = SessionPool()
+atexit.register(pool.close_all)
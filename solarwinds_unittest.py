@@ -0,0 +1,140 @@
+import csv
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import types
+import unittest
+from unittest import mock
+
+
+# Rows served by each stub Orion server, more than one page at PAGE_SIZE
+PAGE_SIZE = 2
+NODES = {
+    "us-npm": [f"us-sw{index}.corp.example" for index in range(5)],
+    "emea-npm": [f"emea-sw{index}.corp.example" for index in range(4)],
+    "apac-npm": ["apac-sw0.corp.example"],
+}
+ROWS = re.compile(r"WITH ROWS (\d+) TO (\d+)$")
+
+
+class StubSwisClient:
+    '''
+    Local SwisClient serving NODES pages for the "WITH ROWS x TO y" of each query
+    '''
+    queries = []
+    lock = threading.Lock()
+    # Every region's first page waits for the other regions, so a sequential
+    # run breaks the barrier instead of passing
+    barrier = None
+
+    def __init__(self, server, username, password):
+        self.server = server
+
+    def query(self, swql):
+        if self.server not in NODES:
+            raise ConnectionError(f"{self.server} is not answering")
+        first_row, last_row = map(int, ROWS.search(swql).groups())
+        with self.lock:
+            self.queries.append((self.server, first_row, last_row))
+        if first_row == 1 and self.barrier is not None:
+            self.barrier.wait()
+        names = NODES[self.server][first_row - 1:last_row]
+        return {"results": [{"DisplayName": name, "IP_address": f"10.0.{first_row}.{index}",
+                             "MachineType": "Cisco Catalyst 9300", "IOSversion": "17.3.4",
+                             "Vendor": "Cisco"} for index, name in enumerate(names)]}
+
+
+def stub_modules():
+    '''
+    orionsdk and urllib3 stand-ins, so the script imports without the Orion SDK
+    '''
+    orionsdk = types.ModuleType("orionsdk")
+    orionsdk.SwisClient = StubSwisClient
+    urllib3 = types.ModuleType("urllib3")
+    urllib3.disable_warnings = lambda category=None: None
+    urllib3.exceptions = types.SimpleNamespace(InsecureRequestWarning=Warning)
+    return {"orionsdk": orionsdk, "urllib3": urllib3}
+
+
+with mock.patch.dict(sys.modules, stub_modules()):
+    import get_device_list_from_all_region as solarwinds
+
+
+class TestSolarwindsQuery(unittest.TestCase):
+
+    def setUp(self):
+        StubSwisClient.queries = []
+        StubSwisClient.barrier = None
+        modules = mock.patch.dict(sys.modules, stub_modules())
+        modules.start()
+        self.addCleanup(modules.stop)
+        self.printed = []
+        printer = mock.patch.object(solarwinds, "rprint", lambda text: self.printed.append(str(text)))
+        printer.start()
+        self.addCleanup(printer.stop)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_pages_until_short_page(self):
+        devices = list(solarwinds.solarwinds_query("us-npm", "user", "secret", "US", PAGE_SIZE))
+        self.assertEqual([device["Device Name"] for device in devices],
+                         [f"us-sw{index}" for index in range(5)])
+        self.assertEqual(StubSwisClient.queries, [("us-npm", 1, 2), ("us-npm", 3, 4), ("us-npm", 5, 6)])
+
+    def test_full_last_page_asks_for_one_more(self):
+        devices = list(solarwinds.solarwinds_query("emea-npm", "user", "secret", "EMEA", PAGE_SIZE))
+        self.assertEqual(len(devices), 4)
+        self.assertEqual([query[1] for query in StubSwisClient.queries], [1, 3, 5])
+        self.assertEqual({device["Region"] for device in devices}, {"EMEA"})
+
+    def test_regions_stream_into_one_csv(self):
+        StubSwisClient.barrier = threading.Barrier(len(NODES), timeout=5)
+        solarwinds.main(["-u", "user", "-p", "secret", "-us", "us-npm", "-emea", "emea-npm",
+                         "-apac", "apac-npm", "--page-size", str(PAGE_SIZE), "--db", "inventory.db"])
+        self.assertFalse(StubSwisClient.barrier.broken, "regions were not queried concurrently")
+
+        with open(solarwinds.DEVICE_LIST_FILE, newline="") as csv_file:
+            lines = csv_file.read().splitlines()
+        self.assertEqual(lines.count(",".join(solarwinds.FIELDNAMES)), 1)
+        with open(solarwinds.DEVICE_LIST_FILE, newline="") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        self.assertEqual(sorted(row["Device Name"] for row in rows),
+                         sorted(name.split(".")[0] for names in NODES.values() for name in names))
+        self.assertEqual({row["Region"] for row in rows}, {"US", "EMEA", "APAC"})
+
+        summary = [line for line in self.printed if " devices in " in line and "Total" not in line]
+        self.assertEqual(len(summary), 3)
+        for region, count in (("US", 5), ("EMEA", 4), ("APAC", 1)):
+            line = next(line for line in summary if f"]{region} " in line)
+            self.assertIn(f" {count} devices in ", line)
+            self.assertIn(f"+{count} ~0 -0 =0", line)
+        self.assertTrue(any("Total 10 devices" in line for line in self.printed))
+
+    def test_failed_region_keeps_the_previous_list(self):
+        with open(solarwinds.DEVICE_LIST_FILE, "w") as csv_file:
+            csv_file.write("previous list\n")
+        with self.assertRaises(SystemExit):
+            solarwinds.main(["-u", "user", "-p", "secret", "-us", "us-npm", "-emea", "down-npm",
+                             "-apac", "apac-npm", "--page-size", str(PAGE_SIZE)])
+        with open(solarwinds.DEVICE_LIST_FILE) as csv_file:
+            self.assertEqual(csv_file.read(), "previous list\n")
+        self.assertEqual(os.listdir("."), [solarwinds.DEVICE_LIST_FILE])
+        self.assertTrue(any("EMEA query failed" in line for line in self.printed))
+
+    def test_query_region_counts(self):
+        rows = []
+        writer = types.SimpleNamespace(write=rows.append)
+        region, count, _, delta = solarwinds.query_region("apac-npm", "user", "secret", "APAC",
+                                                          writer, PAGE_SIZE)
+        self.assertEqual((region, count, delta), ("APAC", 1, None))
+        self.assertEqual(rows[0]["Device Name"], "apac-sw0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,11 +10,19 @@ Workflow:
     - Generate CSV report for devices with unknown/abnormal reboot reason.
 """
 import argparse
-from concurrent.futures import ThreadPoolExecutor
+import time
 from datetime import datetime
-import pandas as pd
-from napalm import get_network_driver
 from rich import print as rprint
+import adaptive_limiter
+import async_engine
+import output_archive
+import phase_timer
+import reachability
+from inventory import load_devices, DeviceRecord
+from result_sink import ResultSink
+from config_cache import cache
+from session_pool import pool
+from phase_timer import timer
 
 
 ##########################
@@ -35,39 +43,65 @@ args = parser.parse_args()'''
 username = 'cisco'
 #password = args.password
 password = 'cisco'
-results_frame = pd.DataFrame()
+results = ResultSink()
+limiters = adaptive_limiter.fixed()
+CONFIG_MAX_AGE = None  # answer from running-config snapshots younger than N seconds, None asks the device
+FLUSH_EVERY = 0  # append rows to the report every N devices, 0 keeps them in memory
+SPILL_EVERY = 1000  # spill sorted runs of N devices to disk, merged into the report at the end
+# Declared up front: a flushed report's header can't grow later
+REPORT_COLUMNS = list(DeviceRecord.FIELDS) + ["SNMP config"]
 SW_REPORT_FILE = "./device_list.csv"
+#CLI_COMMAND = ["show version | i Reason"] if os_ver == 'nxos_ssh' else ["show version | i reason:"]
+CLI_COMMAND = ["show run | inc snmp-server"]
+REPORT_NAME = "SNMP config report {date}.csv"
 
 
 #############################
 # Get only supported devices
 #############################
 def get_supported_devices(solarwinds_results):
-    global data_frame
     '''
-    Capture only the supported devices(IOS/IOS-XE/NXOS) from Solarwinds device query report
+    Capture all devices from Solarwinds device query report
         - solarwinds_results => csv report that was generated from
                                 get_device_list_from_all_region.py script (device_list.csv)
     '''
-    '''unsupported_devices = [
-        "Cisco Unified Communications Manager",
-        "WLC",
-        "Wireless",
-        "Air",
-        "AIR",
-        "WsSvcFwm1sc",
-        "ASA",
-        "Nexus"
-    ]'''
     rprint(f"[yellow]Getting supported devices from {SW_REPORT_FILE}...[/yellow]")
-    data_frame = pd.read_csv(solarwinds_results)
-    #data_frame = data_frame[data_frame.Region == region].sort_values(by="Device Name",\
-                #ascending=True)
-    data_frame = data_frame.sort_values(by="Device Name",\
-                ascending=True)
-    #data_frame = data_frame[~data_frame["Machine Type"].str.contains('|'.join(unsupported_devices))]
-    data_frame["SNMP config"] = ""
-    return data_frame
+    devices = []
+    for device in load_devices(solarwinds_results, platforms=None):
+        device["SNMP config"] = ""
+        devices.append(device)
+    return devices
+
+
+##########################
+# Save device results
+##########################
+def save_output(device_data, cli_output):
+    '''
+    Parse the command output and add the device to the report
+        - device_data = inventory DeviceRecord
+        - cli_output = {command: output} as returned by NAPALM device.cli()
+    '''
+    hostname = device_data["Device Name"]
+    output_archive.record_all(device_data, cli_output)
+    snmp_config = cli_output[CLI_COMMAND[0]]
+    #reload_reason = cli_output[CLI_COMMAND[0]].replace("snmp-server", "")
+    #reload_reason = reload_reason.replace("Last reload reason:", "")
+    device_data["SNMP config"] = snmp_config.strip()
+    rprint(f"✅ {hostname} :: {snmp_config}")
+    results.push(device_data.to_dict())
+
+
+def save_error(device_data, err):
+    '''
+    Add a device that could not be collected to the report
+        - device_data = inventory DeviceRecord
+        - err = exception raised while collecting
+    '''
+    hostname = device_data["Device Name"]
+    device_data["SNMP config"] = err
+    rprint(f"❌ {hostname} :: {err}")
+    results.push(device_data.to_dict())
 
 
 ##########################
@@ -76,56 +110,71 @@ def get_supported_devices(solarwinds_results):
 def get_reboot_reason(device_data):
     '''
     Access device via SSH and get reboot reason
-        - device_data = pandas series data
+        - device_data = inventory DeviceRecord
     '''
-    global results_frame
-    hostname = device_data["Device Name"]
     ip_address = device_data["IP Address"]
     #os_ver = "nxos_ssh" if "Nexus" in device_data["Machine Type"] else "ios"
     os_ver = "ios"
-    #cli_command = ["show version | i Reason"] if os_ver == 'nxos_ssh' else ["show version | i reason:"]
-    cli_command = ["show run | inc snmp-server"]
-    driver = get_network_driver(os_ver)
-    device = driver(
-        hostname=ip_address,
-        username=username,
-        password=password
-    )
 
     try:
-        device.open()
-        cli_output = device.cli(cli_command)
-        snmp_config = cli_output[cli_command[0]]
-        #reload_reason = cli_output[cli_command[0]].replace("snmp-server", "")
-        #reload_reason = reload_reason.replace("Last reload reason:", "")
-        device_data["SNMP config"] = snmp_config.strip()
-        device.close()
-        rprint(f"✅ {hostname} :: {snmp_config}")
+        with limiters.slot(device_data) as slot:
+            if CONFIG_MAX_AGE is None:
+                start = time.perf_counter()
+                with pool.napalm(ip_address, os_ver, username, password) as device:
+                    slot.connected()
+                    timer.record('connect', device_data['Device Name'], device_data.get('Region'), start)
+                    with timer.phase('show command', device_data['Device Name'], device_data.get('Region')):
+                        cli_output = device.cli(CLI_COMMAND)
+            else:
+                with timer.phase('cached command', device_data['Device Name'], device_data.get('Region')):
+                    cli_output = {command: cache.run(ip_address, os_ver, username, password, command,
+                                                     CONFIG_MAX_AGE)
+                                  for command in CLI_COMMAND}
+        save_output(device_data, cli_output)
     except Exception as err:
-        device_data["SNMP config"] = err
-        rprint(f"❌ {hostname} :: {err}")
-
-    results_frame = results_frame.append(device_data)
+        save_error(device_data, err)
 
 
 ##########################
 # Main Script
 ##########################
 region_devices = []
-region_dev_frame = pd.DataFrame()
-def main():
+def main(engine="adaptive", concurrency=async_engine.DEFAULT_CONCURRENCY, max_age=None,
+         limiter_group=None, prescan='tcp', prescan_timeout=reachability.PRESCAN_TIMEOUT):
     '''
     Main Script
+        - engine => "adaptive" (AIMD-limited threads), "thread" (100 worker threads)
+                    or "async" (asyncio + asyncssh)
+        - concurrency => maximum concurrent SSH sessions for the async engine
+        - limiter_group => adaptive_limiter.LimiterGroup used by the thread engines
+        - prescan => reachability sweep before SSH: "tcp", "banner" or "off"
+        - max_age => answer from cached running-configs younger than max_age seconds
     '''
-    global results_frame
+    global CONFIG_MAX_AGE
+    global limiters
+    global results
     global region_devices
-    global region_dev_frame
     #for region in ["US", "EMEA", "APAC"]:
         #rprint(f"{'#'*7} PROCESSING {region} {'#'*7}")
-    region_dev_frame = get_supported_devices(SW_REPORT_FILE)
-    region_devices = [device for _, device in region_dev_frame.iterrows()]
-    with ThreadPoolExecutor(max_workers=100) as executor:
-        executor.map(get_reboot_reason, region_devices)
+    now = datetime.now()
+    report_name = REPORT_NAME.format(date=now.strftime('%d-%b-%Y'))
+    results = ResultSink(path=report_name, flush_every=FLUSH_EVERY, spill_every=SPILL_EVERY,
+                         columns=REPORT_COLUMNS, sort_by=["Region", "Device Name"])
+    region_devices = get_supported_devices(SW_REPORT_FILE)
+    if limiter_group is None:
+        limiter_group = adaptive_limiter.LimiterGroup() if engine == "adaptive" else adaptive_limiter.fixed()
+    limiters = limiter_group
+    # Dead devices are reported without ever opening a session
+    region_devices, unreachable = reachability.prescan(region_devices, prescan, prescan_timeout)
+    for device_data, _ in unreachable:
+        save_error(device_data, reachability.UNREACHABLE)
+    CONFIG_MAX_AGE = max_age
+    # Cached lookups are local file reads, only cache misses need a session
+    if engine == "async" and max_age is None:
+        async_engine.run_commands(region_devices, CLI_COMMAND, username, password,
+                                  save_output, save_error, concurrency=concurrency)
+    else:
+        limiters.map(get_reboot_reason, region_devices)
 
     # Analyze data and capture only abnormal reloads
     '''abnormal_status = [
@@ -136,18 +185,45 @@ def main():
         "Unknown reason",
         "Reason unspecified"
     ]'''
-    now = datetime.now()
-    report_name = f"SNMP config report {now.strftime('%d-%b-%Y')}.csv"
     #results_frame = results_frame[results_frame["Reload reason"] != ""]
     #results_frame = results_frame[results_frame["Reload reason"]\
      #               .str.contains('|'.join(abnormal_status), na=False)]
-    results_frame = results_frame.sort_values(by=["Region", "Device Name"], ascending=(True, True))
-    results_frame.to_csv(report_name, index=False)
+    results.write_csv(sort_by=["Region", "Device Name"])
     rprint(f"✅ {report_name} - Successfully generated!")
 
 
+##########################
+# Command line
+##########################
+def cli(argv=None):
+    '''
+    Parse the script arguments and run main()
+        - argv => command line arguments (default: sys.argv)
+    '''
+    parser = argparse.ArgumentParser(description="Check device SNMP configuration")
+    parser.add_argument('--engine', type=str, default="adaptive", choices=["adaptive", "thread", "async"],\
+        help='Collection engine: adaptive worker threads, 100 worker threads or asyncio (default: adaptive)')
+    parser.add_argument('--concurrency', type=int, default=async_engine.DEFAULT_CONCURRENCY, metavar='',\
+        help='Maximum concurrent SSH sessions for the async engine')
+    parser.add_argument('--max-age', type=int, default=None, metavar='',\
+        help='Use cached running-configs younger than this many seconds (0 forces a refresh)')
+    adaptive_limiter.add_arguments(parser)
+    reachability.add_arguments(parser)
+    phase_timer.add_arguments(parser)
+    output_archive.add_arguments(parser)
+    args = parser.parse_args(argv)
+    output_archive.from_args(args)
+    limiter_group = adaptive_limiter.from_args(args)
+    main(engine=args.engine, concurrency=args.concurrency, max_age=args.max_age,
+         limiter_group=limiter_group, prescan=args.prescan, prescan_timeout=args.prescan_timeout)
+    if args.concurrency_log:
+        limiter_group.write_log(args.concurrency_log)
+    phase_timer.report(args)
+    output_archive.close()
+
+
 ##########################
 # Run Script
 ##########################
 if __name__ == "__main__":
-    main()
+    cli()